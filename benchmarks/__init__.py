@@ -0,0 +1,13 @@
+"""
+Benchmark Suite for the RSS Reader Application.
+
+Measures the parse, cache and query hot paths on synthetic, reproducible data, without network access.
+
+Modules:
+    generators.py: Builds synthetic RSS feeds and news caches of a given size.
+    run.py: Runs the benchmarks, writes a JSON baseline and compares two baselines.
+
+Usage:
+    python -m benchmarks.run run --output benchmarks/baseline.json
+    python -m benchmarks.run compare benchmarks/baseline.json current.json
+"""
@@ -0,0 +1,109 @@
+import random
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from xml.sax.saxutils import escape
+from src.storage import CACHE_COLUMNS, StorageBackend
+
+WORDS = ("market", "election", "storm", "court", "energy", "health", "science", "football", "budget", "trade",
+         "climate", "police", "school", "music", "border", "vaccine", "bank", "river", "festival", "strike")
+START_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+DESCRIPTION_POOL = 1000
+
+
+def _sentence(rng: random.Random, size: int) -> str:
+    """Returns about `size` characters of random words."""
+    words = []
+    length = 0
+    while length <= size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def generate_feed(items: int, description_size: int = 200, categories: int = 3, days: int = 30,
+                  seed: int = 0) -> str:
+    """
+    Builds a synthetic RSS feed.
+
+    Args:
+    - items: The number of items in the feed.
+    - description_size: The number of characters of each item description.
+    - categories: The number of <category> elements per item (category fan-out).
+    - days: Publication dates are spread over this many days.
+    - seed: Seed of the random generator, so the same arguments always give the same feed.
+
+    Returns: The feed XML.
+    """
+    rng = random.Random(seed)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel><title>Synthetic Feed</title>']
+    for index in range(items):
+        published = START_DATE + timedelta(seconds=rng.randrange(days * 24 * 3600))
+        categories_xml = "".join(f"<category>{rng.choice(WORDS).title()} {rng.randrange(50)}</category>"
+                                 for _ in range(categories))
+        parts.append(
+            f"<item><title>{escape(_sentence(rng, 60))}</title>"
+            f"<link>https://example.com/news/{seed}/{index}</link>"
+            f"<description>{escape(_sentence(rng, description_size))}</description>"
+            f"<author>author{rng.randrange(100)}@example.com</author>{categories_xml}"
+            f"<pubDate>{published.strftime('%a, %d %b %Y %H:%M:%S +0000')}</pubDate></item>")
+    parts.append("</channel></rss>")
+    return "".join(parts)
+
+
+def generate_pub_dates(count: int, distinct: Optional[int] = None, days: int = 365, seed: int = 0) -> List[str]:
+    """
+    Builds RFC-822 publication dates, as found in feeds.
+
+    Args:
+    - count: The number of dates.
+    - distinct: The number of different dates they are drawn from (None for all different).
+    - days: The dates are spread over this many days.
+    - seed: Seed of the random generator.
+
+    Returns: The dates, in random order.
+    """
+    rng = random.Random(seed)
+    seconds = rng.sample(range(days * 24 * 3600), distinct or count)
+    if distinct:
+        seconds = [rng.choice(seconds) for _ in range(count)]
+    return [(START_DATE + timedelta(seconds=second)).strftime('%a, %d %b %Y %H:%M:%S +0000') for second in seconds]
+
+
+def generate_cache_rows(rows: int, sources: int = 20, days: int = 365, seed: int = 0,
+                        offset: int = 0) -> pd.DataFrame:
+    """
+    Builds synthetic cached news items, as CacheManager stores them.
+
+    Args:
+    - rows: The number of items.
+    - sources: The number of distinct source URLs.
+    - days: Publication dates are spread over this many days.
+    - seed: Seed of the random generator.
+    - offset: First item number, so batches generated with different offsets have distinct links.
+
+    Returns: A DataFrame with the CACHE_COLUMNS columns.
+    """
+    rng = random.Random(seed)
+    dates = [(START_DATE + timedelta(days=day)).strftime("%Y%m%d") for day in range(days)]
+    numbers = range(offset, offset + rows)
+    descriptions = [_sentence(rng, 120) for _ in range(DESCRIPTION_POOL)]
+    start = int(START_DATE.timestamp())
+    published = [start + rng.randrange(days * 24 * 60 * 60) for _ in numbers]
+    return pd.DataFrame({
+        "title": [f"{rng.choice(WORDS).title()} news {number}" for number in numbers],
+        "author": None,
+        "pubDate": [dates[(timestamp - start) // (24 * 60 * 60)] for timestamp in published],
+        "link": [f"https://example.com/news/{number}" for number in numbers],
+        "category": [[rng.choice(WORDS).title()] for _ in numbers],
+        "description": [rng.choice(descriptions) for _ in numbers],
+        "source_url": [f"https://example.com/feed/{rng.randrange(sources)}.xml" for _ in numbers],
+        "published": published,
+    }, columns=CACHE_COLUMNS)
+
+
+def fill_storage(storage: StorageBackend, rows: int, chunk_size: int = 500_000, seed: int = 0) -> None:
+    """Adds `rows` synthetic items to a storage backend, generating them in chunks to bound memory."""
+    for offset in range(0, rows, chunk_size):
+        storage.add_items(generate_cache_rows(min(chunk_size, rows - offset), seed=seed + offset, offset=offset))
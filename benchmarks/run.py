@@ -0,0 +1,428 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+from benchmarks.generators import START_DATE, fill_storage, generate_feed, generate_pub_dates
+from src.cache_manager import CacheManager
+from src.dates import parse_pub_date
+from src.rss_reader import rss_parser
+from src.storage import open_storage, pyarrow_installed
+
+PROFILES = {
+    "quick": {"feed_items": [1_000, 10_000], "cache_rows": [10_000, 100_000], "pub_dates": [100_000]},
+    "full": {"feed_items": [1_000, 10_000, 50_000], "cache_rows": [10_000, 100_000, 1_000_000, 5_000_000],
+             "pub_dates": [100_000, 1_000_000]},
+}
+BACKEND_FILES = {"csv": "cache.csv", "sqlite": "cache.db", "partitioned": "cache", "parquet": "cache.parquet"}
+CACHE_DAYS = 365
+WRITE_BATCH = 1_000
+RANGE_DAYS = 7
+# Feeds repeat timestamps, so the memoized date parser is also measured on dates drawn from this many.
+DISTINCT_PUB_DATES = 500
+RFC822_FORMAT = "%a, %d %b %Y %H:%M:%S %z"
+SERVE_CLIENTS = 8
+SERVE_REQUESTS = 50
+DEFAULT_REPEATS = 3
+DEFAULT_THRESHOLD = 0.2
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# What `src.main` imported at startup before imports were deferred, kept as the reference for the startup benchmark.
+EAGER_IMPORTS = "import pandas, requests, bs4, lxml.etree"
+
+
+def measure(setup: Callable[[], Callable[[], Any]], items: int, repeats: int, memory: bool) -> Dict[str, Any]:
+    """
+    Times an operation and optionally measures its peak memory.
+
+    Args:
+    - setup: Prepares one run of the operation (untimed) and returns it as a callable.
+    - items: The number of items the operation processes, for the throughput.
+    - repeats: The operation is run this many times and the fastest run is kept.
+    - memory: Runs the operation once more under tracemalloc to record its peak memory.
+
+    Returns: A dictionary with the seconds, items, throughput (items per second) and peak memory in bytes.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        operation = setup()
+        start = time.perf_counter()
+        operation()
+        best = min(best, time.perf_counter() - start)
+    result = {"seconds": best, "items": items, "throughput": items / best if best else None,
+              "peak_memory_bytes": None}
+    if memory:
+        operation = setup()
+        tracemalloc.start()
+        try:
+            operation()
+            result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def bench_parse(items: int, description_size: int, categories: int, repeats: int, memory: bool,
+                seed: int) -> Dict[str, Any]:
+    """Measures `rss_parser` on a synthetic feed with the given number of items."""
+    xml = generate_feed(items=items, description_size=description_size, categories=categories, seed=seed)
+    return measure(lambda: lambda: rss_parser(xml=xml), items=items, repeats=repeats, memory=memory)
+
+
+def bench_parse_pub_date(dates: List[str], repeats: int, memory: bool) -> Dict[str, Any]:
+    """Measures `parse_pub_date` on a list of feed dates, with its memo cleared before every run."""
+    def setup() -> Callable[[], Any]:
+        parse_pub_date.cache_clear()
+        return lambda: [parse_pub_date(date) for date in dates]
+
+    return measure(setup, items=len(dates), repeats=repeats, memory=memory)
+
+
+def bench_strptime(dates: List[str], repeats: int, memory: bool) -> Dict[str, Any]:
+    """Measures `datetime.strptime` with the RFC-822 format, which parsed feed dates before `parse_pub_date`."""
+    return measure(lambda: lambda: [datetime.strptime(date, RFC822_FORMAT) for date in dates], items=len(dates),
+                   repeats=repeats, memory=memory)
+
+
+def bench_cache(cache_file: str, rows: int, description_size: int, categories: int, repeats: int, memory: bool,
+                seed: int) -> Dict[str, Any]:
+    """Measures caching a batch of new items into an existing cache, including opening the cache."""
+    batches = iter(range(seed + 1, seed + 2 + repeats))
+
+    def setup() -> Callable[[], Any]:
+        batch_seed = next(batches)
+        xml = generate_feed(items=WRITE_BATCH, description_size=description_size, categories=categories,
+                            seed=batch_seed)
+        items = rss_parser(xml=xml)
+        source_url = f"https://example.com/feed/batch{batch_seed}.xml"
+        return lambda: CacheManager(cache_file=cache_file).cache_feeds(feeds=[(source_url, items)], verbose=False)
+
+    result = measure(setup, items=WRITE_BATCH, repeats=repeats, memory=memory)
+    result["cache_rows"] = rows
+    return result
+
+
+def bench_query(cache_file: str, rows: int, repeats: int, memory: bool) -> Dict[str, Any]:
+    """Measures a full date query on a cache with the given number of rows. Throughput is rows scanned per second."""
+    date = (START_DATE + timedelta(days=CACHE_DAYS // 2)).strftime("%Y%m%d")
+
+    def query() -> List[Dict[str, Any]]:
+        return list(CacheManager(cache_file=cache_file).retrieve_news_from_cache(date=date))
+
+    result = measure(lambda: query, items=rows, repeats=repeats, memory=memory)
+    result["matches"] = len(query())
+    return result
+
+
+def bench_range_query(cache_file: str, days: int, repeats: int, memory: bool) -> Dict[str, Any]:
+    """
+    Measures a --from/--to query for `days` days in the middle of the cache, newest first, through the
+    publication time index. The index is built before timing. Throughput is matching items per second.
+    """
+    start = START_DATE + timedelta(days=CACHE_DAYS // 2)
+    start_time, end_time = int(start.timestamp()), int((start + timedelta(days=days)).timestamp()) - 1
+
+    def query() -> List[Dict[str, Any]]:
+        return CacheManager(cache_file=cache_file).news_in_range(start=start_time, end=end_time)
+
+    matches = len(query())
+    result = measure(lambda: query, items=matches, repeats=repeats, memory=memory)
+    result["matches"] = matches
+    return result
+
+
+def bench_serve(cache_file: str, clients: int, requests_per_client: int, memory: bool) -> Dict[str, Any]:
+    """
+    Measures the `--serve` HTTP server under concurrent load from local clients. Every client is a thread
+    with its own keep-alive connection sending date queries and RANGE_DAYS range queries for different
+    days, so most responses are not cached yet. Throughput is requests per second; the peak memory is that
+    of loading the cache into the hot index, and the latency percentiles are in milliseconds.
+    """
+    import http.client
+    import threading
+    from src.server import HotIndex, NewsServer
+
+    hot_index = HotIndex(CacheManager(cache_file=cache_file))
+    if memory:
+        tracemalloc.start()
+    load_start = time.perf_counter()
+    try:
+        hot_index.refresh(blocking=True)
+        peak_memory = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    load_seconds = time.perf_counter() - load_start
+
+    def target(number: int) -> str:
+        day = START_DATE + timedelta(days=number * 7 % CACHE_DAYS)
+        if number % 2:
+            return f"/news?date={day:%Y%m%d}"
+        return f"/news?from={day:%Y%m%d}&to={day + timedelta(days=RANGE_DAYS - 1):%Y%m%d}"
+
+    latencies: List[float] = []
+
+    def client(first: int, server_address: tuple) -> None:
+        connection = http.client.HTTPConnection(*server_address[:2])
+        timings = []
+        for number in range(first, first + requests_per_client):
+            start = time.perf_counter()
+            connection.request("GET", target(number))
+            connection.getresponse().read()
+            timings.append(time.perf_counter() - start)
+        connection.close()
+        latencies.extend(timings)
+
+    with NewsServer(hot_index, port=0) as server:
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.start()
+        threads = [threading.Thread(target=client, args=(number * requests_per_client, server.server_address))
+                   for number in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+        server.shutdown()
+        server_thread.join()
+
+    latencies.sort()
+
+    def percentile(fraction: float) -> float:
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+    return {"seconds": seconds, "items": len(latencies), "throughput": len(latencies) / seconds if seconds else None,
+            "peak_memory_bytes": peak_memory, "load_seconds": load_seconds, "clients": clients,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99),
+                           "max": latencies[-1] * 1000}}
+
+
+def bench_export(cache_file: str, rows: int, repeats: int, memory: bool) -> Dict[str, Any]:
+    """
+    Measures exporting the whole cache to a Parquet file with `CacheManager.export_news`, then reading the
+    file back into a DataFrame with pandas, as analytics code would. Throughput is exported rows per second;
+    "bytes" is the size of the Parquet file and "cache_bytes" that of the cache.
+    """
+    import pandas as pd
+    cache_manager = CacheManager(cache_file=cache_file)
+    export_file = os.path.join(os.path.dirname(cache_file), "export.parquet")
+    result = measure(lambda: lambda: cache_manager.export_news(export_file), items=rows, repeats=repeats,
+                     memory=memory)
+    read_seconds = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        pd.read_parquet(export_file)
+        read_seconds = min(read_seconds, time.perf_counter() - start)
+    result.update(read_seconds=read_seconds, bytes=os.path.getsize(export_file),
+                  cache_bytes=cache_manager.storage.size_on_disk())
+    os.remove(export_file)
+    return result
+
+
+def bench_import(code: str, repeats: int) -> Dict[str, Any]:
+    """Measures the wall time of a fresh interpreter running `code`, including interpreter startup."""
+    command = [sys.executable, "-c", code]
+    return measure(lambda: lambda: subprocess.run(command, cwd=PROJECT_DIR, check=True), items=1,
+                   repeats=repeats, memory=False)
+
+
+def bench_first_output(cache_file: str, repeats: int) -> Dict[str, Any]:
+    """Measures the time from launching `python -m src.main --date` until its first line of output."""
+    date = (START_DATE + timedelta(days=CACHE_DAYS // 2)).strftime("%Y%m%d")
+    command = [sys.executable, "-m", "src.main", "--date", date, "--cache", os.path.abspath(cache_file)]
+
+    def first_output() -> None:
+        with subprocess.Popen(command, cwd=PROJECT_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as process:
+            process.stdout.readline()
+            process.kill()
+
+    return measure(lambda: first_output, items=1, repeats=repeats, memory=False)
+
+
+def run_benchmarks(feed_items: List[int], cache_rows: List[int], backends: List[str],
+                   pub_dates: Optional[List[int]] = None, description_size: int = 200, categories: int = 3,
+                   repeats: int = DEFAULT_REPEATS, memory: bool = True, startup: bool = True, seed: int = 0,
+                   work_dir: Optional[str] = None, serve_clients: int = SERVE_CLIENTS,
+                   serve_requests: int = SERVE_REQUESTS, export: bool = True, verbose: bool = False) -> Dict[str, Any]:
+    """
+    Runs the parse, publication date, cache, date query, range query, HTTP server and export benchmarks
+    and returns them as a baseline dictionary.
+
+    Args:
+    - feed_items: Sizes of the synthetic feeds for the parse benchmark.
+    - cache_rows: Sizes of the synthetic caches for the cache and query benchmarks.
+    - backends: Storage backends to benchmark (keys of BACKEND_FILES).
+    - pub_dates: Numbers of feed dates for the `parse_pub_date` benchmark, all different and drawn from
+     DISTINCT_PUB_DATES, with `datetime.strptime` measured on the different ones for reference.
+    - description_size: Characters per item description in the synthetic feeds.
+    - categories: Categories per item in the synthetic feeds.
+    - repeats: Runs per benchmark, the fastest is kept.
+    - memory: Also records the peak memory of every benchmark.
+    - startup: Also measures interpreter startup with `src.main` imported, the old eager imports for
+     reference, and the time to the first line of output of a `--date` query on each cache.
+    - seed: Seed of the synthetic data.
+    - work_dir: Directory for the synthetic caches (a temporary directory if None).
+    - serve_clients: Concurrent clients of the HTTP server benchmark (0 to skip it).
+    - serve_requests: Requests sent by every client of the HTTP server benchmark.
+    - export: Also measures exporting each cache to Parquet and reading it back, if pyarrow is installed.
+    - verbose: Prints every result as it is measured.
+    """
+    results = {}
+
+    def record(name: str, result: Dict[str, Any]) -> None:
+        results[name] = result
+        if verbose:
+            latency = (f", p50 {result['latency_ms']['p50']:.2f}ms, p99 {result['latency_ms']['p99']:.2f}ms"
+                       if "latency_ms" in result else "")
+            print(f"{name}: {result['seconds']:.4f}s, {result['throughput'] or 0:,.0f} items/s{latency}",
+                  file=sys.stderr)
+
+    if startup:
+        record("startup/interpreter", bench_import("pass", repeats=repeats))
+        record("startup/import", bench_import("import src.main", repeats=repeats))
+        record("startup/eager_imports", bench_import(EAGER_IMPORTS, repeats=repeats))
+    for items in feed_items:
+        record(f"parse/items={items}", bench_parse(items=items, description_size=description_size,
+                                                   categories=categories, repeats=repeats, memory=memory, seed=seed))
+    for count in pub_dates or []:
+        unique = generate_pub_dates(count=count, seed=seed)
+        record(f"parse_pub_date/unique={count}", bench_parse_pub_date(unique, repeats=repeats, memory=memory))
+        record(f"parse_pub_date/strptime/unique={count}", bench_strptime(unique, repeats=repeats, memory=memory))
+        repeated = generate_pub_dates(count=count, distinct=DISTINCT_PUB_DATES, seed=seed)
+        record(f"parse_pub_date/distinct={DISTINCT_PUB_DATES}/dates={count}",
+               bench_parse_pub_date(repeated, repeats=repeats, memory=memory))
+    with tempfile.TemporaryDirectory(dir=work_dir) as temp_dir:
+        for backend in backends:
+            for rows in cache_rows:
+                cache_file = os.path.join(temp_dir, f"{backend}-{rows}", BACKEND_FILES[backend])
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                fill_storage(open_storage(cache_file), rows=rows, seed=seed)
+                record(f"query/{backend}/rows={rows}",
+                       bench_query(cache_file=cache_file, rows=rows, repeats=repeats, memory=memory))
+                record(f"range_query/{backend}/rows={rows}",
+                       bench_range_query(cache_file=cache_file, days=RANGE_DAYS, repeats=repeats, memory=memory))
+                if serve_clients:
+                    record(f"serve/{backend}/rows={rows}",
+                           bench_serve(cache_file=cache_file, clients=serve_clients,
+                                       requests_per_client=serve_requests, memory=memory))
+                if export and pyarrow_installed():
+                    record(f"export/{backend}/rows={rows}",
+                           bench_export(cache_file=cache_file, rows=rows, repeats=repeats, memory=memory))
+                if startup:
+                    record(f"startup/first_output/{backend}/rows={rows}",
+                           bench_first_output(cache_file=cache_file, repeats=repeats))
+                record(f"cache/{backend}/rows={rows}",
+                       bench_cache(cache_file=cache_file, rows=rows, description_size=description_size,
+                                   categories=categories, repeats=repeats, memory=memory, seed=seed))
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {"feed_items": feed_items, "cache_rows": cache_rows, "backends": backends,
+                       "pub_dates": pub_dates, "description_size": description_size, "categories": categories,
+                       "repeats": repeats, "startup": startup, "seed": seed, "serve_clients": serve_clients,
+                       "serve_requests": serve_requests, "export": export},
+        "results": results,
+    }
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                    threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    Compares two baselines benchmark by benchmark.
+
+    Args:
+    - baseline: The reference baseline.
+    - current: The baseline to check.
+    - threshold: Relative slowdown (or peak memory growth) above which a benchmark is a regression, e.g. 0.2 for 20%.
+
+    Returns: One row per benchmark present in both, with the time and memory ratios and a "regression" flag.
+    """
+    rows = []
+    for name, reference in baseline["results"].items():
+        if (result := current["results"].get(name)) is None:
+            continue
+        time_ratio = result["seconds"] / reference["seconds"] if reference["seconds"] else None
+        memory_ratio = None
+        if reference.get("peak_memory_bytes") and result.get("peak_memory_bytes") is not None:
+            memory_ratio = result["peak_memory_bytes"] / reference["peak_memory_bytes"]
+        rows.append({
+            "name": name, "time_ratio": time_ratio, "memory_ratio": memory_ratio,
+            "regression": any(ratio is not None and ratio > 1 + threshold for ratio in (time_ratio, memory_ratio)),
+        })
+    return rows
+
+
+def format_ratio(ratio: Optional[float]) -> str:
+    return "n/a" if ratio is None else f"{ratio:.2f}x"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point. Returns the exit code: 1 if `compare` found a regression, else 0."""
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the RSS reader's parse, cache and query paths.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and write a JSON baseline.")
+    run_parser.add_argument("--profile", choices=sorted(PROFILES), default="quick",
+                            help="Feed and cache sizes to benchmark (full goes up to 5M cached rows).")
+    run_parser.add_argument("--feed-items", type=int, nargs="+", help="Feed sizes, overriding the profile.")
+    run_parser.add_argument("--cache-rows", type=int, nargs="+", help="Cache sizes, overriding the profile.")
+    run_parser.add_argument("--pub-dates", type=int, nargs="+",
+                            help="Numbers of dates for the publication date benchmark, overriding the profile.")
+    run_parser.add_argument("--backends", nargs="+", choices=sorted(BACKEND_FILES), default=["csv"],
+                            help="Storage backends to benchmark.")
+    run_parser.add_argument("--description-size", type=int, default=200, help="Characters per item description.")
+    run_parser.add_argument("--categories", type=int, default=3, help="Categories per item.")
+    run_parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Runs per benchmark.")
+    run_parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory measurements.")
+    run_parser.add_argument("--no-startup", action="store_true", help="Skip the CLI startup measurements.")
+    run_parser.add_argument("--serve-clients", type=int, default=SERVE_CLIENTS,
+                            help="Concurrent clients of the HTTP server benchmark (0 to skip it).")
+    run_parser.add_argument("--serve-requests", type=int, default=SERVE_REQUESTS,
+                            help="Requests per client of the HTTP server benchmark.")
+    run_parser.add_argument("--no-export", action="store_true", help="Skip the Parquet export measurements.")
+    run_parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data.")
+    run_parser.add_argument("--work-dir", help="Directory for the synthetic caches.")
+    run_parser.add_argument("-o", "--output", help="Baseline file to write (stdout if omitted).")
+
+    compare_parser = commands.add_parser("compare", help="Compare a run against a baseline and flag regressions.")
+    compare_parser.add_argument("baseline", help="The reference baseline file.")
+    compare_parser.add_argument("current", help="The baseline file to check.")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="Relative slowdown flagged as a regression (default 0.2 = 20%%).")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        profile = PROFILES[args.profile]
+        report = run_benchmarks(feed_items=args.feed_items or profile["feed_items"],
+                                cache_rows=args.cache_rows or profile["cache_rows"], backends=args.backends,
+                                pub_dates=args.pub_dates or profile["pub_dates"],
+                                description_size=args.description_size, categories=args.categories,
+                                repeats=args.repeats, memory=not args.no_memory, startup=not args.no_startup,
+                                seed=args.seed, work_dir=args.work_dir, serve_clients=args.serve_clients,
+                                serve_requests=args.serve_requests, export=not args.no_export, verbose=True)
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as output_file:
+                output_file.write(text + "\n")
+        else:
+            print(text)
+        return 0
+
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        rows = compare_results(json.load(baseline_file), json.load(current_file), threshold=args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else "ok"
+        print(f"{row['name']:<40} time {format_ratio(row['time_ratio']):>7}  "
+              f"memory {format_ratio(row['memory_ratio']):>7}  {flag}")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,8 +8,22 @@ from all sources for a given date.
 
 Modules:
     main.py: Parses command-line arguments and orchestrates the fetching, caching, and displaying of news articles.
+    fetch.py: Downloads feeds concurrently over a shared HTTP session, with conditional requests.
     rss_reader.py: Contains functions for parsing RSS feeds.
     cache_manager.py: Manages the local cache of news articles, including saving and retrieving.
+    storage.py: Provides the CSV, SQLite and date-partitioned storage backends used by the cache manager.
+    search.py: Keeps the persistent inverted index behind --search and ranks matches with BM25.
+    journal.py: Provides the cross-process file lock and the write-ahead log that make concurrent cache writes safe.
+    dedup.py: Finds near-duplicate news across sources with MinHash signatures for --collapse-duplicates.
+    columnar.py: Exports the cache to, and imports news from, typed Parquet and Arrow IPC files.
+    retention.py: Defines the retention policies applied by --compact and the compaction report.
+    server.py: Serves the cache as JSON over HTTP from an in-memory index for --serve.
+    pipeline.py: Runs the --pipeline bulk ingestion with overlapped fetch, parse and cache stages.
+    daemon.py: Runs the long-lived polling loop with an adaptive per-feed scheduler.
+    writers.py: Streams news items to stdout as text, JSON or NDJSON.
+    http_cache.py: Persists HTTP validators (ETag, Last-Modified, body hash) for conditional feed requests.
+    stats.py: Records per-stage and per-feed timings and counters for --stats, as JSON or Prometheus text.
+    dates.py: Normalizes feed publication dates, with a fast path for RFC-822 and fallbacks for common variants.
     utils.py: Provides utility functions.
 
 """
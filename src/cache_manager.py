@@ -1,23 +1,56 @@
-import pandas as pd
-from os import path
-from typing import Dict, List
+import json
+import os
+import threading
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from src.columnar import CHUNK_SIZE, read_columnar, write_columnar
+from src.dedup import DuplicateIndex, collapse
+from src.journal import FileLock, WriteAheadLog
+from src.retention import CompactionReport, RetentionPolicy
+from src.search import DEFAULT_TOP_CATEGORIES, SearchIndex
+from src.stats import recorder
+from src.storage import CACHE_COLUMNS, StorageBackend, open_storage
 from src.utils import log_verbose
 
 
 class CacheManager:
     """
-    A cache manager for storing and retrieving news items using a CSV file as the storage medium.
+    A cache manager for storing and retrieving news items.
+
+    The items are kept by a storage backend chosen from the cache file extension: a CSV file by default,
+    or an SQLite database for .db, .sqlite and .sqlite3 files. See src.storage.
+
+    A search index (see src.search) over the titles, descriptions and categories, and an index of
+    near-duplicate items (see src.dedup) are kept next to the cache and updated with every write.
+
+    Writes are safe from several processes at once. New items are first appended to a write-ahead log next
+    to the cache (see src.journal), then the log is merged into the storage by whichever writer holds the
+    merge lock; the others return straight away, leaving their items to that merger. Merges and compactions
+    hold the merge lock, so they never interleave, and reads are not blocked by either. A merge interrupted
+    by a crash is undone and redone by the next one.
 
     Attributes:
-    - cache_file: The path to the CSV file used for caching news items.
+    - cache_file: The path to the file used for caching news items.
+    - storage: The storage backend the news items are kept in.
+    - search_index: The SearchIndex over the cached titles, descriptions and categories.
+    - duplicate_index: The DuplicateIndex clustering near-duplicate cached items.
+    - journal: The WriteAheadLog new items go through.
     """
-    def __init__(self, cache_file='data/news_cache.csv'):
-        """Initializes the CacheManager with a specific cache file location."""
-        self.cache_file = cache_file
+    def __init__(self, cache_file='data/news_cache.csv', storage: Optional[StorageBackend] = None):
+        """Initializes the CacheManager with a specific cache file location or storage backend."""
+        self.storage = storage or open_storage(cache_file)
+        self.cache_file = self.storage.cache_file
+        self.search_index = SearchIndex(self.storage.sidecar_path("search.db"))
+        self.duplicate_index = DuplicateIndex(self.storage.sidecar_path("dedup.db"))
+        self.journal = WriteAheadLog(self.storage.sidecar_path("wal"))
+        self._merge_lock = FileLock(self.storage.sidecar_path("lock"))
+        self._merge_state_file = self.storage.sidecar_path("wal.state")
+        self._compaction: Optional[threading.Thread] = None
 
     def cache_news(self, news_items: List[Dict[str, any]], source_url: str, verbose: bool) -> None:
         """
-        Caches news items to the specified CSV file, adding a source URL to each item.
+        Caches news items to the cache storage, adding a source URL to each item.
 
         Args:
         - news_items: A list of dictionaries, where each dictionary
@@ -26,40 +59,375 @@ class CacheManager:
 
         Exception: If there's an error during the caching process.
         """
-        try:
-            if path.exists(self.cache_file):
-                cache_df = pd.read_csv(self.cache_file)
-            else:
-                cache_df = pd.DataFrame(columns=["title", "author", "pubDate", "link", "category", "description"])
+        self.cache_feeds(feeds=[(source_url, news_items)], verbose=verbose)
+
+    def cache_feeds(self, feeds: List[Tuple[str, List[Dict[str, any]]]], verbose: bool) -> Optional[int]:
+        """
+        Caches news items from several sources with a single write to the cache storage.
 
-            new_items_df = pd.DataFrame.from_records(news_items)
-            new_items_df['source_url'] = source_url
+        The items are appended to the write-ahead log, then merged into the storage unless another process
+        is merging already, in which case that process merges them too. Items whose link is already
+        cached, or repeated within the batch, are skipped.
 
-            cache_df = pd.concat([cache_df, new_items_df], ignore_index=True).drop_duplicates(subset=['link'])
-            cache_df.to_csv(self.cache_file, index=False)
+        Args:
+        - feeds: A list of (source_url, news_items) pairs, one per fetched feed.
+
+        Returns: The number of new items cached (0 if another process merges them), or None if caching failed.
+
+        Exception: If there's an error during the caching process.
+        """
+        try:
+            records = [{**item, "source_url": source_url} for source_url, news_items in feeds for item in news_items]
+            if not records:
+                log_verbose(message="No news items to cache.", verbose=verbose)
+                return 0
 
-            log_verbose(message="News items cached successfully.", verbose=verbose)
+            with recorder.stage("cache_write"):
+                self.journal.append(records)
+            added = self.merge_journal()
+            if added is None:
+                log_verbose(message=f"{len(records)} news item(s) logged, another process is merging them.",
+                            verbose=verbose)
+                return 0
+            else:
+                log_verbose(message=f"News items cached successfully ({added} new).", verbose=verbose)
+            return added
         except Exception as e:
             print(f"Error caching news items: {e}")
+            return None
+
+    def merge_journal(self, blocking: bool = False) -> Optional[int]:
+        """
+        Merges the items waiting in the write-ahead log into the storage and the search index.
+
+        Args:
+        - blocking: Waits for the merge lock instead of leaving the items to the process holding it.
+
+        Returns: The number of items added to the storage, or None if another process holds the merge lock.
+        """
+        added = None
+        while self.journal.pending():
+            if not self._merge_lock.acquire(blocking=blocking):
+                break
+            try:
+                added = (added or 0) + self._merge_logged()
+            finally:
+                self._merge_lock.release()
+            # Items logged while the lock was held, by writers that found it taken, are merged on the next round.
+        return added
+
+    def read_merged(self, read: Callable[[], Any], blocking: bool = False) -> Tuple[bool, Any]:
+        """
+        Calls `read` under the merge lock, once the items waiting in the write-ahead log are merged, so it
+        sees every logged item and never a half-written batch. Items logged meanwhile by writers that found
+        the lock taken are merged once it is released, as after a merge.
+
+        Args:
+        - read: The function reading the storage.
+        - blocking: Waits for a merge or compaction in progress instead of giving up.
+
+        Returns: (True, the result of `read`), or (False, None) if another process holds the merge lock.
+        """
+        if not self._merge_lock.acquire(blocking=blocking):
+            return False, None
+        try:
+            self._merge_logged()
+            result = read()
+        finally:
+            self._merge_lock.release()
+        self.merge_journal()
+        return True, result
+
+    def _merge_logged(self) -> int:
+        """Merges every batch in the write-ahead log, under the merge lock. Returns the number of items added."""
+        added = 0
+        while (batch := self.journal.take()) is not None:
+            records, recovered = batch
+            added += self._merge(records, recovered)
+            self.journal.done()
+        return added
+
+    def _merge(self, records: List[Dict[str, Any]], recovered: bool) -> int:
+        """
+        Writes a batch of logged items to the storage, the search index and the duplicate index, under the
+        merge lock.
+
+        The sizes of the files about to be appended to are saved first; if the batch was left behind by an
+        interrupted merge, the storage is truncated back to them before the batch is written again.
+        """
+        import pandas as pd
+        if recovered and os.path.exists(self._merge_state_file):
+            with open(self._merge_state_file, encoding="utf-8") as state:
+                self.storage.recover(json.load(state))
+        self.storage.refresh()
+        temp_file = f"{self._merge_state_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as state:
+            json.dump(self.storage.append_state(), state)
+        os.replace(temp_file, self._merge_state_file)
+
+        with recorder.stage("cache_write"):
+            new_items_df = pd.DataFrame.from_records(records).reindex(columns=CACHE_COLUMNS)
+            # An index missing next to an existing cache is built from the whole cache when it is first needed.
+            index_complete = self.search_index.exists() or not self.storage.exists()
+            duplicates_complete = self.duplicate_index.exists() or not self.storage.exists()
+            added = self.storage.add_items(new_items_df)
+        recorder.count("cache_rows_written", added)
+        # Also run when nothing was added, to index the items of a batch whose merge crashed after the storage write.
+        if index_complete:
+            with recorder.stage("search_index"):
+                self.search_index.add_items(new_items_df.to_dict("records"))
+        if duplicates_complete:
+            with recorder.stage("duplicate_index"):
+                recorder.count("duplicates_found", self.duplicate_index.add_items(new_items_df.to_dict("records")))
+        os.remove(self._merge_state_file)
+        return added
+
+    def size_on_disk(self) -> int:
+        """Returns the number of bytes the cache and its link, search and duplicate indexes take on disk."""
+        return self.storage.size_on_disk() + self.search_index.size_on_disk() + self.duplicate_index.size_on_disk()
+
+    def compact(self, policy: Optional[RetentionPolicy] = None) -> CompactionReport:
+        """
+        Rewrites the cache storage without duplicates and without the items the retention policy expires,
+        rebuilds the link index and removes the expired items from the search and duplicate indexes.
+
+        Args:
+        - policy: The RetentionPolicy deciding which items expire, optional.
+
+        Returns: A CompactionReport with the rows removed and the disk space reclaimed.
+        """
+        started = time.perf_counter()
+        with self._merge_lock, recorder.stage("compact"):
+            bytes_before = self.size_on_disk()
+            expired = (policy.expired_links(self.storage.iter_items(), size_on_disk=bytes_before)
+                       if policy else set())
+            removed = self.storage.compact(expired_links=expired)
+            self.search_index.remove_links(expired)
+            self.duplicate_index.remove_links(expired)
+            bytes_after = self.size_on_disk()
+        recorder.count("cache_rows_removed", removed)
+        # Items logged by writers during the compaction.
+        self.merge_journal()
+        return CompactionReport(rows_removed=removed, expired=min(len(expired), removed), bytes_before=bytes_before,
+                                bytes_after=bytes_after, seconds=time.perf_counter() - started)
+
+    @property
+    def compacting(self) -> bool:
+        """True while a compaction started by `compact_in_background` is running."""
+        return self._compaction is not None and self._compaction.is_alive()
+
+    def compact_in_background(self, policy: Optional[RetentionPolicy] = None,
+                              on_done: Optional[Callable[[CompactionReport], None]] = None) -> threading.Thread:
+        """
+        Runs `compact` in a daemon thread, unless a background compaction is already running.
+
+        Args:
+        - policy: The RetentionPolicy deciding which items expire, optional.
+        - on_done: Called with the CompactionReport once the compaction has finished.
+
+        Returns: The thread running the compaction.
+        """
+        if self.compacting:
+            return self._compaction
+
+        def run() -> None:
+            try:
+                report = self.compact(policy=policy)
+            except Exception as e:
+                print(f"Error compacting the cache: {e}")
+                return
+            if on_done is not None:
+                on_done(report)
+
+        self._compaction = threading.Thread(target=run, name="cache-compaction", daemon=True)
+        self._compaction.start()
+        return self._compaction
 
-    def retrieve_news_from_cache(self, date, source_url=None) -> Dict[str, any]:
+    def export_news(self, output_file: str, date: Optional[str] = None,
+                    source_url: Optional[Union[str, Sequence[str]]] = None, chunk_size: int = CHUNK_SIZE) -> int:
+        """
+        Exports the cached news items to a typed columnar file, Parquet or Arrow IPC by its extension
+        (see src.columnar). The cache is streamed `chunk_size` items at a time, so it never has to fit in memory.
+
+        Args:
+        - output_file: The .parquet, .arrow or .feather file to write.
+        - date: Only the items published on this date (a YYYYMMDD prefix) are exported, optional.
+        - source_url: Only the items from this source URL (or list of them) are exported, optional.
+        - chunk_size: The number of items read and written at a time.
+
+        Returns: The number of items exported.
+        """
+        if not self.storage.exists():
+            print("Cache file does not exist.")
+            return 0
+        source_urls = [source_url] if isinstance(source_url, str) else source_url
+        with recorder.stage("export"):
+            exported = write_columnar(output_file, self.storage.iter_chunks(date=date or "", source_urls=source_urls,
+                                                                            chunk_size=chunk_size))
+        recorder.count("cache_rows_read", exported)
+        return exported
+
+    def import_news(self, input_file: str, date: Optional[str] = None,
+                    source_url: Optional[Union[str, Sequence[str]]] = None, chunk_size: int = CHUNK_SIZE,
+                    verbose: bool = False) -> int:
+        """
+        Caches the news items of a Parquet or Arrow IPC file, e.g. one written by `export_news`, `chunk_size`
+        items at a time. Every chunk goes through the write-ahead log and is merged like fetched news, so the
+        search and duplicate indexes are updated, items already cached are skipped, and concurrent writers
+        are safe.
+
+        Args:
+        - input_file: The .parquet, .arrow or .feather file to read.
+        - date: Only the items published on this date (a YYYYMMDD prefix) are imported, optional.
+        - source_url: Only the items from this source URL (or list of them) are imported, optional.
+        - chunk_size: The number of items read and merged at a time.
+        - verbose: Logs the progress of every chunk.
+
+        Returns: The number of items added to the cache.
+        """
+        source_urls = [source_url] if isinstance(source_url, str) else source_url
+        added = 0
+        for records in read_columnar(input_file, date=date or "", source_urls=source_urls, chunk_size=chunk_size):
+            with recorder.stage("import"):
+                self.journal.append(records)
+            added += self.merge_journal(blocking=True) or 0
+            log_verbose(message=f"{len(records)} news item(s) read from {input_file}, {added} new so far.",
+                        verbose=verbose)
+        return added
+
+    def retrieve_news_from_cache(self, date, source_url: Optional[Union[str, Sequence[str]]] = None,
+                                 limit: Optional[int] = None) -> Iterator[Dict[str, any]]:
         """
         Retrieves news items from the cache filtered by date and optionally by source URL.
 
         Args:
         - date: Publication date to filter by.
-        - source_url: Source URL to further filter by, optional.
+        - source_url: Source URL (or a list of them) to further filter by, optional.
+        - limit: Max number of news items to retrieve (None for no limit).
+
+        Returns: Iterator over the filtered news item dictionaries, read lazily from the cache storage.
+        """
+        if not self.storage.exists():
+            print("Cache file does not exist.")
+            return iter([])
+
+        source_urls = [source_url] if isinstance(source_url, str) else source_url
+        return recorder.iterate("cache_read", self.storage.query(date=date, source_urls=source_urls, limit=limit),
+                                counter="cache_rows_read")
 
-        Returns: Filtered list of news item dictionaries.
+    def _search_index(self) -> Optional[SearchIndex]:
+        """
+        Returns the search index, building it from the whole cache if it is missing or outdated, or None
+        without a cache.
         """
-        if not path.exists(self.cache_file):
+        if not self.storage.exists():
             print("Cache file does not exist.")
+            return None
+        if not self.search_index.exists():
+            self.search_index.rebuild(self.storage.iter_items())
+        return self.search_index
+
+    def search_news(self, query: str, date: Optional[str] = None,
+                    source_url: Optional[Union[str, Sequence[str]]] = None,
+                    limit: Optional[int] = None, category: Optional[str] = None,
+                    start: Optional[int] = None, end: Optional[int] = None) -> List[Dict[str, any]]:
+        """
+        Searches the titles and descriptions of the cached news items, best matches first.
+
+        The search index is built from the whole cache the first time it is needed.
+
+        Args:
+        - query: The words to search for; items matching any of them are returned, ranked with BM25.
+        - date: Publication date to filter by, optional.
+        - source_url: Source URL (or a list of them) to filter by, optional.
+        - limit: Max number of news items to retrieve (None for no limit).
+        - category: Category to filter by, optional.
+        - start, end: Publication time range to filter by (Unix timestamps, both inclusive), optional.
+
+        Returns: The matching news item dictionaries.
+        """
+        if (search_index := self._search_index()) is None:
+            return []
+        source_urls = [source_url] if isinstance(source_url, str) else source_url
+        with recorder.stage("search"):
+            return search_index.search(query, date=date, source_urls=source_urls, limit=limit, category=category,
+                                       start=start, end=end)
+
+    def news_by_category(self, category: str, date: Optional[str] = None,
+                         source_url: Optional[Union[str, Sequence[str]]] = None,
+                         limit: Optional[int] = None) -> List[Dict[str, any]]:
+        """
+        Retrieves the cached news items in a category, using the category index of the search index.
+
+        Args:
+        - category: The category, compared case-insensitively.
+        - date: Publication date to filter by, optional.
+        - source_url: Source URL (or a list of them) to filter by, optional.
+        - limit: Max number of news items to retrieve (None for no limit).
+
+        Returns: The news item dictionaries, ordered by publication date.
+        """
+        if (search_index := self._search_index()) is None:
+            return []
+        source_urls = [source_url] if isinstance(source_url, str) else source_url
+        with recorder.stage("cache_read"):
+            return search_index.items_in_category(category, date=date, source_urls=source_urls, limit=limit)
+
+    def news_in_range(self, start: Optional[int] = None, end: Optional[int] = None, date: Optional[str] = None,
+                      source_url: Optional[Union[str, Sequence[str]]] = None, category: Optional[str] = None,
+                      limit: Optional[int] = None) -> List[Dict[str, any]]:
+        """
+        Retrieves the cached news items published in a time range, newest first, using the publication time
+        index of the search index.
+
+        Args:
+        - start: The earliest publication time (Unix timestamp, inclusive), or None for no lower bound.
+        - end: The latest publication time (Unix timestamp, inclusive), or None for no upper bound.
+        - date: Publication date to filter by, optional.
+        - source_url: Source URL (or a list of them) to filter by, optional.
+        - category: Category to filter by, optional.
+        - limit: Max number of news items to retrieve (None for no limit).
+
+        Returns: The news item dictionaries.
+        """
+        if (search_index := self._search_index()) is None:
+            return []
+        source_urls = [source_url] if isinstance(source_url, str) else source_url
+        with recorder.stage("cache_read"):
+            return search_index.items_in_range(start, end, date=date, source_urls=source_urls, category=category,
+                                               limit=limit)
+
+    def top_categories(self, date: Optional[str] = None, source_url: Optional[Union[str, Sequence[str]]] = None,
+                       limit: Optional[int] = DEFAULT_TOP_CATEGORIES, start: Optional[int] = None,
+                       end: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Returns the most frequent categories of the cached news items, as (category, item count) pairs.
+
+        Args:
+        - date: Only items published in this period (a YYYYMMDD prefix), optional.
+        - source_url: Source URL (or a list of them) to filter by, optional.
+        - limit: Max number of categories to return (None for all).
+        - start, end: Publication time range to filter by (Unix timestamps, both inclusive), optional.
+        """
+        if (search_index := self._search_index()) is None:
             return []
+        source_urls = [source_url] if isinstance(source_url, str) else source_url
+        return search_index.top_categories(date=date, source_urls=source_urls, limit=limit, start=start, end=end)
 
-        cache_df = pd.read_csv(self.cache_file, dtype={"pubDate": str})
+    def collapse_duplicates(self, news_items: Iterable[Dict[str, any]],
+                            limit: Optional[int] = None) -> Iterator[Dict[str, any]]:
+        """
+        Lazily drops the near-duplicates of earlier items from news items read from the cache, keeping the
+        first item of every cluster of the duplicate index (see src.dedup). The duplicate index is built from
+        the whole cache the first time it is needed; items that are not indexed are kept.
 
-        filter_condition = cache_df['pubDate'].str.contains(date)
-        if source_url:
-            filter_condition &= (cache_df['source_url'] == source_url)
+        Args:
+        - news_items: The news items, e.g. from `retrieve_news_from_cache` or `search_news`, in output order.
+        - limit: Max number of news items to return after collapsing (None for no limit).
 
-        return cache_df[filter_condition].to_dict('records')
+        Returns: Iterator over the news item dictionaries.
+        """
+        if self.storage.exists() and not self.duplicate_index.exists():
+            with recorder.stage("duplicate_index"):
+                self.duplicate_index.rebuild(self.storage.iter_items())
+        return islice(collapse(news_items, clusters=self.duplicate_index.clusters), limit)
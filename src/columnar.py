@@ -0,0 +1,171 @@
+import json
+from os import path, remove, replace
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Sequence
+from src.storage import (CACHE_COLUMNS, LIST_COLUMNS, PUBLISHED_COLUMN, date_prefix_upper_bound, decode_list,
+                         to_text)
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+CHUNK_SIZE = 100_000
+COMPRESSION = "zstd"
+# Formats by file extension: Parquet, or the Arrow IPC file format (also known as Feather v2).
+COLUMNAR_FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+
+
+def columnar_format(file: str) -> str:
+    """
+    Returns the columnar format of a file from its extension, "parquet" or "arrow".
+
+    Raises: ValueError for any other extension.
+    """
+    file_format = COLUMNAR_FORMATS.get(path.splitext(file)[1].lower())
+    if file_format is None:
+        raise ValueError(f"Unknown columnar format, expected a {', '.join(COLUMNAR_FORMATS)} file: {file}")
+    return file_format
+
+
+def _pyarrow() -> Any:
+    """Imports pyarrow, which is only needed for columnar files."""
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Columnar export and import require pyarrow, install it with 'pip install pyarrow'.") from e
+    return pyarrow
+
+
+def news_schema() -> "pa.Schema":
+    """
+    Returns the Arrow schema of exported news items: text columns are strings, authors and categories lists
+    of strings, and the publication time a UTC timestamp in seconds.
+    """
+    pa = _pyarrow()
+    types = {column: pa.list_(pa.string()) if column in LIST_COLUMNS else pa.string() for column in CACHE_COLUMNS}
+    types[PUBLISHED_COLUMN] = pa.timestamp("s", tz="UTC")
+    return pa.schema(list(types.items()))
+
+
+def to_list(value: Any) -> Optional[List[str]]:
+    """Converts a stored author or category value to a list of strings: a single value becomes a one-item list."""
+    value = decode_list(to_text(value))
+    if value is None:
+        return None
+    return [str(element) for element in value] if isinstance(value, list) else [str(value)]
+
+
+def to_lists(values: "pd.Series") -> List[Optional[List[str]]]:
+    """
+    Converts a column of stored author or category values with `to_list`. When every value is a JSON array
+    of strings, as the cache stores them, they are all decoded with a single `json.loads` call.
+    """
+    texts = [to_text(value) for value in values]
+    present = [text for text in texts if text is not None]
+    try:
+        if not all(isinstance(text, str) and text.startswith("[") for text in present):
+            raise ValueError("Not only JSON arrays")
+        decoded = json.loads(f"[{','.join(present)}]")
+        if len(decoded) != len(present):
+            raise ValueError("Not one JSON array per value")
+        decoded = iter(decoded)
+        lists = [None if text is None else next(decoded) for text in texts]
+        if all(isinstance(element, str) for value in lists if value is not None for element in value):
+            return lists
+    except ValueError:
+        pass
+    return [to_list(text) for text in texts]
+
+
+def to_table(chunk_df: "pd.DataFrame", schema: "pa.Schema") -> "pa.Table":
+    """Converts a chunk of stored items (see `StorageBackend.iter_chunks`) to an Arrow table with the news schema."""
+    import pandas as pd
+    pa = _pyarrow()
+    arrays = []
+    for field in schema:
+        values = chunk_df[field.name]
+        if field.name in LIST_COLUMNS:
+            arrays.append(pa.array(to_lists(values), type=field.type))
+        elif field.name == PUBLISHED_COLUMN:
+            seconds = pa.array(pd.to_numeric(values, errors="coerce"), from_pandas=True)
+            arrays.append(seconds.cast(pa.int64(), safe=False).cast(field.type))
+        else:
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_columnar(output_file: str, chunks: Iterable["pd.DataFrame"]) -> int:
+    """
+    Streams chunks of stored items into a Parquet or Arrow IPC file, chosen by the file extension, one
+    row group or record batch per chunk, so only one chunk is held in memory at a time. The file is
+    written next to its destination and moved into place once complete.
+
+    Args:
+    - output_file: The path of the file to write.
+    - chunks: DataFrames of stored items, e.g. from `StorageBackend.iter_chunks`.
+
+    Returns: The number of items written.
+    """
+    file_format = columnar_format(output_file)
+    pa = _pyarrow()
+    schema = news_schema()
+    temp_file = f"{output_file}.tmp"
+    written = 0
+    try:
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+            writer = pq.ParquetWriter(temp_file, schema, compression=COMPRESSION)
+        else:
+            writer = pa.ipc.new_file(temp_file, schema, options=pa.ipc.IpcWriteOptions(compression=COMPRESSION))
+        with writer:
+            for chunk_df in chunks:
+                table = to_table(chunk_df, schema)
+                writer.write_table(table)
+                written += table.num_rows
+        replace(temp_file, output_file)
+    finally:
+        if path.exists(temp_file):
+            remove(temp_file)
+    return written
+
+
+def read_columnar(input_file: str, date: str = "", source_urls: Optional[Sequence[str]] = None,
+                  chunk_size: int = CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Reads news items from a Parquet or Arrow IPC file in chunks. The date and source filters are pushed
+    down to the reader, so Parquet row groups whose statistics rule them out are skipped.
+
+    Files need a `link` column; other columns missing from the file are left out of the items. Publication
+    times are given back as Unix timestamps and authors and categories as lists.
+
+    Args:
+    - input_file: The path of the file to read.
+    - date: Only the items published on this date (a YYYYMMDD prefix) are read, "" for every item.
+    - source_urls: Only the items from these sources are read, optional.
+    - chunk_size: The maximum number of items per chunk.
+
+    Returns: Iterator over lists of news item dictionaries.
+    """
+    file_format = columnar_format(input_file)
+    pa = _pyarrow()
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(input_file, format="parquet" if file_format == "parquet" else "ipc")
+    names = dataset.schema.names
+    if "link" not in names:
+        raise ValueError(f"No link column in {input_file}")
+    condition = None
+    if date:
+        condition = (pc.field("pubDate") >= date) & (pc.field("pubDate") < date_prefix_upper_bound(date))
+    if source_urls:
+        in_sources = pc.field("source_url").isin(list(source_urls))
+        condition = in_sources if condition is None else condition & in_sources
+    columns = [column for column in CACHE_COLUMNS if column in names]
+    for batch in dataset.to_batches(columns=columns, filter=condition, batch_size=chunk_size):
+        if not batch.num_rows:
+            continue
+        table = pa.Table.from_batches([batch])
+        if PUBLISHED_COLUMN in columns and pa.types.is_timestamp(table.schema.field(PUBLISHED_COLUMN).type):
+            published = table.column(PUBLISHED_COLUMN)
+            seconds = pc.cast(published, pa.timestamp("s", tz=published.type.tz), safe=False).cast(pa.int64())
+            table = table.set_column(columns.index(PUBLISHED_COLUMN), PUBLISHED_COLUMN, seconds)
+        yield table.to_pylist()
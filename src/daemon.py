@@ -0,0 +1,274 @@
+import heapq
+import random
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from src.cache_manager import CacheManager
+from src.http_cache import ValidatorStore
+from src.fetch import complete_feeds, fetch_feeds, parse_feed, DEFAULT_PER_HOST, DEFAULT_WORKERS
+from src.retention import CompactionReport, RetentionPolicy
+from src.rss_reader import parse_channel_hints
+from src.utils import log_verbose
+
+DEFAULT_INTERVAL = 15 * 60
+DEFAULT_MIN_INTERVAL = 60
+DEFAULT_MAX_INTERVAL = 6 * 60 * 60
+DEFAULT_FLUSH_INTERVAL = 60
+DEFAULT_COMPACT_INTERVAL = 60 * 60
+JITTER = 0.1
+# The interval is steered towards polls that find new content half of the time, by at most x0.5 or x1.5 per poll.
+TARGET_CHANGE_RATE = 0.5
+MIN_STEP = 0.5
+MAX_STEP = 1.5
+# Weight left to the earlier polls by every new one, so the change rate follows the feed's recent behaviour.
+HISTORY_DECAY = 0.8
+
+
+class FeedState:
+    """
+    Polling state of a single feed.
+
+    Attributes:
+    - url: The feed URL.
+    - interval: The current polling interval in seconds, adapted to how often the feed changes.
+    - min_interval: The shortest allowed interval, raised by the feed's <ttl>.
+    - skip_hours: GMT hours (0-23) in which the feed asks not to be polled (<skipHours>).
+    - failures: The number of consecutive failed polls.
+    - polls: The number of successful polls, each earlier one weighted down by HISTORY_DECAY.
+    - changes: The number of those polls that returned new content, weighted the same way.
+    """
+    def __init__(self, url: str, interval: float, min_interval: float):
+        self.url = url
+        self.interval = interval
+        self.min_interval = min_interval
+        self.skip_hours: Set[int] = set()
+        self.failures = 0
+        self.polls = 0.0
+        self.changes = 0.0
+
+    @property
+    def change_rate(self) -> Optional[float]:
+        """The share of recent polls that returned new content, or None before the first successful poll."""
+        return self.changes / self.polls if self.polls else None
+
+
+class PollScheduler:
+    """
+    Decides when each feed is polled next.
+
+    Every feed has its own interval, adapted after every poll to the feed's observed change rate (see
+    `FeedState.change_rate`): it shrinks while more than TARGET_CHANGE_RATE of the recent polls found
+    new content and grows while fewer did, within [min_interval, max_interval], and never goes below
+    the feed's <ttl>. Failing feeds
+    back off exponentially up to max_interval. Polls that would fall into one of the feed's <skipHours>
+    are moved to the next allowed hour, and every delay gets a random jitter so polls do not come in bursts.
+
+    Attributes:
+    - max_interval: The longest polling interval and backoff in seconds.
+    - jitter: The relative jitter applied to every delay, e.g. 0.1 for +/-10%.
+    """
+    def __init__(self, urls: List[str], interval: float = DEFAULT_INTERVAL,
+                 min_interval: float = DEFAULT_MIN_INTERVAL, max_interval: float = DEFAULT_MAX_INTERVAL,
+                 jitter: float = JITTER, clock: Callable[[], float] = time.time,
+                 rng: Callable[[], float] = random.random):
+        """
+        Args:
+        - urls: The feeds to poll. All of them are due immediately.
+        - interval: The initial polling interval in seconds.
+        - min_interval: The shortest polling interval in seconds.
+        - max_interval: The longest polling interval and backoff in seconds.
+        - jitter: The relative jitter applied to every delay.
+        - clock: Returns the current Unix time, replaceable for tests.
+        - rng: Returns a random float in [0, 1), replaceable for tests.
+        """
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self._clock = clock
+        self._rng = rng
+        self.feeds: Dict[str, FeedState] = {
+            url: FeedState(url, interval=min(max(interval, min_interval), max_interval), min_interval=min_interval)
+            for url in dict.fromkeys(urls)}
+        now = clock()
+        self._queue: List[Tuple[float, str]] = [(now, url) for url in self.feeds]
+        heapq.heapify(self._queue)
+
+    def pop_due(self) -> List[str]:
+        """Removes and returns the feeds whose poll time has come."""
+        now = self._clock()
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            due.append(heapq.heappop(self._queue)[1])
+        return due
+
+    def seconds_until_next(self) -> Optional[float]:
+        """Returns the time until the next scheduled poll, or None if nothing is scheduled."""
+        if not self._queue:
+            return None
+        return max(0.0, self._queue[0][0] - self._clock())
+
+    def record_success(self, url: str, changed: bool, ttl: Optional[int] = None,
+                       skip_hours: Optional[Set[int]] = None) -> float:
+        """
+        Reschedules a feed after a successful poll and returns the Unix time of its next poll.
+
+        Args:
+        - url: The polled feed.
+        - changed: True if the poll returned new content.
+        - ttl: The feed's <ttl> in minutes, if it has one.
+        - skip_hours: The feed's <skipHours>, if known.
+        """
+        state = self.feeds[url]
+        state.polls = state.polls * HISTORY_DECAY + 1
+        state.changes = state.changes * HISTORY_DECAY + changed
+        state.failures = 0
+        if ttl is not None:
+            state.min_interval = max(state.min_interval, ttl * 60)
+        if skip_hours is not None:
+            state.skip_hours = skip_hours
+        step = TARGET_CHANGE_RATE / state.change_rate if state.changes else MAX_STEP
+        state.interval *= min(max(step, MIN_STEP), MAX_STEP)
+        state.interval = min(max(state.interval, state.min_interval), max(self.max_interval, state.min_interval))
+        return self._schedule(state, state.interval)
+
+    def record_failure(self, url: str) -> float:
+        """
+        Reschedules a feed after a failed poll with exponential backoff and returns the Unix time of its next poll.
+        """
+        state = self.feeds[url]
+        state.failures += 1
+        return self._schedule(state, min(state.interval * 2 ** state.failures, self.max_interval))
+
+    def _schedule(self, state: FeedState, delay: float) -> float:
+        """Queues the next poll of a feed after the delay, with jitter and outside of its skip hours."""
+        delay *= 1 + self.jitter * (2 * self._rng() - 1)
+        next_poll = self._clock() + delay
+        for _ in range(24):
+            poll_time = datetime.fromtimestamp(next_poll, tz=timezone.utc)
+            if poll_time.hour not in state.skip_hours:
+                break
+            next_poll = poll_time.replace(minute=0, second=0, microsecond=0).timestamp() + 3600
+        heapq.heappush(self._queue, (next_poll, state.url))
+        return next_poll
+
+
+class FeedDaemon:
+    """
+    Polls feeds continuously, keeping the cache manager, the validator store and the HTTP pool warm.
+
+    Due feeds are fetched concurrently with conditional requests. Parsed items are buffered and written
+    to the cache in one batch every `flush_interval` seconds and on shutdown. With a retention policy, the
+    cache is compacted in a background thread every `compact_interval` seconds. Items flushed meanwhile
+    wait in the cache's write-ahead log and are merged when the compaction ends, so polling never waits for it.
+
+    Attributes:
+    - scheduler: The PollScheduler deciding when each feed is polled.
+    - cache_manager: The CacheManager the items are cached with.
+    - validators: The ValidatorStore used for conditional requests.
+    - retention: The RetentionPolicy applied by the periodic compactions, optional.
+    """
+    def __init__(self, scheduler: PollScheduler, cache_manager: CacheManager, validators: ValidatorStore,
+                 limit: Optional[int] = None, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_workers: int = DEFAULT_WORKERS, per_host_limit: int = DEFAULT_PER_HOST,
+                 retention: Optional[RetentionPolicy] = None, compact_interval: float = DEFAULT_COMPACT_INTERVAL,
+                 verbose: bool = False):
+        self.scheduler = scheduler
+        self.cache_manager = cache_manager
+        self.validators = validators
+        self.limit = limit
+        self.flush_interval = flush_interval
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.retention = retention
+        self.compact_interval = compact_interval
+        self.verbose = verbose
+        self._pending: List[Tuple[str, List[Dict[str, str]]]] = []
+        self._last_flush = time.monotonic()
+        self._last_compaction = time.monotonic()
+        self._stop = threading.Event()
+
+    def poll_due(self) -> int:
+        """
+        Fetches every due feed, buffers its items and reschedules it. Returns the number of feeds polled.
+
+        A feed whose fetch or parse raised is rescheduled as failed, and so are the feeds left over if the
+        fetching itself stops, so no feed drops out of the schedule.
+        """
+        due = self.scheduler.pop_due()
+        remaining = set(due)
+        try:
+            for url, xml_data in fetch_feeds(urls=due, max_workers=self.max_workers,
+                                             per_host_limit=self.per_host_limit, validators=self.validators):
+                remaining.discard(url)
+                try:
+                    if xml_data is None:
+                        next_poll = self.scheduler.record_success(url, changed=False)
+                    elif not xml_data:
+                        next_poll = self.scheduler.record_failure(url)
+                    else:
+                        hints = parse_channel_hints(xml_data)
+                        self._pending.append((url, parse_feed(url=url, xml=xml_data, limit=self.limit)))
+                        next_poll = self.scheduler.record_success(url, changed=True, ttl=hints.get("ttl"),
+                                                                  skip_hours=hints["skip_hours"])
+                except Exception as e:
+                    print(f"Error polling {url}: {e}")
+                    next_poll = self.scheduler.record_failure(url)
+                log_verbose(message=f"Polled {url}, next poll at {datetime.fromtimestamp(next_poll):%H:%M:%S}.",
+                            verbose=self.verbose)
+        except Exception as e:
+            print(f"Error polling feeds: {e}")
+        for url in due:
+            if url in remaining:
+                self.scheduler.record_failure(url)
+        return len(due)
+
+    def flush(self) -> None:
+        """
+        Writes the buffered items to the cache and saves the HTTP validators of their feeds. If the write fails,
+        the items stay buffered for the next flush and the validators are not saved.
+        """
+        if self._pending and self.cache_manager.cache_feeds(feeds=self._pending, verbose=self.verbose) is not None:
+            self.validators.commit(complete_feeds(feeds=self._pending, limit=self.limit))
+            self.validators.save()
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def compact(self) -> None:
+        """Starts a background compaction with the retention policy, whose report is logged when it is done."""
+        def report(result: CompactionReport) -> None:
+            log_verbose(message=str(result), verbose=self.verbose)
+
+        self.cache_manager.compact_in_background(policy=self.retention, on_done=report)
+        self._last_compaction = time.monotonic()
+
+    def stop(self, *_) -> None:
+        """Asks the daemon to stop after the current poll. Usable as a signal handler."""
+        self._stop.set()
+
+    def run(self, handle_signals: bool = True) -> None:
+        """
+        Polls feeds until `stop` is called (or SIGINT/SIGTERM is received), then flushes pending cache writes.
+
+        Args:
+        - handle_signals: Installs SIGINT and SIGTERM handlers that stop the daemon gracefully.
+         Only possible from the main thread.
+        """
+        if handle_signals:
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+        try:
+            while not self._stop.is_set():
+                self.poll_due()
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self.flush()
+                if self.retention and time.monotonic() - self._last_compaction >= self.compact_interval:
+                    self.compact()
+                wait = self.scheduler.seconds_until_next()
+                flush_wait = max(0.0, self.flush_interval - (time.monotonic() - self._last_flush))
+                self._stop.wait(flush_wait if wait is None else min(wait, flush_wait))
+        finally:
+            self.flush()
+            if self.cache_manager.compacting:
+                self.cache_manager.compact_in_background().join()
+            log_verbose(message="Daemon stopped, pending news items cached.", verbose=self.verbose)
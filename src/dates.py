@@ -0,0 +1,150 @@
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Optional
+
+MONTHS = {month: number for number, month in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), start=1)}
+ZONE_OFFSETS = {
+    "GMT": 0, "UT": 0, "UTC": 0, "Z": 0,
+    "EST": -5 * 60, "EDT": -4 * 60, "CST": -6 * 60, "CDT": -5 * 60,
+    "MST": -7 * 60, "MDT": -6 * 60, "PST": -8 * 60, "PDT": -7 * 60,
+}
+RFC822_PATTERN = re.compile(
+    r"\s*(?:[A-Za-z]+,?\s*)?(\d{1,2})\s+([A-Za-z]{3})[A-Za-z]*\.?\s+(\d{2,4})"
+    r"(?:\s+(\d{1,2}):(\d{2})(?::(\d{2}))?)?\s*([+-]\d{2}:?\d{2}|[A-Za-z]+)?\s*$")
+CACHE_SIZE = 65_536
+
+
+@lru_cache(maxsize=None)
+def offset_timezone(minutes: int) -> timezone:
+    """Returns the (shared) timezone for a UTC offset in minutes."""
+    return timezone(timedelta(minutes=minutes))
+
+
+def _zone_offset(zone: Optional[str]) -> int:
+    """Converts a numeric (+0200, -05:00) or named (GMT, EST) zone to minutes east of UTC. Unknown zones are UTC."""
+    if not zone:
+        return 0
+    if zone[0] in "+-":
+        digits = zone[1:].replace(":", "")
+        minutes = int(digits[:2]) * 60 + int(digits[2:])
+        return -minutes if zone[0] == "-" else minutes
+    return ZONE_OFFSETS.get(zone.upper(), 0)
+
+
+def _parse_rfc822_fast(date_str: str) -> Optional[datetime]:
+    """Parses the exact form 'Wed, 02 Oct 2002 15:00:00 +0200' by position, without any regular expression."""
+    if len(date_str) != 31 or date_str[3:5] != ", " or date_str[25] != " " or date_str[26] not in "+-":
+        return None
+    month = MONTHS.get(date_str[8:11])
+    digits = (date_str[5:7], date_str[12:16], date_str[17:19], date_str[20:22], date_str[23:25], date_str[27:31])
+    if month is None or not all(part.isdigit() for part in digits):
+        return None
+    day, year, hour, minute, second, zone = digits
+    offset = int(zone[:2]) * 60 + int(zone[2:])
+    return datetime(int(year), month, int(day), int(hour), int(minute), int(second),
+                    tzinfo=offset_timezone(-offset if date_str[26] == "-" else offset))
+
+
+def _parse_rfc822_variant(date_str: str) -> Optional[datetime]:
+    """Parses RFC-822 variants: named zones, missing weekday, seconds or time, two-digit years, long month names."""
+    match = RFC822_PATTERN.match(date_str)
+    if not match or (month := MONTHS.get(match.group(2).title())) is None:
+        return None
+    day, _, year, hour, minute, second, zone = match.groups()
+    year = int(year)
+    if year < 100:
+        year += 2000 if year < 50 else 1900
+    return datetime(year, month, int(day), int(hour or 0), int(minute or 0), int(second or 0),
+                    tzinfo=offset_timezone(_zone_offset(zone)))
+
+
+def _parse_iso8601(date_str: str) -> Optional[datetime]:
+    """Parses ISO-8601 dates as used by Atom feeds, e.g. '2002-10-02T15:00:00Z'. Naive values are taken as UTC."""
+    try:
+        parsed = datetime.fromisoformat(date_str.strip())
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_pub_date(date_str: str) -> Optional[datetime]:
+    """
+    Parses a feed publication date into a timezone-aware datetime, or returns None if it cannot be parsed.
+
+    The common RFC-822 form is handled by a positional fast path. Other RFC-822 variants, ISO-8601 dates
+    and finally anything `email.utils` understands are tried in turn. Results are memoized, since many
+    items in a feed share the same timestamp.
+    """
+    date_str = date_str.strip()
+    for parse in (_parse_rfc822_fast, _parse_rfc822_variant, _parse_iso8601):
+        try:
+            if (parsed := parse(date_str)) is not None:
+                return parsed
+        except ValueError:
+            pass
+    from email.utils import parsedate_to_datetime
+    try:
+        parsed = parsedate_to_datetime(date_str)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_simple_date(date_str: str) -> str:
+    """Converts a feed publication date to YYYYMMDD in the date's own timezone, or '' if it cannot be parsed."""
+    if (parsed := parse_pub_date(date_str)) is None:
+        return ""
+    return f"{parsed.year:04d}{parsed.month:02d}{parsed.day:02d}"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_readable_date(date_str: str) -> str:
+    """Converts a YYYYMMDD date to the YYYY-Month-DD display format, returning the input unchanged if it is invalid."""
+    try:
+        return datetime.strptime(date_str, '%Y%m%d').strftime('%Y-%B-%d')
+    except (TypeError, ValueError):
+        return date_str
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_timestamp(date_str: str) -> Optional[int]:
+    """Converts a feed publication date to a Unix timestamp in seconds, or None if it cannot be parsed."""
+    if (parsed := parse_pub_date(date_str)) is None:
+        return None
+    return int(parsed.timestamp())
+
+
+def parse_range_bound(value: str, end: bool = False) -> int:
+    """
+    Converts a --from/--to value to a Unix timestamp.
+
+    A YYYYMMDD date stands for the start of that day (UTC), or for its last second if `end` is True, so a
+    range includes its whole end day. ISO-8601 dates and times such as 2024-04-03T18:30 are taken as UTC
+    unless they carry an offset.
+
+    Raises: ValueError if the value is neither.
+    """
+    value = value.strip()
+    if len(value) == 8 and value.isdigit():
+        day = datetime.strptime(value, "%Y%m%d").replace(tzinfo=timezone.utc)
+        return int(day.timestamp()) + (24 * 60 * 60 - 1 if end else 0)
+    if (parsed := _parse_iso8601(value)) is None:
+        raise ValueError(f"Invalid date, expected YYYYMMDD or YYYY-MM-DDTHH:MM: {value}")
+    return int(parsed.timestamp())
+
+
+def parse_range_end(value: str) -> int:
+    """Converts a --to value to a Unix timestamp; a YYYYMMDD date includes the whole day."""
+    return parse_range_bound(value, end=True)
+
+
+def timestamp_to_readable(timestamp: Any) -> Any:
+    """Converts a Unix timestamp to 'YYYY-MM-DD HH:MM:SS UTC', returning values that are not timestamps unchanged."""
+    try:
+        return datetime.fromtimestamp(int(timestamp), tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+    except (TypeError, ValueError, OverflowError, OSError):
+        return timestamp
@@ -0,0 +1,347 @@
+import zlib
+from contextlib import closing
+from functools import lru_cache
+from os import path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from src.search import INSERT_BATCH_SIZE, SELECT_BATCH_SIZE, tokenize
+
+if TYPE_CHECKING:
+    import numpy as np
+    import sqlite3
+
+SHINGLE_SIZE = 2
+PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = PERMUTATIONS // BANDS
+# Bits of every MinHash value kept to check candidates, see `estimate_similarity`.
+CHECK_BITS = 8
+DEFAULT_SIMILARITY = 0.6
+MINHASH_SEED = 20240101
+MERSENNE_PRIME = (1 << 61) - 1
+DEDUPLICATED_FIELDS = ("title", "description")
+
+
+def shingles(item: Dict[str, Any]) -> Set[int]:
+    """
+    Returns the hashed word shingles (SHINGLE_SIZE consecutive words, or single words for shorter texts) of
+    an item's title and description. Words are tokenized as for search, so markup, case and stop words do not
+    tell two copies of a story apart.
+    """
+    tokens = [token for field in DEDUPLICATED_FIELDS for token in tokenize(item.get(field))]
+    size = min(SHINGLE_SIZE, len(tokens))
+    return {zlib.crc32(" ".join(tokens[start:start + size]).encode("utf-8"))
+            for start in range(len(tokens) - size + 1)} if size else set()
+
+
+@lru_cache(maxsize=1)
+def _hash_parameters() -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Returns the fixed random parameters of the MinHash permutations and of the band keys."""
+    import numpy as np
+    rng = np.random.RandomState(MINHASH_SEED)
+    multipliers = rng.randint(1, 1 << 32, size=(PERMUTATIONS, 1), dtype=np.uint64)
+    increments = rng.randint(0, 1 << 32, size=(PERMUTATIONS, 1), dtype=np.uint64)
+    row_weights = rng.randint(1, 1 << 63, size=ROWS_PER_BAND, dtype=np.uint64) | np.uint64(1)
+    band_salts = rng.randint(0, 1 << 63, size=BANDS, dtype=np.uint64)
+    return multipliers, increments, row_weights, band_salts
+
+
+def minhash(shingle_hashes: Set[int]) -> Optional["np.ndarray"]:
+    """
+    Returns the MinHash signature of a set of 32-bit shingle hashes: for each of PERMUTATIONS hash functions
+    h(x) = ((a * x + b) mod 2^61-1) mod 2^32, the smallest value over the set. Two sets agree on a position
+    with a probability equal to their Jaccard similarity. Returns None for an empty set.
+    """
+    if not shingle_hashes:
+        return None
+    import numpy as np
+    multipliers, increments, _, _ = _hash_parameters()
+    values = np.fromiter(shingle_hashes, dtype=np.uint64, count=len(shingle_hashes))
+    # a and x are below 2^32, so a * x + b stays below 2^64.
+    hashed = (multipliers * values + increments) % np.uint64(MERSENNE_PRIME) & np.uint64(0xFFFFFFFF)
+    return hashed.min(axis=1)
+
+
+def band_keys(signature: "np.ndarray") -> List[int]:
+    """
+    Returns the locality-sensitive hashing keys of a signature, one per band of ROWS_PER_BAND positions.
+    Items whose signatures are equal on a whole band share its key, which happens for at least one of the
+    BANDS bands with probability 1 - (1 - s^ROWS_PER_BAND)^BANDS for Jaccard similarity s: 0.98 at s = 0.7,
+    0.22 at s = 0.3.
+    """
+    import numpy as np
+    _, _, row_weights, band_salts = _hash_parameters()
+    keys = (signature.reshape(BANDS, ROWS_PER_BAND) * row_weights).sum(axis=1, dtype=np.uint64) ^ band_salts
+    return keys.view(np.int64).tolist()
+
+
+def check_bytes(signature: "np.ndarray") -> bytes:
+    """Returns the lowest CHECK_BITS bits of every MinHash value, stored to check candidate duplicates."""
+    import numpy as np
+    return (signature & np.uint64((1 << CHECK_BITS) - 1)).astype(np.uint8).tobytes()
+
+
+def estimate_similarities(check: bytes, others: List[bytes]) -> "np.ndarray":
+    """
+    Estimates the Jaccard similarity of an item to each of several others from their check bytes, in one
+    vectorized comparison. Truncated MinHash values also agree by chance, with probability 2^-CHECK_BITS,
+    which is corrected for (b-bit MinHash).
+    """
+    import numpy as np
+    agreement = (np.frombuffer(b"".join(others), dtype=np.uint8).reshape(len(others), -1)
+                 == np.frombuffer(check, dtype=np.uint8)).mean(axis=1)
+    chance = 1 / (1 << CHECK_BITS)
+    return np.maximum(0.0, (agreement - chance) / (1 - chance))
+
+
+def estimate_similarity(check: bytes, other: bytes) -> float:
+    """Estimates the Jaccard similarity of two items from their check bytes, see `estimate_similarities`."""
+    return float(estimate_similarities(check, [other])[0])
+
+
+class DuplicateIndex:
+    """
+    A persistent index of near-duplicate news items, e.g. a wire story syndicated by several sources under
+    different links, found by MinHash with locality-sensitive hashing over titles and descriptions.
+
+    The index is an SQLite database next to the cache. Every item is a document with its cluster and the
+    check bytes of its MinHash signature, and is filed in buckets keyed by the bands of its signature (see
+    `band_keys`). A new item is compared only with the documents sharing one of its buckets, found with one
+    index lookup per band, so adding items costs the same whatever the size of the index and no pair of
+    items is compared otherwise. An item whose estimated similarity to one of them reaches `similarity` joins
+    that document's cluster; otherwise it starts a new cluster, whose id is its own document id, making it
+    the canonical item of the cluster. A duplicate is only filed in the buckets its cluster is not in yet,
+    so buckets do not grow with the number of copies of a story.
+
+    Attributes:
+    - index_file: The path to the SQLite index database.
+    - similarity: The estimated Jaccard similarity of word shingles from which two items are duplicates.
+    """
+    SCHEMA_VERSION = 1
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY,
+            link TEXT NOT NULL UNIQUE,
+            cluster_id INTEGER NOT NULL,
+            signature BLOB
+        );
+        CREATE INDEX IF NOT EXISTS documents_cluster ON documents (cluster_id);
+        CREATE TABLE IF NOT EXISTS buckets (
+            key INTEGER NOT NULL,
+            document_id INTEGER NOT NULL,
+            PRIMARY KEY (key, document_id)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, index_file: str, similarity: float = DEFAULT_SIMILARITY):
+        self.index_file = index_file
+        self.similarity = similarity
+
+    def exists(self) -> bool:
+        """Returns True if the index has been created with the current schema. An older index must be rebuilt."""
+        if not path.exists(self.index_file):
+            return False
+        with closing(self._connect(create=False)) as connection:
+            return connection.execute("PRAGMA user_version").fetchone()[0] == self.SCHEMA_VERSION
+
+    def _connect(self, create: bool = True) -> "sqlite3.Connection":
+        """Opens a connection to the index, creating the schema of a new index if `create` is True."""
+        import sqlite3
+        connection = sqlite3.connect(self.index_file)
+        connection.execute("PRAGMA journal_mode=WAL")
+        if create and not connection.execute("PRAGMA user_version").fetchone()[0]:
+            connection.executescript(self.SCHEMA)
+            connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        return connection
+
+    def add_items(self, items: Iterable[Dict[str, Any]]) -> int:
+        """
+        Adds news items that are not indexed yet to their clusters, in batches of one transaction each.
+        Items are clustered in order, so the first copy of a story indexed is its canonical item.
+
+        Returns: The number of items added as duplicates of an indexed item.
+        """
+        duplicates = 0
+        batch = []
+        with closing(self._connect()) as connection:
+            for item in items:
+                batch.append(item)
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    duplicates += self._add_batch(connection, batch)
+                    batch = []
+            if batch:
+                duplicates += self._add_batch(connection, batch)
+        return duplicates
+
+    def _add_batch(self, connection: "sqlite3.Connection", items: List[Dict[str, Any]]) -> int:
+        """
+        Clusters a batch of items in one transaction. The buckets of the whole batch are looked up with a
+        few queries up front, and the buckets filled by the batch itself are kept in memory.
+        """
+        batch: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            if isinstance(link := item.get("link"), str) and link and link not in batch:
+                batch[link] = item
+        for chunk in chunks(list(batch)):
+            for (link,) in connection.execute(
+                    f"SELECT link FROM documents WHERE link IN ({', '.join('?' * len(chunk))})", chunk):
+                del batch[link]
+        if not batch:
+            return 0
+
+        signatures = {}
+        for link, item in batch.items():
+            if (signature := minhash(shingles(item))) is not None:
+                signatures[link] = (band_keys(signature), check_bytes(signature))
+        buckets: Dict[int, List[int]] = {}
+        for chunk in chunks(list({key for keys, _ in signatures.values() for key in keys})):
+            for key, document_id in connection.execute(
+                    f"SELECT key, document_id FROM buckets WHERE key IN ({', '.join('?' * len(chunk))})", chunk):
+                buckets.setdefault(key, []).append(document_id)
+        candidates: Dict[int, Tuple[int, bytes]] = {}
+        for chunk in chunks(list({document_id for ids in buckets.values() for document_id in ids})):
+            for document_id, cluster_id, check in connection.execute(
+                    f"SELECT id, cluster_id, signature FROM documents WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk):
+                candidates[document_id] = (cluster_id, check)
+
+        (next_id,) = connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM documents").fetchone()
+        documents, filed, duplicates = [], [], 0
+        bucket_clusters: Dict[int, Set[int]] = {}
+        for document_id, link in enumerate(batch, start=next_id):
+            if link not in signatures:
+                documents.append((document_id, link, document_id, None))
+                continue
+            keys, check = signatures[link]
+            cluster_id = document_id
+            found = [candidate for candidate in {candidate for key in keys for candidate in buckets.get(key, ())}
+                     if candidate in candidates]
+            if found:
+                scores = estimate_similarities(check, [candidates[candidate][1] for candidate in found])
+                if scores[best := int(scores.argmax())] >= self.similarity:
+                    cluster_id = candidates[found[best]][0]
+                    duplicates += 1
+            documents.append((document_id, link, cluster_id, check))
+            candidates[document_id] = (cluster_id, check)
+            for key in keys:
+                if key not in bucket_clusters:
+                    bucket_clusters[key] = {candidates[member][0] for member in buckets.get(key, ())
+                                            if member in candidates}
+                if cluster_id not in bucket_clusters[key]:
+                    bucket_clusters[key].add(cluster_id)
+                    buckets.setdefault(key, []).append(document_id)
+                    filed.append((key, document_id))
+        with connection:
+            connection.executemany("INSERT INTO documents (id, link, cluster_id, signature) VALUES (?, ?, ?, ?)",
+                                   documents)
+            connection.executemany("INSERT INTO buckets (key, document_id) VALUES (?, ?)", filed)
+        return duplicates
+
+    def clusters(self, links: Iterable[str]) -> Dict[str, int]:
+        """Returns the cluster id of each indexed link; links that are not indexed are left out."""
+        links = list(links)
+        if not links or not path.exists(self.index_file):
+            return {}
+        clusters = {}
+        with closing(self._connect()) as connection:
+            for chunk in chunks(links):
+                clusters.update(connection.execute(
+                    f"SELECT link, cluster_id FROM documents WHERE link IN ({', '.join('?' * len(chunk))})", chunk))
+        return clusters
+
+    def cluster_links(self, link: str) -> List[str]:
+        """Returns the links of the cluster of an indexed link, the canonical item first, or [] if it is not indexed."""
+        with closing(self._connect()) as connection:
+            return [member for (member,) in connection.execute(
+                "SELECT link FROM documents WHERE cluster_id = (SELECT cluster_id FROM documents WHERE link = ?) "
+                "ORDER BY id", (link,))]
+
+    def remove_links(self, links: Iterable[str]) -> int:
+        """
+        Removes the documents of the given links, e.g. items expired from the cache, and reclaims their space.
+
+        The other items of a cluster keep its id, also when its canonical item is removed. As duplicates are
+        only filed in the buckets their cluster is not in yet, the bucket entries of a removed document pass
+        to the oldest remaining item of its cluster; those of removed documents without one are dropped.
+        Both take one pass over the buckets, whatever the number of links removed.
+
+        Returns: The number of documents removed.
+        """
+        links = list(links)
+        if not links or not self.exists():
+            return 0
+        removed: Dict[int, int] = {}
+        with closing(self._connect()) as connection:
+            for chunk in chunks(links):
+                with connection:
+                    documents = connection.execute(
+                        f"SELECT id, cluster_id FROM documents WHERE link IN ({', '.join('?' * len(chunk))})",
+                        chunk).fetchall()
+                    connection.executemany("DELETE FROM documents WHERE id = ?",
+                                           [(document_id,) for document_id, _ in documents])
+                removed.update(documents)
+            if not removed:
+                return 0
+            survivors = {}
+            for chunk in chunks(list(set(removed.values()))):
+                survivors.update(connection.execute(
+                    f"SELECT cluster_id, MIN(id) FROM documents WHERE cluster_id IN ({', '.join('?' * len(chunk))}) "
+                    "GROUP BY cluster_id", chunk))
+            with connection:
+                connection.execute("CREATE TEMP TABLE moved (removed INTEGER PRIMARY KEY, survivor INTEGER NOT NULL)")
+                connection.executemany("INSERT INTO moved VALUES (?, ?)",
+                                       [(document_id, survivors[cluster_id]) for document_id, cluster_id
+                                        in removed.items() if cluster_id in survivors])
+                connection.execute("UPDATE OR IGNORE buckets SET document_id = "
+                                   "(SELECT survivor FROM moved WHERE removed = buckets.document_id) "
+                                   "WHERE document_id IN (SELECT removed FROM moved)")
+                connection.execute("DELETE FROM buckets WHERE document_id NOT IN (SELECT id FROM documents)")
+                connection.execute("DROP TABLE moved")
+            connection.execute("VACUUM")
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return len(removed)
+
+    def size_on_disk(self) -> int:
+        """Returns the number of bytes the index takes on disk, its write-ahead log included."""
+        return sum(path.getsize(file) for file in (self.index_file, f"{self.index_file}-wal", f"{self.index_file}-shm")
+                   if path.isfile(file))
+
+    def rebuild(self, items: Iterable[Dict[str, Any]]) -> int:
+        """Rebuilds the duplicate index from the given items, whatever its schema version."""
+        with closing(self._connect(create=False)) as connection:
+            for (table,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                connection.execute(f'DROP TABLE "{table}"')
+            connection.execute("PRAGMA user_version = 0")
+        return self.add_items(items)
+
+
+def collapse(items: Iterable[Dict[str, Any]], clusters: Callable[[List[str]], Dict[str, int]],
+             chunk_size: int = SELECT_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields the first item of every cluster in `items`, skipping its later near-duplicates. Clusters
+    are looked up for `chunk_size` items at a time with `clusters`, e.g. `DuplicateIndex.clusters`; items
+    that are not indexed are always yielded.
+    """
+    seen: Set[int] = set()
+    chunk: List[Dict[str, Any]] = []
+
+    def flush() -> Iterator[Dict[str, Any]]:
+        found = clusters([item["link"] for item in chunk if isinstance(item.get("link"), str)])
+        for item in chunk:
+            if (cluster_id := found.get(item.get("link"))) is None:
+                yield item
+            elif cluster_id not in seen:
+                seen.add(cluster_id)
+                yield item
+        chunk.clear()
+
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield from flush()
+    yield from flush()
+
+
+def chunks(values: List[Any]) -> Iterator[List[Any]]:
+    """Splits query parameters into chunks below SQLite's limit on the number of parameters."""
+    for start in range(0, len(values), SELECT_BATCH_SIZE):
+        yield values[start:start + SELECT_BATCH_SIZE]
@@ -0,0 +1,177 @@
+import threading
+from collections import defaultdict, deque
+from urllib.parse import urlparse
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from src.http_cache import ValidatorStore, body_hasher, hash_body
+from src.rss_reader import iter_rss_items, rss_parser
+from src.stats import recorder
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_WORKERS = 8
+DEFAULT_PER_HOST = 2
+REQUEST_TIMEOUT = 30
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> "requests.Session":
+    """Returns the shared HTTP session, creating it on first use with a keep-alive connection pool."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=DEFAULT_WORKERS, pool_maxsize=DEFAULT_WORKERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+            _session = session
+        return _session
+
+
+def fetch_rss_xml(url: str, validators: Optional[ValidatorStore] = None) -> Optional[str]:
+    """
+    Fetches RSS XML data from the specified URL.
+
+    Args:
+    - url: The feed URL.
+    - validators: Store of HTTP validators, optional. When given, the request is conditional and
+     the ETag, Last-Modified and body hash of the response are staged in the store.
+
+    Returns: The XML text, an empty string on error, or None if the feed has not changed since the last fetch.
+    """
+    import requests
+    try:
+        with recorder.stage("fetch", feed=url):
+            headers = validators.conditional_headers(url) if validators else {}
+            response = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            recorder.count("bytes_downloaded", len(response.content), feed=url)
+        if validators and not validators.update(url=url, body_hash=hash_body(response.content),
+                                                etag=response.headers.get("ETag"),
+                                                last_modified=response.headers.get("Last-Modified")):
+            return None
+        return response.text
+    except requests.RequestException as e:
+        print(f"Error fetching RSS feed: {e}")
+        return ""
+
+
+def stream_rss_items(url: str, limit: Optional[int] = None,
+                     validators: Optional[ValidatorStore] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Fetches and parses an RSS feed incrementally, straight from the HTTP response.
+
+    The body is read in chunks and fed to `iter_rss_items`. Once `limit` items have been parsed,
+    the connection is closed without downloading the rest of the feed.
+
+    Args:
+    - url: The feed URL.
+    - limit: Max number of items to parse (None for no limit).
+    - validators: Store of HTTP validators, optional. The validators are only staged when the whole feed was read.
+
+    Returns: The parsed items, an empty list on error, or None if the feed has not changed since the last fetch.
+    """
+    import requests
+    try:
+        headers = validators.conditional_headers(url) if validators else {}
+        with recorder.stage("fetch", feed=url), \
+                get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+
+            digest, exhausted = body_hasher(), []
+
+            def read_chunks():
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    digest.update(chunk)
+                    recorder.count("bytes_downloaded", len(chunk), feed=url)
+                    yield chunk
+                exhausted.append(True)
+
+            # Reading a chunk is timed as "fetch" inside the "parse" stage, so the two are told apart.
+            chunks = recorder.iterate("fetch", read_chunks(), feed=url)
+            items = list(recorder.iterate("parse", iter_rss_items(chunks=chunks, limit=limit),
+                                          counter="items_parsed", feed=url))
+            if validators and exhausted and not validators.update(url=url, body_hash=digest.hexdigest(),
+                                                                  etag=response.headers.get("ETag"),
+                                                                  last_modified=response.headers.get("Last-Modified")):
+                return None
+            return items
+    except requests.RequestException as e:
+        print(f"Error fetching RSS feed: {e}")
+        return []
+
+
+def fetch_feeds(urls: Iterable[str], max_workers: int = DEFAULT_WORKERS, per_host_limit: int = DEFAULT_PER_HOST,
+                validators: Optional[ValidatorStore] = None,
+                fetch: Optional[Callable[..., Any]] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    Fetches several RSS feeds concurrently, yielding (url, result) pairs as soon as each download completes.
+
+    Args:
+    - urls: Feed URLs to fetch. Duplicates are fetched once.
+    - max_workers: Maximum number of downloads in flight at the same time.
+    - per_host_limit: Maximum number of simultaneous downloads from a single host.
+    - validators: Store of HTTP validators for conditional requests, optional.
+    - fetch: Function called as fetch(url=..., validators=...) for every feed, `fetch_rss_xml` by default.
+
+    Feeds waiting for a busy host do not occupy a worker, so other hosts keep being served.
+    The result is whatever `fetch` returns; for `fetch_rss_xml` None marks an unchanged feed and an
+    empty string a failed one. If `fetch` raises, the error is reported and the feed yields an empty string,
+    so the other feeds still complete.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    fetch = fetch or fetch_rss_xml
+    pending = defaultdict(deque)
+    for url in dict.fromkeys(urls):
+        pending[urlparse(url).netloc].append(url)
+    in_flight = defaultdict(int)
+    futures = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def submit_ready():
+            for host, queue in pending.items():
+                while queue and in_flight[host] < per_host_limit and len(futures) < max_workers:
+                    in_flight[host] += 1
+                    url = queue.popleft()
+                    futures[pool.submit(fetch, url=url, validators=validators)] = (host, url)
+
+        submit_ready()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                host, url = futures.pop(future)
+                in_flight[host] -= 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error fetching RSS feed: {e}")
+                    result = ""
+                yield url, result
+            submit_ready()
+
+
+def parse_feed(url: str, xml: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Parses the XML of a fetched feed with `rss_parser`, recording the parse time and item count for --stats."""
+    with recorder.stage("parse", feed=url):
+        items = rss_parser(xml=xml, limit=limit)
+    recorder.count("items_parsed", len(items), feed=url)
+    return items
+
+
+def complete_feeds(feeds: Iterable[Tuple[str, List[Dict[str, Any]]]], limit: Optional[int]) -> List[str]:
+    """
+    Returns the URLs of the feeds that were parsed in full, whose validators can be committed once their items
+    are cached. A feed with `limit` items may have been cut short, and a later run without the limit must not
+    skip it as unchanged.
+    """
+    return [url for url, items in feeds if limit is None or len(items) < limit]
@@ -0,0 +1,102 @@
+import json
+import threading
+from os import path, makedirs, replace
+from typing import Dict, Iterable, Optional
+
+
+def body_hasher():
+    """Returns a new hash object for response bodies, for bodies read in chunks."""
+    import hashlib
+    return hashlib.sha256()
+
+
+def hash_body(body: bytes) -> str:
+    """Returns the hash of a response body stored to detect unchanged feeds."""
+    hasher = body_hasher()
+    hasher.update(body)
+    return hasher.hexdigest()
+
+
+class ValidatorStore:
+    """
+    A persistent per-URL store of HTTP validators used to make conditional requests.
+
+    For every feed URL the store remembers the ETag and Last-Modified response headers and a hash of the
+    last downloaded body, so unchanged feeds can be detected either by a 304 response or by an identical body.
+    Validators of a new response are only staged by `update`: they are used for the next requests of this
+    process, but only saved once `commit` is called for the URL after the feed's items were cached, so a
+    feed whose items were never cached is fetched again in full by the next run.
+
+    Attributes:
+    - store_file: The path to the JSON file the validators are persisted in.
+    """
+    def __init__(self, store_file: str):
+        """Initializes the ValidatorStore and loads previously saved validators, if any."""
+        self.store_file = store_file
+        self._lock = threading.Lock()
+        self._validators: Dict[str, Dict[str, str]] = {}
+        self._staged: Dict[str, Dict[str, str]] = {}
+        if path.exists(store_file):
+            try:
+                with open(store_file, encoding="utf-8") as file:
+                    self._validators = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"Error loading HTTP validators: {e}")
+
+    def _current(self, url: str) -> Dict[str, str]:
+        """Returns the validators of the last response for the URL, staged or committed. Called with the lock held."""
+        return self._staged.get(url) or self._validators.get(url, {})
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Returns the If-None-Match/If-Modified-Since headers for the URL based on the stored validators."""
+        with self._lock:
+            validators = self._current(url)
+        headers = {}
+        if etag := validators.get("etag"):
+            headers["If-None-Match"] = etag
+        if last_modified := validators.get("last_modified"):
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def update(self, url: str, body_hash: Optional[str], etag: Optional[str] = None,
+               last_modified: Optional[str] = None) -> bool:
+        """
+        Stages the validators of a full (200) response until `commit` is called for the URL.
+
+        Args:
+        - url: The feed URL the response belongs to.
+        - body_hash: The `hash_body` of the response body, or None if the body was not read completely.
+        - etag: The ETag response header, if any.
+        - last_modified: The Last-Modified response header, if any.
+
+        Returns: True if the body differs from the previous one (or its hash is unknown), False otherwise.
+        """
+        with self._lock:
+            changed = body_hash is None or self._current(url).get("body_hash") != body_hash
+            self._staged[url] = {
+                key: value for key, value in
+                (("etag", etag), ("last_modified", last_modified), ("body_hash", body_hash)) if value
+            }
+        return changed
+
+    def commit(self, urls: Iterable[str]) -> None:
+        """Commits the staged validators of the URLs whose items were cached, so `save` writes them."""
+        with self._lock:
+            for url in urls:
+                if url in self._staged:
+                    self._validators[url] = self._staged.pop(url)
+
+    def save(self) -> None:
+        """Writes the committed validators to the store file, replacing it atomically."""
+        with self._lock:
+            data = json.dumps(self._validators, indent=2)
+        try:
+            directory = path.dirname(self.store_file)
+            if directory:
+                makedirs(directory, exist_ok=True)
+            temp_file = f"{self.store_file}.tmp"
+            with open(temp_file, "w", encoding="utf-8") as file:
+                file.write(data)
+            replace(temp_file, self.store_file)
+        except OSError as e:
+            print(f"Error saving HTTP validators: {e}")
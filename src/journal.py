@@ -0,0 +1,133 @@
+import json
+import os
+import time
+from os import path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+class FileLock:
+    """
+    An exclusive lock shared by processes through a lock file, held with flock on POSIX and msvcrt.locking
+    on Windows. The lock is tied to an open file, so separate FileLock instances also exclude each other
+    within a process, and the operating system releases it if its holder dies.
+
+    Attributes:
+    - lock_file: The path of the lock file, created on first use.
+    """
+    def __init__(self, lock_file: str):
+        self.lock_file = lock_file
+        self._fd: Optional[int] = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Takes the lock, waiting for it if `blocking` is True. Returns False if it was not taken."""
+        directory = path.dirname(self.lock_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                self._fd = fd
+                return True
+            except OSError:
+                if not blocking:
+                    os.close(fd)
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self) -> None:
+        """Releases the lock."""
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        os.close(fd)
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.release()
+
+
+class WriteAheadLog:
+    """
+    A durable queue of news items waiting to be merged into the cache storage, shared by processes.
+
+    Writers append their items as JSON lines with a single write to the log file, synced to disk, under a
+    lock held only for that write, so any number of fetchers can log items at the same time. A merger
+    atomically swaps the log for an empty one and merges the swapped-out batch, the items of every writer
+    since the previous merge, with one storage write. The batch file is only deleted once the merge is
+    complete, so a batch left behind by a crashed merger is merged again by the next one.
+
+    Attributes:
+    - log_file: The path of the log items are appended to.
+    - batch_file: The path of the batch being merged.
+    """
+    def __init__(self, log_file: str):
+        self.log_file = log_file
+        self.batch_file = f"{log_file}.merging"
+        self._lock = FileLock(f"{log_file}.lock")
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Appends records to the log and syncs them to disk. Returns the number of records logged."""
+        lines = [json.dumps(record, ensure_ascii=False) + "\n" for record in records]
+        if not lines:
+            return 0
+        data = "".join(lines).encode("utf-8")
+        with self._lock:
+            fd = os.open(self.log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        return len(lines)
+
+    def pending(self) -> bool:
+        """Returns True if records are waiting to be merged."""
+        return path.exists(self.batch_file) or (path.exists(self.log_file) and path.getsize(self.log_file) > 0)
+
+    def take(self) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """
+        Returns the next batch to merge and whether it was left behind by an interrupted merge, or None if
+        nothing is pending. Must be called by the merger only; the batch stays on disk until `done`.
+        """
+        recovered = path.exists(self.batch_file)
+        if not recovered:
+            with self._lock:
+                if not path.exists(self.log_file) or not path.getsize(self.log_file):
+                    return None
+                os.replace(self.log_file, self.batch_file)
+        return list(read_records(self.batch_file)), recovered
+
+    def done(self) -> None:
+        """Deletes the batch returned by `take` once it has been merged."""
+        if path.exists(self.batch_file):
+            os.remove(self.batch_file)
+
+
+def read_records(log_file: str) -> Iterable[Dict[str, Any]]:
+    """Yields the records of a log file, skipping lines left incomplete by a writer that crashed mid-write."""
+    with open(log_file, encoding="utf-8", errors="replace") as log:
+        for line in log:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
@@ -1,56 +1,70 @@
 import argparse
-import requests
-import json
+import os
+import sys
+from itertools import chain
 from src.cache_manager import CacheManager
-from src.rss_reader import rss_parser
-from src.utils import simple_to_readable_date, log_verbose
-from typing import Dict, List
+from src.dates import parse_range_bound, parse_range_end
+from src.fetch import (DEFAULT_PER_HOST, DEFAULT_WORKERS, complete_feeds, fetch_feeds, parse_feed,
+                       stream_rss_items)
+from src.storage import migrate_csv_to_sqlite, open_storage
+from src.http_cache import ValidatorStore
+from src.retention import RetentionPolicy, parse_duration, parse_size
+from src.search import DEFAULT_TOP_CATEGORIES
+from src.stats import recorder
+from src.utils import log_verbose
+from src.writers import write_category_counts, write_json, write_ndjson, write_text
+from functools import partial
+from typing import Dict, Iterable, List
 
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-def fetch_rss_xml(url: str) -> str:
-    """Fetches RSS XML data from the specified URL."""
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
-    except requests.RequestException as e:
-        print(f"Error fetching RSS feed: {e}")
-        return ""
+
+def read_feed_list(file_path: str) -> List[str]:
+    """Reads feed URLs from a file, one per line. Blank lines and lines starting with '#' are skipped."""
+    with open(file_path, encoding="utf-8") as feed_file:
+        return [line.strip() for line in feed_file if line.strip() and not line.lstrip().startswith("#")]
 
 
-def print_news(news_items: List[Dict[str, str]], to_json: bool = False, verbose: bool = False) -> None:
+def print_news(news_items: Iterable[Dict[str, str]], to_json: bool = False, verbose: bool = False,
+               ndjson: bool = False) -> None:
     """
     Prints the news items in JSON format or a formatted string based on the input flags.
 
+    Items are written one by one as they are consumed from `news_items`, which can be a lazy iterator.
+
     Args:
-    - news_items: A list of dictionaries, where each dictionary represents a news item.
+    - news_items: An iterable of dictionaries, where each dictionary represents a news item.
     - to_json: If True, prints news items in JSON format. Otherwise, prints as formatted strings.
     - verbose: Determines the level of detail in the printed output. Less detail if False.
+    - ndjson: If True, prints one JSON object per line instead of a JSON array.
 
     For non-JSON output in non-verbose mode, only the title, link, and publication date are printed.
     """
+    writer = write_ndjson if ndjson else write_json if to_json else write_text
+    with recorder.stage("render"):
+        writer(news_items, verbose=verbose)
+
+
+def start_background_compaction(cache_file: str, policy: RetentionPolicy) -> int:
+    """
+    Starts `--compact` for the cache in a detached process, which keeps running after this one exits.
 
-    if not verbose:
-        concise_keys = ("title", "link", "pubDate")
-        news_items = [{tag: value for tag, value in item.items() if tag in concise_keys} for item in news_items]
-
-    for item in news_items:
-        item["pubDate"] = simple_to_readable_date(date_str=item.get("pubDate", ""))
-
-    if to_json:
-        print(json.dumps(news_items, indent=2))
-    else:
-        tags_map = {
-            "title": "Title",
-            "author": "Authors",
-            "link": "Link",
-            "pubDate": "Publish Date",
-            "description": "Description",
-            "category": "Categories",
-            "source_url": "Source URL"
-        }
-        for item in news_items:
-            print("\n".join([f"{tags_map[key]}: {value}" for key, value in item.items()]), end="\n\n")
+    Its report is appended to the compaction log next to the cache, e.g. data/news_cache.compaction.log.
+
+    Returns: The process id of the compaction.
+    """
+    import subprocess
+    cache_file = os.path.abspath(cache_file)
+    command = [sys.executable, "-m", "src.main", "--cache", cache_file, "--compact"]
+    for flag, value in (("--max-age", policy.max_age), ("--max-per-source", policy.max_rows_per_source),
+                        ("--max-size", policy.max_bytes)):
+        if value is not None:
+            command += [flag, str(value)]
+    log_file = open_storage(cache_file).sidecar_path("compaction.log")
+    with open(log_file, "a", encoding="utf-8") as log:
+        process = subprocess.Popen(command, cwd=PROJECT_DIR, stdin=subprocess.DEVNULL, stdout=log,
+                                   stderr=subprocess.STDOUT, start_new_session=True)
+    return process.pid
 
 
 def main():
@@ -61,38 +75,243 @@ def main():
     be formatted as JSON or as a more human-readable string, with optional verbosity.
     """
     parser = argparse.ArgumentParser(description='RSS Reader - Fetch and read RSS feeds.')
-    parser.add_argument('-s', '--source', help='RSS URL source', default=None)
+    parser.add_argument('-s', '--source', action='append', help='RSS URL source, can be repeated', default=None)
+    parser.add_argument('-f', '--feeds-file', help='File with RSS URL sources, one per line', default=None)
     parser.add_argument('-d', '--date', help='Date in YYYYMMDD format to retrieve news from cache', default=None)
+    parser.add_argument('--from', dest='start', metavar='TIME', type=parse_range_bound, default=None,
+                        help='Only cached news published from TIME on, YYYYMMDD or YYYY-MM-DDTHH:MM[:SS] (UTC)')
+    parser.add_argument('--to', dest='end', metavar='TIME', type=parse_range_end, default=None,
+                        help='Only cached news published until TIME, a YYYYMMDD date includes the whole day')
+    parser.add_argument('--search', metavar='QUERY', default=None,
+                        help='Search the titles and descriptions of cached news, best matches first')
+    parser.add_argument('--category', default=None,
+                        help='Only cached news in this category (case-insensitive), combines with --date and --search')
+    parser.add_argument('--top-categories', metavar='N', type=int, nargs='?', const=DEFAULT_TOP_CATEGORIES,
+                        default=None, help='Print the N most frequent categories of cached news (default 10), '
+                                           'for the --date or --from/--to period if given')
     parser.add_argument('-l', '--limit', help='Limit the number of news results', type=int, default=None)
+    parser.add_argument('--collapse-duplicates', action='store_true', default=False,
+                        help='Print only the first of near-duplicate news, e.g. a story syndicated by several sources')
     parser.add_argument('-j', '--json', action='store_true', help='Print result as JSON in stdout', default=False)
+    parser.add_argument('--ndjson', action='store_true', help='Print result as one JSON object per line',
+                        default=False)
     parser.add_argument('-v', '--verbose', action='store_true', help='Increases verbosity of output', default=False)
+    parser.add_argument('-w', '--workers', help='Maximum number of feeds fetched concurrently', type=int,
+                        default=DEFAULT_WORKERS)
+    parser.add_argument('--per-host', help='Maximum number of concurrent fetches per host', type=int,
+                        default=DEFAULT_PER_HOST)
+    parser.add_argument('--stream', action='store_true', default=False,
+                        help='Parse feeds while downloading them and stop reading once --limit items are parsed')
+    parser.add_argument('--daemon', action='store_true', default=False,
+                        help='Keep running and poll the sources on adaptive per-feed intervals')
+    parser.add_argument('--interval', help='Initial polling interval in seconds in daemon mode (default 900)',
+                        type=float, default=None)
+    parser.add_argument('--pipeline', action='store_true', default=False,
+                        help='Ingest the sources with overlapped fetch, parse and cache stages and report their '
+                             'throughput instead of printing the news')
+    parser.add_argument('--parse-workers', metavar='N', type=int, default=None,
+                        help='Processes parsing feeds with --pipeline (default: one per CPU, 0 to parse in-process)')
+    parser.add_argument('--queue-size', metavar='N', type=int, default=None,
+                        help='Feeds buffered between the stages of --pipeline (default 32)')
+    parser.add_argument('--batch-size', metavar='N', type=int, default=None,
+                        help='News items written to the cache at a time by --pipeline (default 5000)')
+    parser.add_argument('-c', '--cache', help='Cache file, a .db/.sqlite file selects the SQLite backend',
+                        default='data/news_cache.csv')
+    parser.add_argument('--compact', action='store_true', default=False,
+                        help='Rewrite the cache without duplicates and expired items, and report the space reclaimed')
+    parser.add_argument('--max-age', metavar='AGE', type=parse_duration, default=None,
+                        help='Retention: expire cached news published more than AGE ago, e.g. 30d or 12h')
+    parser.add_argument('--max-per-source', metavar='N', type=int, default=None,
+                        help='Retention: keep only the newest N cached news of every source')
+    parser.add_argument('--max-size', metavar='SIZE', type=parse_size, default=None,
+                        help='Retention: expire the oldest cached news until the cache fits in SIZE, e.g. 500MB')
+    parser.add_argument('--background', action='store_true', default=False,
+                        help='Run --compact in a detached process that keeps running after this one exits')
+    parser.add_argument('--compact-interval', metavar='SECONDS', type=float, default=None,
+                        help='How often the daemon applies the retention options in the background (default 3600)')
+    parser.add_argument('--serve', action='store_true', default=False,
+                        help='Serve the cache as JSON over HTTP until interrupted, picking up newly cached news')
+    parser.add_argument('--host', default=None, help='Interface --serve listens on (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=None, help='Port --serve listens on (default 8080)')
+    parser.add_argument('--refresh-interval', metavar='SECONDS', type=float, default=None,
+                        help='How often --serve reads newly cached news (default 2)')
+    parser.add_argument('--export', metavar='FILE', default=None,
+                        help='Export the cache (filtered by --date and --source) to a .parquet or .arrow file')
+    parser.add_argument('--import', dest='import_file', metavar='FILE', default=None,
+                        help='Cache the news of a .parquet or .arrow file (filtered by --date and --source)')
+    parser.add_argument('--migrate-sqlite', metavar='DB_FILE', help='Copy the CSV cache into an SQLite database',
+                        default=None)
+    parser.add_argument('--stats', metavar='FILE', default=None,
+                        help='Write per-stage and per-feed statistics to FILE ("-" for stderr)')
+    parser.add_argument('--stats-format', choices=('json', 'prometheus'), default=None,
+                        help='Format of --stats, JSON by default or Prometheus text for .prom files')
     args = parser.parse_args()
 
+    if args.stats:
+        recorder.enable()
+
     verbose_mode = args.verbose
+    sources = list(args.source or [])
+    if args.feeds_file:
+        sources.extend(read_feed_list(file_path=args.feeds_file))
+
+    cache_manager = CacheManager(cache_file=args.cache)
+    # HTTP validators belong to the cache, so a new cache fetches every feed in full.
+    validators_file = cache_manager.storage.sidecar_path("validators.json")
+
+    if args.migrate_sqlite:
+        migrated = migrate_csv_to_sqlite(csv_file=args.cache, db_file=args.migrate_sqlite)
+        print(f"Migrated {migrated} news item(s) to {args.migrate_sqlite}.")
+
+    retention = RetentionPolicy(max_age=args.max_age, max_rows_per_source=args.max_per_source,
+                                max_bytes=args.max_size)
+    if args.compact and args.background:
+        pid = start_background_compaction(cache_file=args.cache, policy=retention)
+        print(f"Compaction started in the background (process {pid}).")
+    elif args.compact:
+        print(cache_manager.compact(policy=retention))
+
+    source_filter = sources[0] if len(sources) == 1 else sources or None
+    # When collapsing, the limit applies to the collapsed news, so the queries themselves are not limited.
+    query_limit = None if args.collapse_duplicates else args.limit
+    if args.serve:
+        from src.server import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_REFRESH_INTERVAL, serve
+
+        serve(cache_manager=cache_manager, host=args.host or DEFAULT_HOST,
+              port=DEFAULT_PORT if args.port is None else args.port,
+              refresh_interval=args.refresh_interval or DEFAULT_REFRESH_INTERVAL, verbose=verbose_mode)
+
+    elif args.export:
+        log_verbose(message=f"Exporting cached news to {args.export}...", verbose=verbose_mode)
+        try:
+            exported = cache_manager.export_news(output_file=args.export, date=args.date, source_url=source_filter)
+            print(f"Exported {exported} news item(s) to {args.export}.")
+        except (ImportError, ValueError, OSError) as e:
+            print(f"Error exporting the cache: {e}")
 
-    cache_manager = CacheManager()
+    elif args.import_file:
+        log_verbose(message=f"Importing news from {args.import_file}...", verbose=verbose_mode)
+        try:
+            imported = cache_manager.import_news(input_file=args.import_file, date=args.date, source_url=source_filter,
+                                                 verbose=verbose_mode)
+            print(f"Imported {imported} new news item(s) from {args.import_file}.")
+        except (ImportError, ValueError, OSError) as e:
+            print(f"Error importing news: {e}")
 
-    if args.date:
+    elif args.top_categories is not None:
+        counts = cache_manager.top_categories(date=args.date, source_url=source_filter, limit=args.top_categories,
+                                              start=args.start, end=args.end)
+        if counts or args.json or args.ndjson:
+            write_category_counts(counts, to_json=args.json or args.ndjson)
+        else:
+            print("No categories found.")
+
+    elif args.search or args.category or args.start is not None or args.end is not None:
+        in_range = args.start is not None or args.end is not None
+        if args.search:
+            log_verbose(message=f"Searching cached news for: {args.search}", verbose=verbose_mode)
+            found_news = cache_manager.search_news(query=args.search, date=args.date, source_url=source_filter,
+                                                   limit=query_limit, category=args.category,
+                                                   start=args.start, end=args.end)
+        elif in_range:
+            log_verbose(message="Fetching news in the time range from cache...", verbose=verbose_mode)
+            found_news = cache_manager.news_in_range(start=args.start, end=args.end, date=args.date,
+                                                     source_url=source_filter, category=args.category,
+                                                     limit=query_limit)
+        else:
+            log_verbose(message=f"Fetching news in category {args.category} from cache...", verbose=verbose_mode)
+            found_news = cache_manager.news_by_category(category=args.category, date=args.date,
+                                                        source_url=source_filter, limit=query_limit)
+        if args.collapse_duplicates:
+            found_news = list(cache_manager.collapse_duplicates(found_news, limit=args.limit))
+        if found_news:
+            print_news(news_items=found_news, to_json=args.json, verbose=verbose_mode, ndjson=args.ndjson)
+        else:
+            print("No news found matching the search." if args.search
+                  else "No news found in the specified time range." if in_range
+                  else "No news found in the specified category.")
+
+    elif args.date:
         log_verbose(message="Fetching news from cache...", verbose=verbose_mode)
-        # Fetching news from cache based on date (and source if provided)
-        if cached_news := cache_manager.retrieve_news_from_cache(date=args.date, source_url=args.source):
-            print_news(news_items=cached_news, to_json=args.json, verbose=verbose_mode)
+        # Fetching news from cache based on date (and sources if provided)
+        cached_news = iter(cache_manager.retrieve_news_from_cache(date=args.date, source_url=source_filter,
+                                                                  limit=query_limit))
+        if args.collapse_duplicates:
+            cached_news = cache_manager.collapse_duplicates(cached_news, limit=args.limit)
+        if (first_item := next(cached_news, None)) is not None:
+            print_news(news_items=chain([first_item], cached_news), to_json=args.json, verbose=verbose_mode,
+                       ndjson=args.ndjson)
         else:
             print("No news found for the specified date.")
 
-    elif args.source:
-        log_verbose(message=f"Fetching news from source: {args.source}", verbose=verbose_mode)
-        # Fetching news from the specified RSS source and caching it
-        if xml_data := fetch_rss_xml(url=args.source):
-            news_items = rss_parser(xml=xml_data, limit=args.limit)
-            cache_manager.cache_news(news_items=news_items, source_url=args.source, verbose=verbose_mode)
-            print_news(news_items=news_items, to_json=args.json, verbose=verbose_mode)
-        else:
-            print("Failed to fetch news from the source.")
+    elif sources and args.pipeline:
+        from src.pipeline import DEFAULT_BATCH_SIZE, DEFAULT_PARSE_WORKERS, DEFAULT_QUEUE_SIZE, IngestPipeline
+
+        log_verbose(message=f"Ingesting {len(sources)} source(s) through the pipeline...", verbose=verbose_mode)
+        pipeline = IngestPipeline(cache_manager=cache_manager, validators=ValidatorStore(validators_file),
+                                  limit=args.limit, fetch_workers=args.workers, per_host_limit=args.per_host,
+                                  parse_workers=DEFAULT_PARSE_WORKERS if args.parse_workers is None
+                                  else args.parse_workers,
+                                  queue_size=args.queue_size or DEFAULT_QUEUE_SIZE,
+                                  batch_size=args.batch_size or DEFAULT_BATCH_SIZE, verbose=verbose_mode)
+        print(pipeline.run(sources))
 
-    else:
+    elif sources and args.daemon:
+        from src.daemon import DEFAULT_COMPACT_INTERVAL, DEFAULT_INTERVAL, FeedDaemon, PollScheduler
+
+        log_verbose(message=f"Polling {len(sources)} source(s) until interrupted...", verbose=verbose_mode)
+        scheduler = PollScheduler(urls=sources, interval=args.interval or DEFAULT_INTERVAL)
+        FeedDaemon(scheduler=scheduler, cache_manager=cache_manager,
+                   validators=ValidatorStore(validators_file), limit=args.limit, max_workers=args.workers,
+                   per_host_limit=args.per_host, retention=retention,
+                   compact_interval=args.compact_interval or DEFAULT_COMPACT_INTERVAL, verbose=verbose_mode).run()
+
+    elif sources:
+        log_verbose(message=f"Fetching news from {len(sources)} source(s): {', '.join(sources)}", verbose=verbose_mode)
+        # Fetching all sources concurrently, parsing each one as it arrives and caching them in one write.
+        # Feeds answering 304 or returning an identical body are neither parsed nor cached.
+        # With --stream, every worker parses its feed straight from the response instead of returning the XML.
+        validators = ValidatorStore(validators_file)
+        fetch = partial(stream_rss_items, limit=args.limit) if args.stream else None
+        feeds, unchanged = [], 0
+        for url, result in fetch_feeds(urls=sources, max_workers=args.workers, per_host_limit=args.per_host,
+                                       validators=validators, fetch=fetch):
+            if result is None:
+                unchanged += 1
+                log_verbose(message=f"Source not modified since the last fetch: {url}", verbose=verbose_mode)
+            elif not result:
+                print(f"Failed to fetch news from the source: {url}")
+            else:
+                feeds.append((url, result if args.stream else parse_feed(url=url, xml=result, limit=args.limit)))
+
+        if feeds:
+            order = {url: position for position, url in enumerate(sources)}
+            feeds.sort(key=lambda feed: order[feed[0]])
+            # The validators are only saved for feeds whose items were cached, so the others are fetched again.
+            if cache_manager.cache_feeds(feeds=feeds, verbose=verbose_mode) is not None:
+                validators.commit(complete_feeds(feeds=feeds, limit=args.limit))
+                validators.save()
+            fetched_news = (item for _, news_items in feeds for item in news_items)
+            if args.collapse_duplicates:
+                fetched_news = cache_manager.collapse_duplicates(fetched_news)
+            print_news(news_items=fetched_news, to_json=args.json, verbose=verbose_mode, ndjson=args.ndjson)
+
+        if unchanged:
+            log_verbose(message=f"Skipped {unchanged} unchanged source(s).",
+                        verbose=verbose_mode or not (args.json or args.ndjson))
+
+    elif not (args.compact or args.migrate_sqlite):
         print("Please provide an RSS source URL or a date to fetch news from cache.")
 
+    if args.stats:
+        stats_format = args.stats_format or ("prometheus" if args.stats.endswith(".prom") else "json")
+        recorder.write(path=args.stats, output_format=stats_format)
+
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except BrokenPipeError:
+        # The reader of our output (e.g. `head`) exited early; silence the flush error at interpreter shutdown.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
@@ -0,0 +1,316 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from src.cache_manager import CacheManager
+from src.http_cache import ValidatorStore
+from src.fetch import DEFAULT_PER_HOST, DEFAULT_WORKERS, complete_feeds, fetch_feeds
+from src.rss_reader import rss_parser
+from src.stats import recorder
+from src.utils import log_verbose
+
+DEFAULT_PARSE_WORKERS = os.cpu_count() or 1
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_BATCH_SIZE = 5_000
+# Seconds the writer waits for more items before writing a batch that is not full.
+DEFAULT_FLUSH_INTERVAL = 1.0
+# Seconds a blocked stage waits before checking whether the pipeline was aborted.
+POLL_INTERVAL = 0.1
+_END = object()
+
+
+def parse_in_worker(xml: str, limit: Optional[int]) -> Tuple[List[Dict[str, Any]], float]:
+    """Parses a feed with `rss_parser` in a worker process. Returns the items and the seconds spent parsing."""
+    started = time.perf_counter()
+    items = rss_parser(xml=xml, limit=limit)
+    return items, time.perf_counter() - started
+
+
+class PipelineAborted(Exception):
+    """Raised in the stages of a pipeline when another stage failed."""
+
+
+class StageStats:
+    """
+    What one stage of an ingest pipeline did.
+
+    Attributes:
+    - name: The stage, "fetch", "parse" or "write".
+    - workers: The number of threads or processes the stage ran with.
+    - unit: What `processed` counts, "feeds" or "items".
+    - processed: The number of feeds or items the stage handed on.
+    - seconds: The wall time from the start of the pipeline until the stage finished.
+    - waiting_seconds: The time the stage waited for input from the stage before it.
+    - blocked_seconds: The time the stage waited for room in the queue of the stage after it (backpressure).
+    """
+    def __init__(self, name: str, workers: int, unit: str):
+        self.name = name
+        self.workers = workers
+        self.unit = unit
+        self.processed = 0
+        self.seconds = 0.0
+        self.waiting_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """The feeds or items processed per second, or None before the stage ran."""
+        return self.processed / self.seconds if self.seconds else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "unit": self.unit, "processed": self.processed, "seconds": self.seconds,
+                "throughput": self.throughput, "waiting_seconds": self.waiting_seconds,
+                "blocked_seconds": self.blocked_seconds}
+
+    def __str__(self) -> str:
+        return (f"{self.name}: {self.processed} {self.unit} in {self.seconds:.2f}s "
+                f"({self.throughput or 0:,.0f} {self.unit}/s) with {self.workers} worker(s), "
+                f"waited {self.waiting_seconds:.2f}s for input, blocked {self.blocked_seconds:.2f}s by the next stage")
+
+
+class PipelineReport:
+    """
+    The outcome of an ingest pipeline run.
+
+    Attributes:
+    - stages: The StageStats of the fetch, parse and write stages, in order.
+    - unchanged: The number of feeds not modified since the last fetch.
+    - failed: The number of feeds that could not be fetched, parsed or cached.
+    - cached: The number of new items added to the cache.
+    - seconds: How long the run took.
+    """
+    def __init__(self, stages: List[StageStats], unchanged: int, failed: int, cached: int, seconds: float):
+        self.stages = stages
+        self.unchanged = unchanged
+        self.failed = failed
+        self.cached = cached
+        self.seconds = seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"seconds": self.seconds, "unchanged": self.unchanged, "failed": self.failed, "cached": self.cached,
+                "stages": {stage.name: stage.to_dict() for stage in self.stages}}
+
+    def __str__(self) -> str:
+        fetch, parse, _ = self.stages
+        summary = (f"Ingested {fetch.processed} feed(s) in {self.seconds:.2f}s: {parse.processed} item(s) parsed, "
+                   f"{self.cached} new item(s) cached, {self.unchanged} unchanged and {self.failed} failed feed(s).")
+        return "\n".join([summary] + [f"  {stage}" for stage in self.stages])
+
+
+class IngestPipeline:
+    """
+    Fetches, parses and caches many feeds with the three stages overlapped.
+
+    Feeds are downloaded by a pool of threads (see `fetch_feeds`), parsed by a pool of processes, so that
+    parsing uses every core, and written by a single thread that caches the items in batches of about
+    `batch_size` rows. The stages are connected by queues of at most `queue_size` feeds, and at most two
+    feeds per parse worker are parsed at a time, so a slow stage makes the stages before it wait instead of
+    piling up downloads or parsed items in memory. The time every stage spends waiting for input or blocked
+    by the next stage is reported, to show which stage limits the throughput and needs more workers.
+
+    Attributes:
+    - cache_manager: The CacheManager the items are cached with.
+    - validators: The ValidatorStore used for conditional requests, optional.
+    - limit: Max number of items parsed per feed (None for no limit).
+    - fetch_workers: The number of concurrent downloads.
+    - per_host_limit: The number of concurrent downloads per host.
+    - parse_workers: The number of parse processes; 0 parses in a thread of this process.
+    - queue_size: The capacity of the queues between the stages, in feeds.
+    - batch_size: The number of rows the writer collects before writing them to the cache.
+    - flush_interval: Seconds the writer waits for more items before writing a smaller batch.
+    """
+    def __init__(self, cache_manager: CacheManager, validators: Optional[ValidatorStore] = None,
+                 limit: Optional[int] = None, fetch_workers: int = DEFAULT_WORKERS,
+                 per_host_limit: int = DEFAULT_PER_HOST, parse_workers: int = DEFAULT_PARSE_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, verbose: bool = False):
+        self.cache_manager = cache_manager
+        self.validators = validators
+        self.limit = limit
+        self.fetch_workers = fetch_workers
+        self.per_host_limit = per_host_limit
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.verbose = verbose
+        self._aborted = threading.Event()
+        self._failed_lock = threading.Lock()
+
+    def run(self, urls: Iterable[str]) -> PipelineReport:
+        """
+        Runs the pipeline over the feeds until every one of them is cached, then saves the HTTP validators of
+        the feeds whose items were cached.
+
+        Raises: The first exception raised by a stage, once the other stages have stopped.
+        """
+        self._aborted.clear()
+        self._unchanged = self._failed = self._cached = 0
+        self._started = time.perf_counter()
+        fetch = StageStats("fetch", self.fetch_workers, "feeds")
+        parse = StageStats("parse", self.parse_workers or 1, "items")
+        write = StageStats("write", 1, "items")
+        xml_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        items_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        errors: List[BaseException] = []
+
+        pool = ProcessPoolExecutor(max_workers=self.parse_workers) if self.parse_workers else None
+        try:
+            if pool is not None:
+                # Starts the worker processes before the stage threads, so they are not forked from a threaded process.
+                pool.submit(int).result()
+            stages = [(self._fetch, (urls, xml_queue, fetch)), (self._parse, (pool, xml_queue, items_queue, parse)),
+                      (self._write, (items_queue, write))]
+            threads = [threading.Thread(target=self._run_stage, args=(target, args, errors),
+                                        name=f"pipeline-{args[-1].name}") for target, args in stages]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            if self.validators is not None:
+                self.validators.save()
+        if errors:
+            raise errors[0]
+        return PipelineReport(stages=[fetch, parse, write], unchanged=self._unchanged, failed=self._failed,
+                              cached=self._cached, seconds=time.perf_counter() - self._started)
+
+    def _run_stage(self, target: Callable[..., None], args: tuple, errors: List[BaseException]) -> None:
+        """Runs a stage, aborting the other stages if it fails."""
+        try:
+            target(*args)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            self._aborted.set()
+        finally:
+            args[-1].seconds = time.perf_counter() - self._started
+
+    def _put(self, target: "queue.Queue", value: Any, stats: StageStats) -> None:
+        """Puts a value on the next stage's queue, waiting for room, unless the pipeline is aborted."""
+        started = time.perf_counter()
+        try:
+            while True:
+                try:
+                    target.put(value, timeout=POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    if self._aborted.is_set():
+                        raise PipelineAborted()
+        finally:
+            stats.blocked_seconds += time.perf_counter() - started
+
+    def _get(self, source: "queue.Queue", stats: StageStats, timeout: Optional[float] = None) -> Any:
+        """
+        Takes a value from the stage's queue, waiting for the previous stage, unless the pipeline is aborted.
+
+        Returns: The value, or None if nothing arrived within `timeout` seconds.
+        """
+        started = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return source.get(timeout=POLL_INTERVAL if timeout is None else min(timeout, POLL_INTERVAL))
+                except queue.Empty:
+                    if self._aborted.is_set():
+                        raise PipelineAborted()
+                    if timeout is not None and time.perf_counter() - started >= timeout:
+                        return None
+        finally:
+            stats.waiting_seconds += time.perf_counter() - started
+
+    def _fetch(self, urls: Iterable[str], xml_queue: "queue.Queue", stats: StageStats) -> None:
+        """Downloads the feeds and queues the XML of those that changed."""
+        # Once the queue is full, no new download starts until the parse stage takes a feed.
+        for url, xml in fetch_feeds(urls=urls, max_workers=self.fetch_workers, per_host_limit=self.per_host_limit,
+                                    validators=self.validators):
+            stats.processed += 1
+            if xml is None:
+                self._unchanged += 1
+                log_verbose(message=f"Source not modified since the last fetch: {url}", verbose=self.verbose)
+            elif not xml:
+                with self._failed_lock:
+                    self._failed += 1
+                print(f"Failed to fetch news from the source: {url}")
+            else:
+                self._put(xml_queue, (url, xml), stats)
+            if self._aborted.is_set():
+                raise PipelineAborted()
+        self._put(xml_queue, _END, stats)
+
+    def _parse(self, pool: Optional[ProcessPoolExecutor], xml_queue: "queue.Queue", items_queue: "queue.Queue",
+               stats: StageStats) -> None:
+        """Parses the queued feeds in the process pool, or in this thread without one, and queues their items."""
+        in_flight: Dict[Future, str] = {}
+        max_in_flight = 2 * self.parse_workers
+        done = False
+        while not done or in_flight:
+            if in_flight and (done or len(in_flight) >= max_in_flight):
+                finished, _ = wait(in_flight, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._forward(in_flight.pop(future), future.result, items_queue, stats)
+                if self._aborted.is_set():
+                    raise PipelineAborted()
+                continue
+            value = self._get(xml_queue, stats, timeout=POLL_INTERVAL if in_flight else None)
+            for future in [future for future in in_flight if future.done()]:
+                self._forward(in_flight.pop(future), future.result, items_queue, stats)
+            if value is _END:
+                done = True
+            elif value is not None:
+                url, xml = value
+                if pool is None:
+                    self._forward(url, partial(parse_in_worker, xml, self.limit), items_queue, stats)
+                else:
+                    in_flight[pool.submit(parse_in_worker, xml, self.limit)] = url
+        self._put(items_queue, _END, stats)
+
+    def _forward(self, url: str, result: Callable[[], Tuple[List[Dict[str, Any]], float]],
+                 items_queue: "queue.Queue", stats: StageStats) -> None:
+        """
+        Queues the items of a parsed feed, given by `result`, for the writer, recording the parse time for --stats.
+        """
+        try:
+            items, seconds = result()
+        except Exception as e:
+            print(f"Error parsing the feed {url}: {e}")
+            with self._failed_lock:
+                self._failed += 1
+            return
+        recorder.record_stage("parse", seconds, feed=url)
+        recorder.count("items_parsed", len(items), feed=url)
+        stats.processed += len(items)
+        self._put(items_queue, (url, items), stats)
+
+    def _write(self, items_queue: "queue.Queue", stats: StageStats) -> None:
+        """Caches the parsed items in batches of about `batch_size` rows, writing a smaller batch after a pause."""
+        batch: List[Tuple[str, List[Dict[str, Any]]]] = []
+        rows = 0
+        while True:
+            value = self._get(items_queue, stats, timeout=self.flush_interval if batch else None)
+            if value is not None and value is not _END:
+                batch.append(value)
+                rows += len(value[1])
+            if batch and (value is None or value is _END or rows >= self.batch_size):
+                added = self.cache_manager.cache_feeds(feeds=batch, verbose=self.verbose)
+                if added is None:
+                    # Their validators are not committed, so the next run fetches these feeds again.
+                    with self._failed_lock:
+                        self._failed += len(batch)
+                    print(f"Failed to cache news from {len(batch)} source(s): {', '.join(url for url, _ in batch)}")
+                else:
+                    if self.validators is not None:
+                        self.validators.commit(complete_feeds(feeds=batch, limit=self.limit))
+                    self._cached += added
+                    stats.processed += rows
+                    log_verbose(message=f"Wrote a batch of {rows} item(s) from {len(batch)} feed(s).",
+                                verbose=self.verbose)
+                batch, rows = [], 0
+            if value is _END:
+                return
@@ -0,0 +1,148 @@
+import heapq
+import re
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from src.search import item_timestamp
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2, "g": 1024 ** 3, "gb": 1024 ** 3}
+DURATION_PATTERN = re.compile(r"\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*", re.IGNORECASE)
+SIZE_PATTERN = re.compile(r"\s*(\d+(?:\.\d+)?)\s*([kmg]?b?)\s*", re.IGNORECASE)
+
+
+def parse_duration(value: str) -> int:
+    """
+    Converts a duration such as 90m, 12h, 30d or 2w (plain numbers are seconds) to seconds.
+
+    Raises: ValueError if the value is not a duration.
+    """
+    match = DURATION_PATTERN.fullmatch(value)
+    if not match:
+        raise ValueError(f"Invalid duration, expected e.g. 12h, 30d or 2w: {value}")
+    return int(float(match.group(1)) * DURATION_UNITS[match.group(2).lower() or "s"])
+
+
+def parse_size(value: str) -> int:
+    """
+    Converts a size such as 500MB, 2G or 640k (plain numbers are bytes) to bytes.
+
+    Raises: ValueError if the value is not a size.
+    """
+    match = SIZE_PATTERN.fullmatch(value)
+    if not match:
+        raise ValueError(f"Invalid size, expected e.g. 640KB, 500MB or 2GB: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def format_size(size: int) -> str:
+    """Formats a number of bytes for display, e.g. 1536 -> '1.5 KB'."""
+    for unit in ("bytes", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class RetentionPolicy:
+    """
+    Limits on what the cache keeps, applied when it is compacted.
+
+    Attributes:
+    - max_age: Items published more than this many seconds ago expire (None to keep them).
+    - max_rows_per_source: Only the newest this many items of every source are kept (None for no limit).
+    - max_bytes: The oldest items expire until the cache and its indexes are estimated to fit in this
+     many bytes on disk (None for no limit).
+    """
+    def __init__(self, max_age: Optional[int] = None, max_rows_per_source: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        self.max_age = max_age
+        self.max_rows_per_source = max_rows_per_source
+        self.max_bytes = max_bytes
+
+    def __bool__(self) -> bool:
+        return any(limit is not None for limit in (self.max_age, self.max_rows_per_source, self.max_bytes))
+
+    def expired_links(self, items: Iterable[Dict[str, Any]], size_on_disk: int = 0,
+                      now: Optional[float] = None) -> Set[str]:
+        """
+        Returns the links of the cached items the policy drops, reading the items once.
+
+        Items are ordered by publication time (see `item_timestamp`), ties by storage order; items without
+        a publication time count as the oldest, but never expire by age. The age limit is applied first,
+        then the per-source limit, and the size limit last, evicting the oldest remaining items. The bytes
+        an item takes on disk are estimated by spreading `size_on_disk` over the items in proportion to
+        the length of their text.
+
+        Args:
+        - items: Every cached item, e.g. from `StorageBackend.iter_items`.
+        - size_on_disk: The current size of the cache and its indexes in bytes, for the size limit.
+        - now: The current time as a Unix timestamp (defaults to the clock), for the age limit.
+        """
+        cutoff = None if self.max_age is None else (time.time() if now is None else now) - self.max_age
+        expired: Set[str] = set()
+        seen: Set[str] = set()
+        kept: List[Tuple[float, int, str, int]] = []
+        per_source: Dict[Any, List[Tuple[float, int, str]]] = defaultdict(list)
+        total_length = 0
+        for position, item in enumerate(items):
+            link = item.get("link")
+            if not isinstance(link, str) or link in seen:
+                continue
+            seen.add(link)
+            timestamp = item_timestamp(item)
+            length = sum(len(value) if isinstance(value, str) else 8 for value in item.values())
+            total_length += length
+            if cutoff is not None and timestamp is not None and timestamp < cutoff:
+                expired.add(link)
+                continue
+            order = float("-inf") if timestamp is None else timestamp
+            kept.append((order, position, link, length))
+            if self.max_rows_per_source is not None:
+                newest = per_source[item.get("source_url") if isinstance(item.get("source_url"), str) else None]
+                heapq.heappush(newest, (order, position, link))
+                if len(newest) > self.max_rows_per_source:
+                    expired.add(heapq.heappop(newest)[2])
+
+        if self.max_bytes is not None and size_on_disk > self.max_bytes and total_length:
+            budget = self.max_bytes * total_length / size_on_disk
+            used = 0
+            for _, _, link, length in sorted((entry for entry in kept if entry[2] not in expired), reverse=True):
+                used += length
+                if used > budget:
+                    expired.add(link)
+        return expired
+
+
+class CompactionReport:
+    """
+    The outcome of a compaction.
+
+    Attributes:
+    - rows_removed: The number of rows removed, duplicates and expired items together.
+    - expired: The number of items removed by the retention policy.
+    - bytes_before: The size of the cache and its indexes on disk before compaction.
+    - bytes_after: The size of the cache and its indexes on disk after compaction.
+    - seconds: How long the compaction took.
+    """
+    def __init__(self, rows_removed: int, expired: int, bytes_before: int, bytes_after: int, seconds: float):
+        self.rows_removed = rows_removed
+        self.expired = expired
+        self.bytes_before = bytes_before
+        self.bytes_after = bytes_after
+        self.seconds = seconds
+
+    @property
+    def duplicates(self) -> int:
+        """The number of duplicate rows removed."""
+        return max(0, self.rows_removed - self.expired)
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        """The disk space freed by the compaction, in bytes."""
+        return self.bytes_before - self.bytes_after
+
+    def __str__(self) -> str:
+        return (f"Cache compacted, {self.duplicates} duplicate row(s) and {self.expired} expired item(s) removed, "
+                f"{format_size(self.bytes_reclaimed)} reclaimed "
+                f"({format_size(self.bytes_before)} -> {format_size(self.bytes_after)}) in {self.seconds:.2f}s.")
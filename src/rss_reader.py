@@ -1,27 +1,41 @@
-from bs4 import BeautifulSoup, Tag
-from typing import List, Optional, Dict, Any
-from src.utils import complex_to_simple_date
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Dict, Any, Union
+from src.utils import complex_to_simple_date, complex_to_timestamp
 
+if TYPE_CHECKING:
+    from bs4 import Tag
+    from lxml import etree
 
-def parse_item(item: Tag) -> Dict[str, Any]:
+ITEM_TAGS = ("title", "author", "pubDate", "link", "category", "description")
+LIST_TAGS = frozenset(("author", "category"))
+# Typed publication time (Unix seconds, UTC) added next to the pubDate day when the date can be parsed.
+PUBLISHED_KEY = "published"
+ITEM_TAG_PATTERNS = tuple(f"{{*}}{tag}" for tag in ITEM_TAGS)
+HINTS_CHUNK_SIZE = 16 * 1024
+
+
+def parse_item(item: "Tag") -> Dict[str, Any]:
     """
     Extracts details from a single RSS feed item into a dictionary.
 
+    Besides the item tags, "published" holds the publication time as a Unix timestamp.
+
     Args: - item: A BeautifulSoup Tag of the RSS feed item.
     """
-    tags = ("title", "author", "pubDate", "link", "category", "description")
-
     item_info = {}
-    for tag in tags:
+    for tag in ITEM_TAGS:
         element = item.find(tag)
         if element and element.text:
             match tag:
                 case "author" | "category":
                     item_info[tag] = [cat.text for cat in item.find_all(tag)]
                 case "pubDate":
-                    item_info[tag] = complex_to_simple_date(element.text)
+                    if simple_date := complex_to_simple_date(element.text):
+                        item_info[tag] = simple_date
+                        published = complex_to_timestamp(element.text)
                 case _:
                     item_info[tag] = element.text
+    if "pubDate" in item_info:
+        item_info[PUBLISHED_KEY] = published
     return item_info
 
 
@@ -29,14 +43,110 @@ def rss_parser(xml: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Parses RSS feed XML, returning a list of item dictionaries.
 
+    Items are extracted with lxml by `parse_element`, which gives the same result as `parse_item`.
+
     Args:
     - xml: XML string of the RSS feed.
     - limit: Max number of items to parse (None for no limit).
 
     Returns: List of dictionaries, each representing an RSS feed item.
     """
-    soup = BeautifulSoup(xml, 'lxml-xml')
-    return [parse_item(item) for item in soup.find_all('item', limit=limit)]
+    return list(iter_rss_items(chunks=[xml], limit=limit))
+
+
+def element_text(element: "etree._Element") -> str:
+    """Returns the text of an element including its descendants, like a BeautifulSoup Tag's `text`."""
+    if len(element):
+        return "".join(element.itertext())
+    return element.text or ""
+
+
+def parse_element(item: "etree._Element") -> Dict[str, Any]:
+    """
+    Extracts details from a single RSS feed item given as an lxml element, like `parse_item` does for a Tag.
+
+    The item subtree is walked once, dispatching on each element's tag name. As with `parse_item`, a field
+    is taken from its first element and left out if that element has no text; author and category
+    collect the text of all their elements.
+
+    Args: - item: An lxml element of the RSS feed item.
+    """
+    item_info = {}
+    skipped = set()
+    published = None
+    for element in item.iterdescendants(*ITEM_TAG_PATTERNS):
+        tag = element.tag.rpartition("}")[2]
+        if tag in item_info:
+            if tag in LIST_TAGS:
+                item_info[tag].append(element_text(element))
+        elif tag not in skipped:
+            if not (text := element_text(element)):
+                skipped.add(tag)
+            elif tag in LIST_TAGS:
+                item_info[tag] = [text]
+            elif tag == "pubDate":
+                if simple_date := complex_to_simple_date(text):
+                    item_info[tag] = simple_date
+                    published = complex_to_timestamp(text)
+            else:
+                item_info[tag] = text
+    parsed = {tag: item_info[tag] for tag in ITEM_TAGS if tag in item_info}
+    if "pubDate" in parsed:
+        parsed[PUBLISHED_KEY] = published
+    return parsed
+
+
+def iter_rss_items(chunks: Iterable[Union[bytes, str]], limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally parses an RSS feed delivered in chunks, yielding item dictionaries as soon as each item is complete.
+
+    Finished items are cleared from the tree, so memory stays bounded by the size of a single item.
+    Parsing stops, without reading the remaining chunks, once `limit` items have been produced.
+
+    Args:
+    - chunks: Byte chunks of the RSS feed XML, e.g. from `requests.Response.iter_content`.
+    - limit: Max number of items to parse (None for no limit).
+    """
+    from lxml import etree
+    parser = etree.XMLPullParser(events=("end",), tag="{*}item", recover=True, resolve_entities=False)
+    produced = 0
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, item in parser.read_events():
+            yield parse_element(item)
+            produced += 1
+            item.clear(keep_tail=True)
+            while item.getprevious() is not None:
+                del item.getparent()[0]
+            if limit and produced >= limit:
+                return
+
+
+def parse_channel_hints(xml: Union[bytes, str]) -> Dict[str, Any]:
+    """
+    Reads the polling hints of an RSS channel: `ttl` (minutes) and `skipHours` (GMT hours, 0-23).
+
+    Only the channel header is parsed; parsing stops at the first item.
+
+    Returns: A dictionary with an optional "ttl" integer and a "skip_hours" set.
+    """
+    from lxml import etree
+    hints = {"skip_hours": set()}
+    parser = etree.XMLPullParser(events=("start", "end"), recover=True, resolve_entities=False)
+    for start in range(0, len(xml), HINTS_CHUNK_SIZE):
+        parser.feed(xml[start:start + HINTS_CHUNK_SIZE])
+        for event, element in parser.read_events():
+            tag = element.tag.rpartition("}")[2] if isinstance(element.tag, str) else ""
+            if event == "start":
+                if tag == "item":
+                    return hints
+                continue
+            text = element_text(element).strip()
+            if tag == "ttl" and text.isdigit():
+                hints["ttl"] = int(text)
+            elif tag == "hour" and text.isdigit() and 0 <= int(text) <= 23:
+                hints["skip_hours"].add(int(text))
+    return hints
 
 
 if __name__ == "__main__":
@@ -0,0 +1,405 @@
+import heapq
+import json
+import math
+import re
+from collections import Counter
+from contextlib import closing
+from os import path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from src.storage import CACHE_COLUMNS, PUBLISHED_COLUMN, date_prefix_upper_bound, decode_item, to_text
+
+if TYPE_CHECKING:
+    import sqlite3
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MARKUP_PATTERN = re.compile(r"<[^>]*>")
+STOP_WORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in", "is", "it", "its", "of", "on",
+    "or", "that", "the", "to", "was", "were", "will", "with"))
+SEARCHED_FIELDS = ("title", "description")
+BM25_K1 = 1.2
+BM25_B = 0.75
+DEFAULT_TOP_CATEGORIES = 10
+INSERT_BATCH_SIZE = 10_000
+# Stays below SQLite's default limit on the number of query parameters.
+SELECT_BATCH_SIZE = 900
+
+
+def tokenize(text: Any) -> List[str]:
+    """Splits text into lowercase word tokens, leaving out HTML tags, stop words and single characters."""
+    if not isinstance(text, str):
+        return []
+    return [token for token in TOKEN_PATTERN.findall(MARKUP_PATTERN.sub(" ", text).lower())
+            if len(token) > 1 and token not in STOP_WORDS]
+
+
+def item_categories(item: Dict[str, Any]) -> List[str]:
+    """Returns the distinct, non-empty categories of an item, whose category is a list or a single string."""
+    categories = item.get("category")
+    if isinstance(categories, str):
+        categories = [categories]
+    elif not isinstance(categories, list):
+        return []
+    return list(dict.fromkeys(category.strip() for category in categories
+                              if isinstance(category, str) and category.strip()))
+
+
+def item_timestamp(item: Dict[str, Any]) -> Optional[int]:
+    """
+    Returns the publication time of a stored item as a Unix timestamp. Items cached before publication times
+    were stored fall back to midnight (UTC) of their pubDate day, or None if that is missing too.
+    """
+    if isinstance(published := item.get(PUBLISHED_COLUMN), int):
+        return published
+    pub_date = item.get("pubDate")
+    if isinstance(pub_date, str) and len(pub_date) >= 8 and pub_date[:8].isdigit():
+        from src.dates import parse_range_bound
+        try:
+            return parse_range_bound(pub_date[:8])
+        except ValueError:
+            return None
+    return None
+
+
+class SearchIndex:
+    """
+    A persistent inverted index over the titles, descriptions and categories of cached news items.
+
+    The index is an SQLite database next to the cache. Every item is a document identified by its link and
+    stores its token count, publication day and time, source URL and the item itself, so results are
+    returned without reading the cache. Documents are indexed by publication time, so a time range is
+    found with one index seek and read in order, newest first, without sorting. For every term the index
+    keeps postings, the documents containing the term with the term frequency, clustered by term so a
+    query reads only the postings of its own terms; matches are ranked with BM25. Categories are normalized
+    into their own table, keyed by category (compared case-insensitively) for category filters and by
+    publication date for per-period aggregations.
+    Adding items is incremental: documents whose link is already indexed are skipped.
+
+    Attributes:
+    - index_file: The path to the SQLite index database.
+    """
+    SCHEMA_VERSION = 3
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY,
+            link TEXT NOT NULL UNIQUE,
+            pubDate TEXT,
+            source_url TEXT,
+            published INTEGER,
+            length INTEGER NOT NULL,
+            item TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS documents_published ON documents (published);
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            document_id INTEGER NOT NULL,
+            frequency INTEGER NOT NULL,
+            PRIMARY KEY (term, document_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS categories (
+            category TEXT NOT NULL COLLATE NOCASE,
+            document_id INTEGER NOT NULL,
+            pubDate TEXT,
+            PRIMARY KEY (category, document_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS categories_pub_date ON categories (pubDate, category);
+        CREATE TABLE IF NOT EXISTS totals (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            documents INTEGER NOT NULL,
+            tokens INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+    """
+
+    def __init__(self, index_file: str):
+        self.index_file = index_file
+
+    def exists(self) -> bool:
+        """Returns True if the index has been created with the current schema. An older index must be rebuilt."""
+        if not path.exists(self.index_file):
+            return False
+        with closing(self._connect(create=False)) as connection:
+            return connection.execute("PRAGMA user_version").fetchone()[0] == self.SCHEMA_VERSION
+
+    def _connect(self, create: bool = True) -> "sqlite3.Connection":
+        """Opens a connection to the index, creating the schema of a new index if `create` is True."""
+        import sqlite3
+        connection = sqlite3.connect(self.index_file)
+        connection.execute("PRAGMA journal_mode=WAL")
+        if create and not connection.execute("PRAGMA user_version").fetchone()[0]:
+            connection.executescript(self.SCHEMA)
+            connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        return connection
+
+    def add_items(self, items: Iterable[Dict[str, Any]]) -> int:
+        """
+        Indexes news items that are not indexed yet, in batches of one transaction each.
+
+        Args:
+        - items: Item dictionaries with the CACHE_COLUMNS keys, e.g. cache rows.
+
+        Returns: The number of documents added.
+        """
+        added = 0
+        batch = []
+        with closing(self._connect()) as connection:
+            for item in items:
+                batch.append(item)
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    added += self._add_batch(connection, batch)
+                    batch = []
+            if batch:
+                added += self._add_batch(connection, batch)
+        return added
+
+    def _add_batch(self, connection: "sqlite3.Connection", items: List[Dict[str, Any]]) -> int:
+        """Indexes a batch of items in one transaction, with document ids assigned up front for bulk inserts."""
+        batch = {}
+        for item in items:
+            stored = decode_item({column: to_text(item.get(column)) for column in CACHE_COLUMNS})
+            if stored["link"] and stored["link"] not in batch:
+                batch[stored["link"]] = stored
+        links = list(batch)
+        for start in range(0, len(links), SELECT_BATCH_SIZE):
+            chunk = links[start:start + SELECT_BATCH_SIZE]
+            for (link,) in connection.execute(
+                    f"SELECT link FROM documents WHERE link IN ({', '.join('?' * len(chunk))})", chunk):
+                del batch[link]
+        if not batch:
+            return 0
+
+        (next_id,) = connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM documents").fetchone()
+        documents, postings, categories, tokens = [], [], [], 0
+        for document_id, stored in enumerate(batch.values(), start=next_id):
+            categories.extend((category, document_id, stored["pubDate"]) for category in item_categories(stored))
+            terms = Counter(token for field in SEARCHED_FIELDS for token in tokenize(stored[field]))
+            length = sum(terms.values())
+            documents.append((document_id, stored["link"], stored["pubDate"], stored["source_url"],
+                              item_timestamp(stored), length, json.dumps(stored)))
+            postings.extend((term, document_id, frequency) for term, frequency in terms.items())
+            tokens += length
+        with connection:
+            connection.executemany(
+                "INSERT INTO documents (id, link, pubDate, source_url, published, length, item) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", documents)
+            connection.executemany("INSERT INTO postings (term, document_id, frequency) VALUES (?, ?, ?)", postings)
+            connection.executemany("INSERT OR IGNORE INTO categories (category, document_id, pubDate) VALUES (?, ?, ?)",
+                                   categories)
+            connection.execute("UPDATE totals SET documents = documents + ?, tokens = tokens + ?",
+                               (len(documents), tokens))
+        return len(documents)
+
+    def remove_links(self, links: Iterable[str]) -> int:
+        """
+        Removes the documents of the given links, e.g. items expired from the cache, and reclaims their space.
+
+        The postings and categories of a document are found again from its stored item, so they are deleted
+        by primary key instead of scanning the postings. Deletion happens in batches of one transaction
+        each, which readers do not wait for.
+
+        Returns: The number of documents removed.
+        """
+        links = list(links)
+        if not links or not self.exists():
+            return 0
+        removed = 0
+        with closing(self._connect()) as connection:
+            for start in range(0, len(links), SELECT_BATCH_SIZE):
+                chunk = links[start:start + SELECT_BATCH_SIZE]
+                documents = connection.execute(
+                    f"SELECT id, length, item FROM documents WHERE link IN ({', '.join('?' * len(chunk))})",
+                    chunk).fetchall()
+                postings, categories = [], []
+                for document_id, _, item in documents:
+                    stored = json.loads(item)
+                    terms = {token for field in SEARCHED_FIELDS for token in tokenize(stored.get(field))}
+                    postings.extend((term, document_id) for term in terms)
+                    categories.extend((category, document_id) for category in item_categories(stored))
+                with connection:
+                    connection.executemany("DELETE FROM postings WHERE term = ? AND document_id = ?", postings)
+                    connection.executemany("DELETE FROM categories WHERE category = ? AND document_id = ?",
+                                           categories)
+                    connection.executemany("DELETE FROM documents WHERE id = ?",
+                                           [(document_id,) for document_id, _, _ in documents])
+                    connection.execute("UPDATE totals SET documents = documents - ?, tokens = tokens - ?",
+                                       (len(documents), sum(length for _, length, _ in documents)))
+                removed += len(documents)
+            if removed:
+                connection.execute("VACUUM")
+                connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def size_on_disk(self) -> int:
+        """Returns the number of bytes the index takes on disk, its write-ahead log included."""
+        return sum(path.getsize(file) for file in (self.index_file, f"{self.index_file}-wal", f"{self.index_file}-shm")
+                   if path.isfile(file))
+
+    def rebuild(self, items: Iterable[Dict[str, Any]]) -> int:
+        """
+        Replaces the index, whatever its schema version, with one built from the given items (normally every
+        cached item).
+        """
+        with closing(self._connect(create=False)) as connection:
+            for (table,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                connection.execute(f'DROP TABLE "{table}"')
+            connection.execute("PRAGMA user_version = 0")
+        return self.add_items(items)
+
+    @staticmethod
+    def _filters(date: Optional[str], source_urls: Optional[Sequence[str]], category: Optional[str],
+                 start: Optional[int] = None, end: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """Returns the SQL conditions on documents `d` for the optional filters, and their parameters."""
+        conditions, parameters = "", []
+        if start is not None:
+            conditions += " AND d.published >= ?"
+            parameters.append(start)
+        if end is not None:
+            conditions += " AND d.published <= ?"
+            parameters.append(end)
+        if date:
+            conditions += " AND d.pubDate >= ? AND d.pubDate < ?"
+            parameters += [date, date_prefix_upper_bound(date)]
+        if source_urls:
+            conditions += f" AND d.source_url IN ({', '.join('?' * len(source_urls))})"
+            parameters += list(source_urls)
+        if category:
+            conditions += " AND d.id IN (SELECT document_id FROM categories WHERE category = ?)"
+            parameters.append(category.strip())
+        return conditions, parameters
+
+    @staticmethod
+    def _load_items(connection: "sqlite3.Connection", ids: List[int]) -> List[Dict[str, Any]]:
+        """Returns the stored items of the documents, in the order of the ids."""
+        stored = {}
+        for start in range(0, len(ids), SELECT_BATCH_SIZE):
+            batch = ids[start:start + SELECT_BATCH_SIZE]
+            stored.update(connection.execute(
+                f"SELECT id, item FROM documents WHERE id IN ({', '.join('?' * len(batch))})", batch))
+        return [json.loads(stored[document_id]) for document_id in ids]
+
+    def search(self, query: str, date: Optional[str] = None, source_urls: Optional[Sequence[str]] = None,
+               limit: Optional[int] = None, category: Optional[str] = None,
+               start: Optional[int] = None, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the items matching any term of the query, best BM25 score first.
+
+        Args:
+        - query: The search text, tokenized like the indexed documents.
+        - date: Only items published on this date (a YYYYMMDD prefix), optional.
+        - source_urls: Only items from these sources, optional.
+        - limit: Max number of items to return (None for all matches).
+        - category: Only items in this category, compared case-insensitively, optional.
+        - start, end: Only items published in this time range (Unix timestamps, both inclusive), optional.
+
+        Returns: The matching items, as stored in the cache. Ties are broken by the most recently indexed item.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.exists():
+            return []
+        conditions, filter_parameters = self._filters(date, source_urls, category, start, end)
+
+        scores: Dict[int, float] = {}
+        with closing(self._connect()) as connection:
+            documents, tokens = connection.execute("SELECT documents, tokens FROM totals").fetchone()
+            average_length = tokens / documents if documents else 0
+            for term in terms:
+                (document_frequency,) = connection.execute(
+                    "SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()
+                if not document_frequency:
+                    continue
+                idf = math.log(1 + (documents - document_frequency + 0.5) / (document_frequency + 0.5))
+                postings = connection.execute(
+                    "SELECT p.document_id, p.frequency, d.length FROM postings p "
+                    f"JOIN documents d ON d.id = p.document_id WHERE p.term = ?{conditions}",
+                    [term, *filter_parameters])
+                for document_id, frequency, length in postings:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length) if average_length else BM25_K1
+                    scores[document_id] = (scores.get(document_id, 0.0)
+                                           + idf * frequency * (BM25_K1 + 1) / (frequency + norm))
+
+            ranked: List[Tuple[float, int]] = heapq.nlargest(
+                len(scores) if limit is None else limit,
+                ((score, document_id) for document_id, score in scores.items()))
+            return self._load_items(connection, [document_id for _, document_id in ranked])
+
+    def items_in_category(self, category: str, date: Optional[str] = None,
+                          source_urls: Optional[Sequence[str]] = None,
+                          limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the items in a category (compared case-insensitively), ordered by publication date.
+
+        The documents are found through the category table, so no other item is read.
+
+        Args:
+        - category: The category.
+        - date: Only items published on this date (a YYYYMMDD prefix), optional.
+        - source_urls: Only items from these sources, optional.
+        - limit: Max number of items to return (None for all).
+        """
+        if not self.exists():
+            return []
+        conditions, parameters = self._filters(date, source_urls, category)
+        with closing(self._connect()) as connection:
+            ids = [document_id for (document_id,) in connection.execute(
+                f"SELECT d.id FROM documents d WHERE 1 = 1{conditions} ORDER BY d.pubDate, d.id LIMIT ?",
+                [*parameters, -1 if limit is None else limit])]
+            return self._load_items(connection, ids)
+
+    def items_in_range(self, start: Optional[int] = None, end: Optional[int] = None, date: Optional[str] = None,
+                       source_urls: Optional[Sequence[str]] = None, category: Optional[str] = None,
+                       limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the items published in a time range, newest first.
+
+        The range is a seek into the publication time index followed by a backward scan, which stops after
+        `limit` matching documents, so the cost does not depend on the size of the cache. Items without a
+        publication time are left out.
+
+        Args:
+        - start: The earliest publication time (Unix timestamp, inclusive), or None for no lower bound.
+        - end: The latest publication time (Unix timestamp, inclusive), or None for no upper bound.
+        - date: Only items published on this date (a YYYYMMDD prefix), optional.
+        - source_urls: Only items from these sources, optional.
+        - category: Only items in this category, compared case-insensitively, optional.
+        - limit: Max number of items to return (None for all).
+        """
+        if not self.exists():
+            return []
+        conditions, parameters = self._filters(date, source_urls, category, start, end)
+        with closing(self._connect()) as connection:
+            ids = [document_id for (document_id,) in connection.execute(
+                f"SELECT d.id FROM documents d WHERE d.published IS NOT NULL{conditions}"
+                " ORDER BY d.published DESC, d.id DESC LIMIT ?",
+                [*parameters, -1 if limit is None else limit])]
+            return self._load_items(connection, ids)
+
+    def top_categories(self, date: Optional[str] = None, source_urls: Optional[Sequence[str]] = None,
+                       limit: Optional[int] = DEFAULT_TOP_CATEGORIES, start: Optional[int] = None,
+                       end: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Counts the items per category, most frequent first, from the category table alone.
+
+        Args:
+        - date: Only items published in this period (a YYYYMMDD prefix such as 2024 or 202401), optional.
+         Without a source filter, this is a range scan over the (pubDate, category) index.
+        - source_urls: Only items from these sources, optional.
+        - limit: Max number of categories to return (None for all).
+        - start, end: Only items published in this time range (Unix timestamps, both inclusive), optional.
+
+        Returns: (category, item count) pairs. Ties are ordered by category name.
+        """
+        if not self.exists():
+            return []
+        sql, parameters = "SELECT c.category, COUNT(*) AS items FROM categories c", []
+        if source_urls or start is not None or end is not None:
+            conditions, parameters = self._filters(None, source_urls, None, start, end)
+            sql += f" JOIN documents d ON d.id = c.document_id WHERE 1 = 1{conditions}"
+        else:
+            sql += " WHERE 1 = 1"
+        if date:
+            sql += " AND c.pubDate >= ? AND c.pubDate < ?"
+            parameters += [date, date_prefix_upper_bound(date)]
+        sql += " GROUP BY c.category ORDER BY items DESC, c.category LIMIT ?"
+        parameters.append(-1 if limit is None else limit)
+        with closing(self._connect()) as connection:
+            return [(category, count) for category, count in connection.execute(sql, parameters)]
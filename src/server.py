@@ -0,0 +1,369 @@
+import json
+import math
+import signal
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict
+from heapq import merge
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+from src.dates import parse_range_bound, parse_range_end
+from src.cache_manager import CacheManager
+from src.http_cache import hash_body
+from src.search import item_categories, item_timestamp
+from src.stats import recorder
+from src.utils import log_verbose
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_REFRESH_INTERVAL = 2.0
+RESPONSE_CACHE_SIZE = 1024
+
+
+class QueryError(ValueError):
+    """An invalid query parameter, answered with 400 Bad Request."""
+
+
+class HotIndex:
+    """
+    The cached news items held in memory, indexed by publication day, source, link and publication time.
+
+    The cache is read once, then `refresh` reads only what other processes have stored since (see
+    `StorageBackend.changes`) and adds it to the indexes, or reloads everything after a compaction. The
+    storage is read under the cache's merge lock, with the write-ahead log merged first (see
+    `CacheManager.read_merged`), so a refresh never sees a half-written batch nor leaves the items of
+    writers that found the lock taken behind, and is skipped while a merge or compaction holds the lock.
+    Queries and refreshes may run in different threads.
+
+    Attributes:
+    - cache_manager: The CacheManager of the cache the items are read from.
+    - storage: The storage backend the items are read from.
+    - generation: A counter increased by every refresh that changed the items.
+    - refreshed_at: The Unix time of the last refresh that read the storage.
+    """
+    def __init__(self, cache_manager: CacheManager):
+        self.cache_manager = cache_manager
+        self.storage = cache_manager.storage
+        self.generation = 0
+        self.refreshed_at: Optional[float] = None
+        self._cursor: Any = None
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self) -> None:
+        self._items: List[Dict[str, Any]] = []
+        self._by_link: Dict[str, int] = {}
+        self._by_day: Dict[str, List[int]] = defaultdict(list)
+        self._by_source: Dict[str, List[int]] = defaultdict(list)
+        self._timeline: List[Tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def refresh(self, blocking: bool = False) -> int:
+        """
+        Reads the items stored since the last refresh into the indexes.
+
+        Args:
+        - blocking: Waits for a merge or compaction in progress instead of skipping this refresh.
+
+        Returns: The number of items added, or all items after a reload.
+        """
+        read, changes = self.cache_manager.read_merged(lambda: self.storage.changes(self._cursor), blocking=blocking)
+        if not read:
+            return 0
+        items, self._cursor, reset = changes
+        with self._lock:
+            cleared = reset and bool(self._items)
+            if reset:
+                self._clear()
+            added = self._add(items)
+            if cleared or added:
+                self.generation += 1
+            self.refreshed_at = time.time()
+        return added
+
+    def _add(self, items: Iterable[Dict[str, Any]]) -> int:
+        """
+        Indexes the items whose link is not indexed yet. Missing values (NaN) become None, for JSON.
+
+        The publication times of the new items are sorted once and merged into the timeline, so loading
+        n items takes O(n log n) rather than one O(n) insertion per item.
+        """
+        added = 0
+        timeline: List[Tuple[int, int]] = []
+        for item in items:
+            link = item.get("link")
+            if not isinstance(link, str) or link in self._by_link:
+                continue
+            item = {key: None if isinstance(value, float) and math.isnan(value) else value
+                    for key, value in item.items()}
+            position = len(self._items)
+            self._items.append(item)
+            self._by_link[link] = position
+            if isinstance(pub_date := item.get("pubDate"), str):
+                self._by_day[pub_date[:8]].append(position)
+            if isinstance(source_url := item.get("source_url"), str):
+                self._by_source[source_url].append(position)
+            if (timestamp := item_timestamp(item)) is not None:
+                timeline.append((timestamp, position))
+            added += 1
+        timeline.sort()
+        if not self._timeline or not timeline or self._timeline[-1] <= timeline[0]:
+            self._timeline.extend(timeline)
+        else:
+            self._timeline = list(merge(self._timeline, timeline))
+        return added
+
+    def item(self, link: str) -> Optional[Dict[str, Any]]:
+        """Returns the item with the link, or None."""
+        with self._lock:
+            position = self._by_link.get(link)
+            return None if position is None else self._items[position]
+
+    def query(self, date: Optional[str] = None, start: Optional[int] = None, end: Optional[int] = None,
+              source_urls: Optional[Sequence[str]] = None, category: Optional[str] = None, offset: int = 0,
+              limit: Optional[int] = DEFAULT_PAGE_SIZE) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Returns one page of the matching items and the total number of matches.
+
+        Items in a time range come newest first, like `news_in_range`; otherwise they come in storage
+        order, like `retrieve_news_from_cache`. The candidates are taken from the most selective index
+        that applies (time, then day, then source) and checked against the remaining filters.
+
+        Args:
+        - date: Only items whose pubDate starts with this YYYYMMDD prefix.
+        - start: Only items published at or after this Unix timestamp.
+        - end: Only items published at or before this Unix timestamp.
+        - source_urls: Only items from these sources.
+        - category: Only items in this category, compared case-insensitively.
+        - offset: The number of matches skipped before the page.
+        - limit: The page size (None for every match).
+        """
+        sources = set(source_urls) if source_urls else None
+        category = category.casefold() if category else None
+        with self._lock:
+            if start is not None or end is not None:
+                low = 0 if start is None else bisect_left(self._timeline, (start, -1))
+                high = len(self._timeline) if end is None else bisect_right(self._timeline, (end, math.inf))
+                positions: Iterable[int] = [position for _, position in reversed(self._timeline[low:high])]
+            elif date:
+                days = [date[:8]] if len(date) >= 8 else [day for day in self._by_day if day.startswith(date)]
+                positions = merge(*(self._by_day[day] for day in days if day in self._by_day))
+            elif sources:
+                positions = merge(*(self._by_source[source] for source in sources if source in self._by_source))
+            else:
+                positions = range(len(self._items))
+            if date or sources or category:
+                positions = [position for position in positions
+                             if self._matches(self._items[position], date, sources, category)]
+            stop = None if limit is None else offset + limit
+            return len(positions), [self._items[position] for position in positions[offset:stop]]
+
+    @staticmethod
+    def _matches(item: Dict[str, Any], date: Optional[str], sources: Optional[set], category: Optional[str]) -> bool:
+        if date and not (isinstance(item.get("pubDate"), str) and item["pubDate"].startswith(date)):
+            return False
+        if sources is not None and item.get("source_url") not in sources:
+            return False
+        return category is None or any(name.casefold() == category for name in item_categories(item))
+
+
+class NewsServer(ThreadingHTTPServer):
+    """
+    An HTTP server answering JSON queries from a HotIndex, one thread per connection.
+
+    A background thread refreshes the index every `refresh_interval` seconds. Responses are cached by
+    request target until the index changes, and carry an ETag (the hash of the body), so a client
+    repeating a request with If-None-Match gets 304 Not Modified while the result is unchanged.
+
+    Attributes:
+    - hot_index: The HotIndex queries are answered from.
+    - refresh_interval: Seconds between refreshes of the index.
+    - verbose: Logs every request.
+    """
+    daemon_threads = True
+
+    def __init__(self, hot_index: HotIndex, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 refresh_interval: float = DEFAULT_REFRESH_INTERVAL, verbose: bool = False):
+        super().__init__((host, port), NewsRequestHandler)
+        self.hot_index = hot_index
+        self.refresh_interval = refresh_interval
+        self.verbose = verbose
+        self._responses: "OrderedDict[str, Tuple[int, int, bytes, str]]" = OrderedDict()
+        self._responses_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The base URL of the server, e.g. http://127.0.0.1:8080."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                if added := self.hot_index.refresh():
+                    log_verbose(message=f"Hot index refreshed, {added} item(s) added.", verbose=self.verbose)
+            except Exception as e:
+                print(f"Error refreshing the hot index: {e}")
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        """Serves requests until `shutdown` is called, refreshing the index in a background thread."""
+        self._stop.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="hot-index-refresh", daemon=True)
+        self._refresher.start()
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self._stop.set()
+
+    def respond(self, target: str) -> Tuple[int, bytes, str]:
+        """Returns the status, JSON body and ETag of the response to a GET request target, e.g. /news?date=20240403."""
+        generation = self.hot_index.generation
+        with self._responses_lock:
+            cached = self._responses.get(target)
+            if cached is not None and cached[0] == generation:
+                self._responses.move_to_end(target)
+                return cached[1:]
+
+        status, payload = self._route(target)
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        response = (status, body, f'"{hash_body(body)[:32]}"')
+        if status == 200:
+            with self._responses_lock:
+                self._responses[target] = (generation, *response)
+                self._responses.move_to_end(target)
+                if len(self._responses) > RESPONSE_CACHE_SIZE:
+                    self._responses.popitem(last=False)
+        return response
+
+    def _route(self, target: str) -> Tuple[int, Dict[str, Any]]:
+        url = urlsplit(target)
+        parameters = parse_qs(url.query)
+        try:
+            if url.path == "/news":
+                return 200, self._news_page(url.path, parameters)
+            if url.path == "/news/item":
+                link = single(parameters, "link")
+                item = self.hot_index.item(link) if link else None
+                return (200, item) if item is not None else (404, {"error": f"No cached news with the link: {link}"})
+            if url.path == "/status":
+                return 200, {"items": len(self.hot_index), "generation": self.hot_index.generation,
+                             "refreshed_at": self.hot_index.refreshed_at}
+        except QueryError as e:
+            return 400, {"error": str(e)}
+        return 404, {"error": f"Unknown path: {url.path}, use /news, /news/item or /status"}
+
+    def _news_page(self, path: str, parameters: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Answers /news, returning one page of matches with the total and the target of the next page."""
+        date = single(parameters, "date")
+        if date and not date.isdigit():
+            raise QueryError(f"Invalid date, expected a YYYYMMDD prefix: {date}")
+        try:
+            start = parse_range_bound(value) if (value := single(parameters, "from")) else None
+            end = parse_range_end(value) if (value := single(parameters, "to")) else None
+        except ValueError as e:
+            raise QueryError(str(e)) from e
+        limit = integer(parameters, "limit", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        offset = integer(parameters, "offset", 0, 0, None)
+
+        total, items = self.hot_index.query(date=date, start=start, end=end, source_urls=parameters.get("source"),
+                                            category=single(parameters, "category"), offset=offset, limit=limit)
+        next_page = None
+        if offset + limit < total:
+            next_page = f"{path}?{urlencode({**parameters, 'offset': [offset + limit]}, doseq=True)}"
+        return {"total": total, "offset": offset, "limit": limit, "next": next_page, "items": items}
+
+
+class NewsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET requests with `NewsServer.respond`, honouring If-None-Match. Connections are kept alive,
+    with Nagle's algorithm off so a body sent after its headers is not held back until the client's
+    delayed ACK (about 40ms per request).
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: NewsServer
+
+    def do_GET(self) -> None:
+        with recorder.stage("serve"):
+            status, body, etag = self.server.respond(self.path)
+            if status == 200 and etag_matches(self.headers.get("If-None-Match"), etag):
+                status, body = 304, b""
+            self.send_response(status)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            if status != 304:
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        recorder.count("serve_requests")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        log_verbose(message=f"{self.address_string()} {format % args}", verbose=self.server.verbose)
+
+
+def single(parameters: Dict[str, List[str]], name: str) -> Optional[str]:
+    """Returns the last value of a query parameter, or None if it is missing or empty."""
+    values = parameters.get(name)
+    return values[-1] if values and values[-1] else None
+
+
+def integer(parameters: Dict[str, List[str]], name: str, default: int, minimum: int, maximum: Optional[int]) -> int:
+    """
+    Returns an integer query parameter, or the default if it is missing.
+
+    Raises: QueryError if the value is not an integer within [minimum, maximum].
+    """
+    value = single(parameters, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise QueryError(f"Invalid {name}, expected an integer: {value}") from None
+    if number < minimum or (maximum is not None and number > maximum):
+        raise QueryError(f"Invalid {name}, expected {minimum} to {maximum or 'any'}: {value}")
+    return number
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Returns True if an If-None-Match header lists the ETag (weak comparison) or is '*'."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def serve(cache_manager: CacheManager, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          refresh_interval: float = DEFAULT_REFRESH_INTERVAL, verbose: bool = False) -> None:
+    """
+    Loads the cache into a HotIndex and serves it over HTTP until SIGINT or SIGTERM is received.
+
+    Args:
+    - cache_manager: The CacheManager of the cache.
+    - host: The interface to listen on, the loopback interface by default.
+    - port: The port to listen on (0 for any free port).
+    - refresh_interval: Seconds between reads of newly cached items.
+    - verbose: Logs every request and refresh.
+    """
+    hot_index = HotIndex(cache_manager)
+    started = time.perf_counter()
+    hot_index.refresh(blocking=True)
+    log_verbose(message=f"Loaded {len(hot_index)} news item(s) in {time.perf_counter() - started:.2f}s.",
+                verbose=verbose)
+    with NewsServer(hot_index, host=host, port=port, refresh_interval=refresh_interval, verbose=verbose) as server:
+        def stop(*_) -> None:
+            threading.Thread(target=server.shutdown).start()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        print(f"Serving {len(hot_index)} cached news item(s) on {server.url}/news")
+        server.serve_forever()
@@ -0,0 +1,923 @@
+import csv
+import io
+import json
+import math
+from abc import ABC, abstractmethod
+from contextlib import closing
+from glob import glob, escape as glob_escape
+from importlib.util import find_spec
+from itertools import islice
+from os import path, makedirs, remove, replace, stat
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import sqlite3
+
+CACHE_COLUMNS = ["title", "author", "pubDate", "link", "category", "description", "source_url", "published"]
+LIST_COLUMNS = ("author", "category")
+PUBLISHED_COLUMN = "published"
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+PARQUET_EXTENSION = ".parquet"
+UNDATED_PARTITION = "undated"
+# Stays below SQLite's default limit on the number of query parameters.
+SQLITE_BATCH_PARAMETERS = 900
+
+
+class LinkIndex:
+    """
+    A persistent set of cached links, stored one per line in a text file and loaded once. Links appended
+    by other processes since then are read with `refresh`.
+
+    Attributes:
+    - index_file: The path to the link index file.
+    """
+    def __init__(self, index_file: str, load_links: Callable[[], Iterable[str]]):
+        """
+        Args:
+        - index_file: The path to the link index file.
+        - load_links: Returns every link stored in the cache, used to rebuild a missing index.
+        """
+        self.index_file = index_file
+        self._load_links = load_links
+        self._links: Optional[Set[str]] = None
+        self._read_state: Optional[Tuple[int, int]] = None
+
+    @property
+    def links(self) -> Set[str]:
+        """The set of cached links, read from the index file (or rebuilt from the cache) on first use."""
+        if self._links is None:
+            if path.exists(self.index_file):
+                self._links = set()
+                self._read_from(0)
+            else:
+                self.rebuild()
+        return self._links
+
+    def _read_from(self, offset: int) -> None:
+        """Adds the links stored in the index file from the byte offset on, up to the last complete line."""
+        with open(self.index_file, "rb") as index:
+            inode = stat(index.fileno()).st_ino
+            index.seek(offset)
+            data = index.read()
+        data = data[:data.rfind(b"\n") + 1]
+        self._links.update(line.decode("utf-8") for line in data.splitlines())
+        self._read_state = (inode, offset + len(data))
+
+    def refresh(self) -> None:
+        """Reads the links other processes have appended since the index was loaded, or reloads a rewritten index."""
+        if self._links is None or self._read_state is None:
+            return
+        if not path.exists(self.index_file):
+            self._links = None
+            return
+        inode, offset = self._read_state
+        current = stat(self.index_file)
+        if current.st_ino != inode or current.st_size < offset:
+            self._links = None
+        else:
+            self._read_from(offset)
+
+    def add(self, links: Iterable[str]) -> None:
+        """Appends newly cached links to the index. Callers hold the cache's merge lock, see src.journal."""
+        links = list(links)
+        self.links.update(links)
+        with open(self.index_file, "a", encoding="utf-8") as index:
+            index.writelines(f"{link}\n" for link in links)
+        if self._read_state is not None:
+            self._read_state = (self._read_state[0], path.getsize(self.index_file))
+
+    def rebuild(self) -> None:
+        """Rewrites the index file from the links stored in the cache, replacing it atomically."""
+        self._links = set(self._load_links())
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as index:
+            index.writelines(f"{link}\n" for link in self._links)
+        replace(temp_file, self.index_file)
+        current = stat(self.index_file)
+        self._read_state = (current.st_ino, current.st_size)
+
+
+def new_items_mask(items_df: "pd.DataFrame", cached_links: Set[str]) -> "pd.Series":
+    """Returns a mask of the items whose link is neither cached nor repeated earlier in the DataFrame."""
+    links = items_df["link"].fillna("").astype(str)
+    return ~links.isin(cached_links) & ~links.duplicated()
+
+
+class StorageBackend(ABC):
+    """
+    Base class for the storage backends used by CacheManager.
+
+    Backends receive new items as a DataFrame with the CACHE_COLUMNS columns and are responsible for
+    deduplicating them by link. Authors and categories are lists; backends store them as JSON arrays
+    (see `to_text`) and give them back as lists, and the publication time is stored and given back as an
+    integer Unix timestamp (see `encode_items` and `decode_item`).
+
+    Attributes:
+    - cache_file: The path of the file the backend stores news items in.
+    """
+    def __init__(self, cache_file: str):
+        self.cache_file = cache_file
+
+    def exists(self) -> bool:
+        """Returns True if the storage has been created."""
+        return path.exists(self.cache_file)
+
+    def sidecar_path(self, name: str) -> str:
+        """Returns the path of an auxiliary file kept with the cache, e.g. news_cache.links for news_cache.csv."""
+        return f"{path.splitext(self.cache_file)[0]}.{name}"
+
+    @abstractmethod
+    def add_items(self, items_df: "pd.DataFrame") -> int:
+        """Stores the items whose link is not cached yet and returns how many were added."""
+
+    @abstractmethod
+    def query(self, date: str, source_urls: Optional[Sequence[str]] = None,
+              limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yields the items published on the date (a YYYYMMDD prefix), optionally only from the given sources.
+
+        Reading stops once `limit` items have been produced, so large results never have to fit in memory.
+        """
+
+    @abstractmethod
+    def iter_items(self) -> Iterator[Dict[str, Any]]:
+        """Lazily yields every stored item, in storage order."""
+
+    def iter_chunks(self, date: str = "", source_urls: Optional[Sequence[str]] = None,
+                    chunk_size: int = 100_000) -> Iterator["pd.DataFrame"]:
+        """
+        Lazily yields the items published on the date (a YYYYMMDD prefix, "" for every item), optionally
+        only from the given sources, as DataFrames of at most `chunk_size` rows with the CACHE_COLUMNS
+        columns, for bulk readers that do not need an item dictionary per row.
+
+        Authors and categories may be given back as stored (JSON arrays) rather than lists, and publication
+        times as text; `decode_list` and `to_timestamp_value` convert them. The default implementation
+        batches the items of `query`; backends override it to read whole chunks at a time.
+        """
+        import pandas as pd
+        items = self.query(date=date, source_urls=source_urls)
+        while chunk := list(islice(items, chunk_size)):
+            yield pd.DataFrame.from_records(chunk, columns=CACHE_COLUMNS)
+
+    def files(self) -> List[str]:
+        """Returns the files the backend keeps the items and its own indexes in."""
+        return [self.cache_file]
+
+    def refresh(self) -> None:
+        """Picks up what other processes have written since this instance last looked, e.g. new cached links."""
+
+    def append_state(self) -> Dict[str, int]:
+        """
+        Returns the size of every file `add_items` appends to, so that a write interrupted by a crash can be
+        undone with `recover`. Backends whose writes are atomic return an empty dictionary.
+        """
+        return {}
+
+    def recover(self, state: Dict[str, int]) -> None:
+        """Undoes a write interrupted after `append_state` returned `state`, truncating the appended files."""
+
+    def changes(self, cursor: Any = None) -> Tuple[List[Dict[str, Any]], Any, bool]:
+        """
+        Reads what has been stored since `cursor` was returned, for readers that keep the cache in memory.
+
+        The default implementation rereads every item whenever a file of the backend changed size or
+        modification time; backends that append override it to read only the new rows. Callers hold the
+        cache's merge lock (see src.journal), so no write is in progress.
+
+        Args:
+        - cursor: The cursor returned by the previous call, or None to read every item.
+
+        Returns: The items, the cursor to pass next time, and True if the items replace everything read
+        before (e.g. after a compaction rewrote the cache) rather than adding to it.
+        """
+        signature = [(file, stat(file).st_size, stat(file).st_mtime_ns) for file in self.files() if path.isfile(file)]
+        if cursor is not None and signature == cursor:
+            return [], cursor, False
+        return list(self.iter_items()) if self.exists() else [], signature, True
+
+    def size_on_disk(self) -> int:
+        """Returns the number of bytes the backend's files take on disk."""
+        return sum(path.getsize(file) for file in self.files() if path.isfile(file))
+
+    @abstractmethod
+    def compact(self, expired_links: Optional[Set[str]] = None) -> int:
+        """
+        Rewrites the storage without duplicates, expired items or dead space and returns the number of rows removed.
+
+        Readers are not blocked: files are rewritten next to the originals and swapped in atomically, and
+        SQLite readers keep reading their snapshot while rows are deleted.
+
+        Args:
+        - expired_links: The links of the items to drop, e.g. from `RetentionPolicy.expired_links`.
+        """
+
+
+class CsvStorage(StorageBackend):
+    """
+    Stores news items in a CSV file.
+
+    New items are appended to the CSV file. Links already in the cache are tracked in a link index file
+    next to it, loaded once per instance, so a write costs time proportional to the number of new items.
+    Rewriting the whole file only happens in `compact`.
+
+    Attributes:
+    - cache_file: The path to the CSV file used for caching news items.
+    - index_file: The path to the link index file, one cached link per line.
+    """
+    def __init__(self, cache_file: str):
+        super().__init__(cache_file)
+        self.index_file = self.sidecar_path("links")
+        self._link_index = LinkIndex(self.index_file, load_links=self._read_links)
+
+    def _read_links(self) -> Iterable[str]:
+        """Reads the link column of the CSV file."""
+        if not self.exists():
+            return []
+        import pandas as pd
+        return pd.read_csv(self.cache_file, usecols=["link"], dtype=str)["link"].fillna("")
+
+    def _columns(self) -> List[str]:
+        """Returns the column order of the existing CSV file, or the default one for a new file."""
+        if self.exists():
+            return csv_columns(self.cache_file)
+        return CACHE_COLUMNS
+
+    def add_items(self, items_df: "pd.DataFrame") -> int:
+        if not self.exists():
+            self._link_index.rebuild()
+        else:
+            upgrade_csv_columns(self.cache_file)
+        items_df = items_df.reindex(columns=self._columns())
+        items_df = items_df[new_items_mask(items_df, self._link_index.links)]
+
+        if not items_df.empty:
+            encode_items(items_df).to_csv(self.cache_file, mode="a", index=False, header=not self.exists())
+            self._link_index.add(items_df["link"].fillna("").astype(str))
+        return len(items_df)
+
+    def query(self, date: str, source_urls: Optional[Sequence[str]] = None,
+              limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        return islice(self._iter_matches(date, source_urls), limit)
+
+    def _iter_matches(self, date: str, source_urls: Optional[Sequence[str]]) -> Iterator[Dict[str, Any]]:
+        """Reads the CSV file row by row with the csv module, yielding the matching rows."""
+        yield from iter_csv_matches(self.cache_file, date, source_urls)
+
+    def iter_items(self) -> Iterator[Dict[str, Any]]:
+        if not self.exists():
+            return iter([])
+        return self._iter_matches("", None)
+
+    def iter_chunks(self, date: str = "", source_urls: Optional[Sequence[str]] = None,
+                    chunk_size: int = 100_000) -> Iterator["pd.DataFrame"]:
+        """Reads the CSV file in chunks with pandas, every column as text, and filters each chunk."""
+        if self.exists() and path.getsize(self.cache_file):
+            yield from iter_csv_chunks(self.cache_file, date, source_urls, chunk_size)
+
+    def files(self) -> List[str]:
+        return [self.cache_file, self.index_file]
+
+    def refresh(self) -> None:
+        self._link_index.refresh()
+
+    def append_state(self) -> Dict[str, int]:
+        return {self.cache_file: path.getsize(self.cache_file) if self.exists() else -1}
+
+    def changes(self, cursor: Any = None) -> Tuple[List[Dict[str, Any]], Any, bool]:
+        """
+        Reads the rows appended since the cursor, a (inode, byte offset) pair, or the whole file if it was
+        rewritten.
+        """
+        if not self.exists():
+            return [], None, cursor is not None
+        if cursor is not None:
+            inode, offset = cursor
+            current = stat(self.cache_file)
+            if current.st_ino == inode and current.st_size >= offset:
+                items, cursor = read_csv_rows(self.cache_file, offset)
+                return items, cursor, False
+        items, cursor = read_csv_rows(self.cache_file, 0)
+        return items, cursor, True
+
+    def recover(self, state: Dict[str, int]) -> None:
+        truncate_files(state)
+        self._link_index.rebuild()
+
+    def compact(self, expired_links: Optional[Set[str]] = None) -> int:
+        """
+        Rewrites the CSV file without duplicate or expired links and rebuilds the link index.
+
+        The file is streamed row by row into a new file next to the old one, which is then swapped in
+        atomically, so memory use does not grow with the cache and readers of the old file are unaffected.
+        """
+        if not self.exists():
+            return 0
+        removed, _ = rewrite_csv(self.cache_file, expired_links or set(), seen=set())
+        self._link_index.rebuild()
+        return removed
+
+
+class PartitionedStorage(StorageBackend):
+    """
+    Stores news items in a directory with one file per publication day, e.g. data/news_cache/20240403.csv.
+
+    A date query opens only the partitions whose name starts with the date, and a write appends to (CSV) or
+    rewrites (Parquet) only the partitions that receive new items. Partitions are Parquet files when the
+    directory name ends with .parquet, in which case source filters are pushed down to the Parquet reader;
+    this needs pyarrow. Links are deduplicated across partitions with a link index file in the directory.
+
+    Attributes:
+    - cache_file: The path to the partition directory.
+    - file_format: The partition file format, "csv" or "parquet".
+    - index_file: The path to the link index file, one cached link per line.
+    """
+    def __init__(self, cache_file: str, file_format: Optional[str] = None):
+        super().__init__(cache_file)
+        self.file_format = file_format or (
+            "parquet" if cache_file.lower().rstrip("/\\").endswith(PARQUET_EXTENSION) else "csv")
+        if self.file_format == "parquet":
+            if not pyarrow_installed():
+                raise ImportError("Parquet partitions require pyarrow, install it with 'pip install pyarrow'.")
+        self.index_file = self.sidecar_path("links")
+        self._link_index = LinkIndex(self.index_file, load_links=self._read_links)
+
+    def exists(self) -> bool:
+        """Returns True once a partition has been written; the directory alone may only hold the write-ahead log."""
+        return path.isdir(self.cache_file) and bool(self.partitions())
+
+    def sidecar_path(self, name: str) -> str:
+        """Auxiliary files are kept inside the partition directory, e.g. news_cache/links."""
+        return path.join(self.cache_file, name)
+
+    def partition_file(self, name: str) -> str:
+        """Returns the path of the partition file for a YYYYMMDD day (or the undated partition)."""
+        return path.join(self.cache_file, f"{name}.{self.file_format}")
+
+    def partitions(self, prefix: str = "") -> List[str]:
+        """Returns the sorted paths of the partition files whose day starts with the prefix."""
+        return sorted(glob(path.join(glob_escape(self.cache_file), f"{glob_escape(prefix)}*.{self.file_format}")))
+
+    def _read_partition(self, partition: str, columns: Optional[List[str]] = None,
+                        source_urls: Optional[Sequence[str]] = None) -> "pd.DataFrame":
+        """Reads a partition file, keeping only the given columns and sources."""
+        import pandas as pd
+        if self.file_format == "parquet":
+            filters = [("source_url", "in", list(source_urls))] if source_urls else None
+            return pd.read_parquet(partition, columns=columns, filters=filters)
+        partition_df = pd.read_csv(partition, usecols=columns, dtype={"pubDate": str})
+        if source_urls:
+            partition_df = partition_df[partition_df["source_url"].isin(source_urls)]
+        return partition_df
+
+    def _write_partition(self, partition: str, partition_df: "pd.DataFrame") -> None:
+        """Replaces a partition file atomically."""
+        temp_file = f"{partition}.tmp"
+        if self.file_format == "parquet":
+            encode_items(partition_df).map(to_text).to_parquet(temp_file, index=False)
+        else:
+            encode_items(partition_df).to_csv(temp_file, index=False)
+        replace(temp_file, partition)
+
+    def _read_links(self) -> Iterable[str]:
+        """Reads the link column of every partition."""
+        return [link for partition in self.partitions()
+                for link in self._read_partition(partition, columns=["link"])["link"].fillna("").astype(str)]
+
+    def add_items(self, items_df: "pd.DataFrame") -> int:
+        makedirs(self.cache_file, exist_ok=True)
+        items_df = items_df.reindex(columns=CACHE_COLUMNS)
+        items_df = items_df[new_items_mask(items_df, self._link_index.links)]
+        if items_df.empty:
+            return 0
+
+        days = items_df["pubDate"].fillna("").astype(str).str[:8]
+        days = days.where(days.str.fullmatch(r"\d{8}"), UNDATED_PARTITION)
+        for day, partition_df in items_df.groupby(days, sort=False):
+            partition = self.partition_file(day)
+            if self.file_format == "csv":
+                if path.exists(partition):
+                    upgrade_csv_columns(partition)
+                    partition_df = partition_df.reindex(columns=csv_columns(partition))
+                encode_items(partition_df).to_csv(partition, mode="a", index=False, header=not path.exists(partition))
+            else:
+                if path.exists(partition):
+                    import pandas as pd
+                    partition_df = pd.concat([self._read_partition(partition), partition_df], ignore_index=True)
+                self._write_partition(partition, partition_df)
+
+        self._link_index.add(items_df["link"].fillna("").astype(str))
+        return len(items_df)
+
+    def query(self, date: str, source_urls: Optional[Sequence[str]] = None,
+              limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        return islice(self._iter_matches(date, source_urls), limit)
+
+    def _iter_matches(self, date: str, source_urls: Optional[Sequence[str]]) -> Iterator[Dict[str, Any]]:
+        """Reads the matching partitions one at a time, yielding their rows. CSV partitions are read without pandas."""
+        for partition in self.partitions(date):
+            if self.file_format == "csv":
+                yield from iter_csv_matches(partition, date, source_urls)
+                continue
+            partition_df = self._read_partition(partition, source_urls=source_urls)
+            yield from map(decode_item, partition_df.reindex(columns=CACHE_COLUMNS).to_dict('records'))
+
+    def iter_items(self) -> Iterator[Dict[str, Any]]:
+        return self._iter_matches("", None)
+
+    def iter_chunks(self, date: str = "", source_urls: Optional[Sequence[str]] = None,
+                    chunk_size: int = 100_000) -> Iterator["pd.DataFrame"]:
+        """Reads the matching partitions one at a time, CSV partitions in chunks, and splits them into chunks."""
+        for partition in self.partitions(date):
+            if self.file_format == "csv":
+                yield from iter_csv_chunks(partition, date, source_urls, chunk_size)
+                continue
+            partition_df = filter_chunk(self._read_partition(partition, source_urls=source_urls), date, None)
+            for start in range(0, len(partition_df), chunk_size):
+                yield partition_df.iloc[start:start + chunk_size]
+
+    def files(self) -> List[str]:
+        return self.partitions() + [self.index_file]
+
+    def refresh(self) -> None:
+        self._link_index.refresh()
+
+    def append_state(self) -> Dict[str, int]:
+        """Records the sizes of the CSV partitions; Parquet partitions are replaced atomically."""
+        if self.file_format != "csv":
+            return {}
+        return {partition: path.getsize(partition) for partition in self.partitions()}
+
+    def changes(self, cursor: Any = None) -> Tuple[List[Dict[str, Any]], Any, bool]:
+        """
+        Reads the rows appended to CSV partitions and every row of new or rewritten Parquet partitions since
+        the cursor, which maps each partition to its read state. Reads everything again if a partition was
+        deleted or rewritten by a compaction.
+        """
+        if self.file_format != "csv":
+            return super().changes(cursor)
+        previous = cursor or {}
+        partitions = self.partitions()
+        reset = cursor is None or not set(previous) <= set(partitions)
+        items, cursor = [], {}
+        for partition in partitions:
+            inode, offset = (None, 0) if reset else previous.get(partition, (None, 0))
+            if inode is not None:
+                current = stat(partition)
+                if current.st_ino != inode or current.st_size < offset:
+                    return self.changes(None)
+                if current.st_size == offset:
+                    cursor[partition] = (inode, offset)
+                    continue
+            partition_items, cursor[partition] = read_csv_rows(partition, offset)
+            items.extend(partition_items)
+        return items, cursor, reset
+
+    def recover(self, state: Dict[str, int]) -> None:
+        """Truncates the CSV partitions appended to and deletes the partitions created by the interrupted write."""
+        if self.file_format == "csv":
+            truncate_files({partition: state.get(partition, -1) for partition in self.partitions()})
+        self._link_index.rebuild()
+
+    def compact(self, expired_links: Optional[Set[str]] = None) -> int:
+        """
+        Rewrites the partitions that contain expired links or links already stored earlier, deletes the
+        partitions left empty and rebuilds the link index.
+        """
+        if not self.exists():
+            return 0
+        expired_links = expired_links or set()
+        seen, removed = set(), 0
+        for partition in self.partitions():
+            if self.file_format == "csv":
+                partition_removed, kept = rewrite_csv(partition, expired_links, seen)
+            else:
+                partition_df = self._read_partition(partition)
+                links = partition_df["link"].fillna("").astype(str)
+                keep = new_items_mask(partition_df, seen) & ~links.isin(expired_links)
+                seen.update(links)
+                partition_removed, kept = int((~keep).sum()), int(keep.sum())
+                if partition_removed and kept:
+                    self._write_partition(partition, partition_df[keep])
+            removed += partition_removed
+            if not kept:
+                remove(partition)
+        self._link_index.rebuild()
+        return removed
+
+
+class SqliteStorage(StorageBackend):
+    """
+    Stores news items in an SQLite database.
+
+    The `news` table has a unique index on `link`, used to deduplicate inserts with an upsert, and
+    indexes on `pubDate` and `source_url`, so date lookups are index range scans instead of full scans.
+    Inserts are batched, one transaction per batch. Databases created before the `published` column
+    existed get it added when they are opened.
+
+    Attributes:
+    - cache_file: The path to the SQLite database file.
+    - batch_size: The number of rows inserted per transaction.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS news (
+            id INTEGER PRIMARY KEY,
+            title TEXT,
+            author TEXT,
+            pubDate TEXT,
+            link TEXT NOT NULL UNIQUE,
+            category TEXT,
+            description TEXT,
+            source_url TEXT,
+            published INTEGER
+        );
+    """
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS news_pub_date ON news (pubDate);
+        CREATE INDEX IF NOT EXISTS news_source_url ON news (source_url, pubDate);
+    """
+
+    def __init__(self, cache_file: str, batch_size: int = 10_000):
+        super().__init__(cache_file)
+        self.batch_size = batch_size
+        self._schema_ready = False
+
+    def _connect(self, read_only: bool = False) -> "sqlite3.Connection":
+        """
+        Opens a connection to the database. The schema is created or migrated by the first writable
+        connection of the instance. Read-only connections neither create the database nor take a write
+        lock, unless it has to be migrated first; callers check that it exists.
+        """
+        import sqlite3
+        if read_only:
+            connection = sqlite3.connect(f"{Path(self.cache_file).absolute().as_uri()}?mode=ro", uri=True)
+            connection.row_factory = sqlite3.Row
+            if self._schema_ready or self._has_columns(connection):
+                return connection
+            connection.close()
+        connection = sqlite3.connect(self.cache_file)
+        connection.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.SCHEMA)
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(news)")}
+            for column in CACHE_COLUMNS:
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE news ADD COLUMN {column} "
+                                       f"{'INTEGER' if column == PUBLISHED_COLUMN else 'TEXT'}")
+            connection.executescript(self.INDEXES)
+            self._schema_ready = True
+        return connection
+
+    @staticmethod
+    def _has_columns(connection: "sqlite3.Connection") -> bool:
+        """Returns True if the news table has every cache column, so it can be read without a migration."""
+        return set(CACHE_COLUMNS) <= {row["name"] for row in connection.execute("PRAGMA table_info(news)")}
+
+    def add_items(self, items_df: "pd.DataFrame") -> int:
+        items_df = encode_items(items_df.reindex(columns=CACHE_COLUMNS))
+        items_df = items_df.assign(link=items_df["link"].fillna(""))
+        rows = [tuple(to_text(value) for value in row)
+                for row in items_df.itertuples(index=False, name=None)]
+
+        insert = (f"INSERT INTO news ({', '.join(CACHE_COLUMNS)}) VALUES ({', '.join('?' * len(CACHE_COLUMNS))}) "
+                  "ON CONFLICT(link) DO NOTHING")
+        added = 0
+        with closing(self._connect()) as connection:
+            for start in range(0, len(rows), self.batch_size):
+                with connection:
+                    before = connection.total_changes
+                    connection.executemany(insert, rows[start:start + self.batch_size])
+                    added += connection.total_changes - before
+        return added
+
+    def query(self, date: str, source_urls: Optional[Sequence[str]] = None,
+              limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        sql = f"SELECT {', '.join(CACHE_COLUMNS)} FROM news WHERE pubDate >= ? AND pubDate < ?"
+        parameters = [date, date_prefix_upper_bound(date)]
+        if source_urls:
+            sql += f" AND source_url IN ({', '.join('?' * len(source_urls))})"
+            parameters.extend(source_urls)
+        sql += " ORDER BY pubDate, id LIMIT ?"
+        parameters.append(-1 if limit is None else limit)
+        if not self.exists():
+            return
+        with closing(self._connect(read_only=True)) as connection:
+            for row in connection.execute(sql, parameters):
+                yield decode_item(dict(row))
+
+    def iter_items(self) -> Iterator[Dict[str, Any]]:
+        if not self.exists():
+            return
+        with closing(self._connect(read_only=True)) as connection:
+            for row in connection.execute(f"SELECT {', '.join(CACHE_COLUMNS)} FROM news ORDER BY id"):
+                yield decode_item(dict(row))
+
+    def iter_chunks(self, date: str = "", source_urls: Optional[Sequence[str]] = None,
+                    chunk_size: int = 100_000) -> Iterator["pd.DataFrame"]:
+        """Fetches the matching rows `chunk_size` at a time, in storage order, without building a dictionary per row."""
+        if not self.exists():
+            return
+        import pandas as pd
+        sql = f"SELECT {', '.join(CACHE_COLUMNS)} FROM news"
+        parameters = []
+        if date:
+            sql += " WHERE pubDate >= ? AND pubDate < ?"
+            parameters.extend([date, date_prefix_upper_bound(date)])
+        if source_urls:
+            sql += f" {'AND' if date else 'WHERE'} source_url IN ({', '.join('?' * len(source_urls))})"
+            parameters.extend(source_urls)
+        with closing(self._connect(read_only=True)) as connection:
+            connection.row_factory = None
+            cursor = connection.execute(sql + " ORDER BY id", parameters)
+            while rows := cursor.fetchmany(chunk_size):
+                yield pd.DataFrame.from_records(rows, columns=CACHE_COLUMNS)
+
+    def files(self) -> List[str]:
+        return [self.cache_file, f"{self.cache_file}-wal", f"{self.cache_file}-shm"]
+
+    def changes(self, cursor: Any = None) -> Tuple[List[Dict[str, Any]], Any, bool]:
+        """
+        Reads the rows inserted since the cursor, the last row id read and the number of rows up to it.
+        Reads everything again if rows up to that id were deleted, e.g. by a compaction.
+        """
+        if not self.exists():
+            return [], None, cursor is not None
+        last_id, count = cursor or (0, 0)
+        select = f"SELECT id, {', '.join(CACHE_COLUMNS)} FROM news WHERE id > ? ORDER BY id"
+        with closing(self._connect(read_only=True)) as connection:
+            reset = cursor is None or connection.execute(
+                "SELECT COUNT(*) FROM news WHERE id <= ?", (last_id,)).fetchone()[0] != count
+            if reset:
+                last_id, count = 0, 0
+            items = []
+            for row in connection.execute(select, (last_id,)):
+                item = dict(row)
+                last_id = item.pop("id")
+                items.append(decode_item(item))
+        return items, (last_id, count + len(items)), reset
+
+    def compact(self, expired_links: Optional[Set[str]] = None) -> int:
+        """
+        Deletes the expired links, one transaction per batch, then rebuilds the database file to reclaim the
+        space left by deleted rows. Links are already unique.
+        """
+        if not self.exists():
+            return 0
+        links = list(expired_links or ())
+        removed = 0
+        with closing(self._connect()) as connection:
+            for start in range(0, len(links), SQLITE_BATCH_PARAMETERS):
+                batch = links[start:start + SQLITE_BATCH_PARAMETERS]
+                with connection:
+                    removed += connection.execute(
+                        f"DELETE FROM news WHERE link IN ({', '.join('?' * len(batch))})", batch).rowcount
+            connection.execute("VACUUM")
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+
+def pyarrow_installed() -> bool:
+    """Returns True if pyarrow, needed for Parquet files, is installed, without importing it."""
+    return find_spec("pyarrow") is not None
+
+
+def to_text(value: Any) -> Any:
+    """Converts a DataFrame cell to a storable value: lists become JSON arrays and missing values become None."""
+    if isinstance(value, list):
+        return json.dumps(value, ensure_ascii=False)
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+def iter_csv_matches(csv_file: str, date: str, source_urls: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the rows of a CSV cache file whose pubDate starts with the date, optionally only from the given sources.
+
+    The file is read with the csv module, so date queries do not need pandas. Rows are filtered before a
+    dictionary is built for them, and empty cells become NaN, as they would with `pandas.read_csv`.
+    """
+    with open(csv_file, newline="", encoding="utf-8") as cache:
+        reader = csv.reader(cache)
+        columns = next(reader, None)
+        if columns is None:
+            return
+        date_column = columns.index("pubDate")
+        source_column = columns.index("source_url") if "source_url" in columns else None
+        sources = set(source_urls) if source_urls else None
+        for row in reader:
+            if len(row) != len(columns) or not row[date_column].startswith(date):
+                continue
+            if sources is not None and (source_column is None or row[source_column] not in sources):
+                continue
+            yield decode_item({column: value if value else math.nan for column, value in zip(columns, row)})
+
+
+def filter_chunk(chunk_df: "pd.DataFrame", date: str, source_urls: Optional[Sequence[str]]) -> "pd.DataFrame":
+    """Keeps the rows of a chunk whose pubDate starts with the date and, if given, whose source is one of those."""
+    mask = chunk_df["pubDate"].fillna("").astype(str).str.startswith(date) if date else None
+    if source_urls:
+        in_sources = chunk_df["source_url"].isin(source_urls)
+        mask = in_sources if mask is None else mask & in_sources
+    return chunk_df if mask is None else chunk_df[mask]
+
+
+def iter_csv_chunks(csv_file: str, date: str, source_urls: Optional[Sequence[str]],
+                    chunk_size: int) -> Iterator["pd.DataFrame"]:
+    """
+    Yields the matching rows of a CSV cache file in chunks of at most `chunk_size` rows with the CACHE_COLUMNS
+    columns. Every column is read as text and empty cells become NaN; rows with the wrong number of cells
+    are skipped, as `iter_csv_matches` does.
+    """
+    import pandas as pd
+    for chunk_df in pd.read_csv(csv_file, dtype=str, chunksize=chunk_size, on_bad_lines="skip"):
+        chunk_df = filter_chunk(chunk_df.reindex(columns=CACHE_COLUMNS), date, source_urls)
+        if not chunk_df.empty:
+            yield chunk_df
+
+
+def read_csv_rows(csv_file: str, offset: int) -> Tuple[List[Dict[str, Any]], Tuple[int, int]]:
+    """
+    Reads the rows of a CSV cache file from a byte offset (0 or the end of a previous read) to the end.
+
+    Returns: The rows, decoded like `iter_csv_matches` does, and the (inode, byte offset) to continue from.
+    """
+    columns = csv_columns(csv_file)
+    with open(csv_file, "rb") as cache:
+        inode = stat(cache.fileno()).st_ino
+        cache.seek(offset)
+        data = cache.read()
+    reader = csv.reader(io.StringIO(data.decode("utf-8"), newline=""))
+    if not offset:
+        next(reader, None)
+    items = [decode_item({column: value if value else math.nan for column, value in zip(columns, row)})
+             for row in reader if len(row) == len(columns)]
+    return items, (inode, offset + len(data))
+
+
+def csv_columns(csv_file: str) -> List[str]:
+    """Returns the header of a CSV cache file, or CACHE_COLUMNS for an empty file."""
+    with open(csv_file, newline="", encoding="utf-8") as cache:
+        return next(csv.reader(cache), CACHE_COLUMNS)
+
+
+def upgrade_csv_columns(csv_file: str) -> bool:
+    """
+    Adds the CACHE_COLUMNS missing from a CSV file written by an older version, e.g. `published`, as empty
+    cells at the end of every row. The file is rewritten row by row and swapped in atomically.
+
+    Returns: True if the file was rewritten.
+    """
+    columns = csv_columns(csv_file)
+    missing = [column for column in CACHE_COLUMNS if column not in columns]
+    if not missing:
+        return False
+    temp_file = f"{csv_file}.tmp"
+    with open(csv_file, newline="", encoding="utf-8") as cache, \
+            open(temp_file, "w", newline="", encoding="utf-8") as upgraded:
+        reader, writer = csv.reader(cache), csv.writer(upgraded)
+        next(reader, None)
+        writer.writerow(columns + missing)
+        writer.writerows(row + [""] * len(missing) for row in reader)
+    replace(temp_file, csv_file)
+    return True
+
+
+def rewrite_csv(csv_file: str, expired_links: Set[str], seen: Set[str]) -> Tuple[int, int]:
+    """
+    Rewrites a CSV cache file row by row without the rows whose link is expired or in `seen`, adding every
+    kept link to `seen`. Columns missing from an older file are added, and short rows padded, with empty
+    cells. The file is only replaced, atomically, if something changed; a file left without rows is
+    kept for the caller to delete.
+
+    Returns: The number of rows removed and the number of rows kept.
+    """
+    columns = csv_columns(csv_file)
+    header = columns + [column for column in CACHE_COLUMNS if column not in columns]
+    link_column = columns.index("link")
+    removed = kept = 0
+    temp_file = f"{csv_file}.tmp"
+    with open(csv_file, newline="", encoding="utf-8") as cache, \
+            open(temp_file, "w", newline="", encoding="utf-8") as compacted:
+        reader, writer = csv.reader(cache), csv.writer(compacted)
+        next(reader, None)
+        writer.writerow(header)
+        for row in reader:
+            link = row[link_column] if link_column < len(row) else ""
+            if link in seen or link in expired_links:
+                removed += 1
+                continue
+            seen.add(link)
+            kept += 1
+            writer.writerow(row + [""] * (len(header) - len(row)))
+    if removed or header != columns:
+        replace(temp_file, csv_file)
+    else:
+        remove(temp_file)
+    return removed, kept
+
+
+def truncate_files(sizes: Dict[str, int]) -> None:
+    """Truncates every file to its recorded size, deleting the files recorded as missing (-1)."""
+    for file, size in sizes.items():
+        if not path.exists(file):
+            continue
+        if size < 0:
+            remove(file)
+        elif path.getsize(file) > size:
+            with open(file, "r+b") as truncated:
+                truncated.truncate(size)
+
+
+def to_timestamp_value(value: Any) -> Optional[int]:
+    """Converts a stored publication time (int, float or digit string) to an int, or None if it is missing."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return None if math.isnan(value) else int(value)
+    if isinstance(value, str) and value.lstrip("-").isdigit():
+        return int(value)
+    return None
+
+
+def encode_items(items_df: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Returns the items ready to be written: author and category lists are encoded as JSON arrays, and
+    publication times become ints (rather than the floats pandas uses for a column with missing values).
+    """
+    import pandas as pd
+    columns = {column: items_df[column].map(to_text) for column in LIST_COLUMNS if column in items_df.columns}
+    if PUBLISHED_COLUMN in items_df.columns:
+        columns[PUBLISHED_COLUMN] = pd.Series(map(to_timestamp_value, items_df[PUBLISHED_COLUMN]),
+                                              index=items_df.index, dtype=object)
+    return items_df.assign(**columns)
+
+
+def decode_list(value: Any) -> Any:
+    """
+    Decodes a stored author or category list. JSON arrays and the str(list) text of older caches become
+    lists; any other value, e.g. a plain string or a missing value, is returned unchanged.
+    """
+    if not isinstance(value, str) or not value.startswith("["):
+        return value
+    try:
+        decoded = json.loads(value)
+    except ValueError:
+        import ast
+        try:
+            decoded = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return value
+    return decoded if isinstance(decoded, list) else value
+
+
+def decode_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Decodes the author and category lists and the publication time of a stored item in place and returns it."""
+    for column in LIST_COLUMNS:
+        if column in item:
+            item[column] = decode_list(item[column])
+    if (published := item.get(PUBLISHED_COLUMN)) is not None and not isinstance(published, int):
+        if (timestamp := to_timestamp_value(published)) is not None:
+            item[PUBLISHED_COLUMN] = timestamp
+    return item
+
+
+def date_prefix_upper_bound(prefix: str) -> str:
+    """Returns the smallest string greater than every string starting with the prefix, e.g. 20240403 -> 20240404."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else "\U0010ffff"
+
+
+def open_storage(cache_file: str) -> StorageBackend:
+    """
+    Returns the storage backend for the cache file, chosen by its extension.
+
+    .db/.sqlite/.sqlite3 files use SQLite, .parquet paths and paths without an extension (or existing
+    directories) use daily partitions, and anything else a single CSV file.
+    """
+    name = cache_file.lower().rstrip("/\\")
+    if name.endswith(SQLITE_EXTENSIONS):
+        return SqliteStorage(cache_file)
+    if name.endswith(PARQUET_EXTENSION) or not path.splitext(name)[1] or path.isdir(cache_file):
+        return PartitionedStorage(cache_file)
+    return CsvStorage(cache_file)
+
+
+def migrate_csv_to_sqlite(csv_file: str, db_file: str, chunk_size: int = 100_000) -> int:
+    """
+    Copies every item of a CSV cache into an SQLite cache, reading the CSV in chunks.
+
+    Args:
+    - csv_file: The path of the existing CSV cache.
+    - db_file: The path of the SQLite database to create or extend.
+    - chunk_size: The number of CSV rows read and inserted at a time.
+
+    Returns: The number of items added to the database.
+    """
+    import pandas as pd
+    storage = SqliteStorage(db_file, batch_size=chunk_size)
+    added = 0
+    for chunk in pd.read_csv(csv_file, dtype={"pubDate": str}, chunksize=chunk_size):
+        added += storage.add_items(chunk)
+    return added
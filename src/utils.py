@@ -1,14 +1,26 @@
-from datetime import datetime
+from typing import Optional
+
+from src.dates import timestamp_to_readable, to_readable_date, to_simple_date, to_timestamp
 
 
 def complex_to_simple_date(date_str: str) -> str:
-    """Converts input date format to the simplet one use in command line"""
-    return datetime.strptime(date_str, '%a, %d %b %Y %H:%M:%S %z').strftime('%Y%m%d')
+    """Converts input date format to the simplet one use in command line, '' if the date cannot be parsed"""
+    return to_simple_date(date_str)
+
+
+def complex_to_timestamp(date_str: str) -> Optional[int]:
+    """Converts input date format to a Unix timestamp in seconds (UTC), None if the date cannot be parsed"""
+    return to_timestamp(date_str)
 
 
 def simple_to_readable_date(date_str: str) -> str:
-    """Converts command line data format to more readable format"""
-    return datetime.strptime(date_str, '%Y%m%d').strftime('%Y-%B-%d')
+    """Converts command line data format to more readable format, keeping values that are not dates as they are"""
+    return to_readable_date(date_str)
+
+
+def timestamp_to_readable_date(timestamp) -> str:
+    """Converts a Unix timestamp to a readable UTC date and time, keeping values that are not timestamps as they are"""
+    return timestamp_to_readable(timestamp)
 
 
 def log_verbose(message: str, verbose) -> None:
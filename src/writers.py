@@ -0,0 +1,75 @@
+import json
+import math
+import sys
+from textwrap import indent
+from typing import Any, Dict, Iterable, Optional, TextIO, Tuple
+from src.utils import simple_to_readable_date, timestamp_to_readable_date
+
+CONCISE_KEYS = ("title", "link", "pubDate")
+TAGS_MAP = {
+    "title": "Title",
+    "author": "Authors",
+    "link": "Link",
+    "pubDate": "Publish Date",
+    "description": "Description",
+    "category": "Categories",
+    "source_url": "Source URL",
+    "published": "Published At"
+}
+
+
+def _is_missing(value: Any) -> bool:
+    """Returns True for a missing value: None from the search index or NaN from a CSV cell."""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def display_item(item: Dict[str, Any], verbose: bool) -> Dict[str, Any]:
+    """
+    Returns the item as it is displayed, without modifying the original.
+
+    Only the title, link and publication date are kept in non-verbose mode, and the publication date
+    (and, in verbose mode, the publication time) is converted to the readable format. Missing values are
+    left out, so every query path displays the same item the same way.
+    """
+    displayed = {tag: value for tag, value in item.items()
+                 if (verbose or tag in CONCISE_KEYS) and not _is_missing(value)}
+    displayed["pubDate"] = simple_to_readable_date(date_str=displayed.get("pubDate", ""))
+    if "published" in displayed:
+        displayed["published"] = timestamp_to_readable_date(displayed["published"])
+    return displayed
+
+
+def write_text(news_items: Iterable[Dict[str, Any]], verbose: bool = False, out: Optional[TextIO] = None) -> None:
+    """Writes the news items one by one as 'Tag: value' blocks separated by blank lines."""
+    out = out or sys.stdout
+    for item in news_items:
+        displayed = display_item(item, verbose)
+        out.write("\n".join(f"{TAGS_MAP.get(key, key)}: {value}" for key, value in displayed.items()) + "\n\n")
+
+
+def write_json(news_items: Iterable[Dict[str, Any]], verbose: bool = False, out: Optional[TextIO] = None) -> None:
+    """Writes the news items one by one as a JSON array, formatted like `json.dumps(news_items, indent=2)`."""
+    out = out or sys.stdout
+    separator = "[\n"
+    for item in news_items:
+        out.write(separator + indent(json.dumps(display_item(item, verbose), indent=2), "  "))
+        separator = ",\n"
+    out.write("[]\n" if separator == "[\n" else "\n]\n")
+
+
+def write_ndjson(news_items: Iterable[Dict[str, Any]], verbose: bool = False, out: Optional[TextIO] = None) -> None:
+    """Writes the news items as newline-delimited JSON, one compact object per line."""
+    out = out or sys.stdout
+    for item in news_items:
+        out.write(json.dumps(display_item(item, verbose)) + "\n")
+
+
+def write_category_counts(counts: Iterable[Tuple[str, int]], to_json: bool = False,
+                          out: Optional[TextIO] = None) -> None:
+    """Writes (category, item count) pairs as 'category: count' lines, or as a JSON array of objects."""
+    out = out or sys.stdout
+    if to_json:
+        out.write(json.dumps([{"category": category, "count": count} for category, count in counts], indent=2) + "\n")
+        return
+    for category, count in counts:
+        out.write(f"{category}: {count}\n")
@@ -0,0 +1,66 @@
+import json
+from benchmarks.generators import generate_cache_rows, generate_feed, generate_pub_dates
+from benchmarks.run import compare_results, main, run_benchmarks
+from src.dates import parse_pub_date
+from src.rss_reader import rss_parser
+from src.storage import pyarrow_installed
+
+
+def test_generate_feed_is_reproducible():
+    xml = generate_feed(items=20, description_size=50, categories=4, seed=1)
+    assert xml == generate_feed(items=20, description_size=50, categories=4, seed=1)
+    items = rss_parser(xml=xml)
+    assert len(items) == 20
+    assert all(len(item["category"]) == 4 and len(item["description"]) == 50 for item in items)
+
+
+def test_generate_pub_dates():
+    unique = generate_pub_dates(count=1000, seed=1)
+    assert len(set(unique)) == 1000 and unique == generate_pub_dates(count=1000, seed=1)
+    assert all(parse_pub_date(date) is not None for date in unique)
+    assert len(set(generate_pub_dates(count=1000, distinct=10))) == 10
+
+
+def test_generate_cache_rows_have_unique_links():
+    first = generate_cache_rows(rows=1500, offset=0)
+    second = generate_cache_rows(rows=500, offset=1500)
+    assert len(set(first["link"]) | set(second["link"])) == 2000
+    assert first["pubDate"].str.fullmatch(r"\d{8}").all()
+
+
+def test_compare_flags_slowdowns_and_memory_growth():
+    baseline = {"results": {"a": {"seconds": 1.0, "peak_memory_bytes": 100},
+                            "b": {"seconds": 1.0, "peak_memory_bytes": 100},
+                            "c": {"seconds": 1.0, "peak_memory_bytes": 100}}}
+    current = {"results": {"a": {"seconds": 1.1, "peak_memory_bytes": 100},
+                           "b": {"seconds": 1.5, "peak_memory_bytes": 100},
+                           "c": {"seconds": 0.5, "peak_memory_bytes": 200}}}
+    rows = {row["name"]: row for row in compare_results(baseline, current, threshold=0.2)}
+    assert not rows["a"]["regression"]
+    assert rows["b"]["regression"] and rows["c"]["regression"]
+
+
+def test_run_and_compare(tmp_path):
+    report = run_benchmarks(feed_items=[50], cache_rows=[200], backends=["csv", "sqlite"], pub_dates=[1000],
+                            repeats=1, startup=False, work_dir=str(tmp_path), serve_clients=2, serve_requests=5)
+    exports = {"export/csv/rows=200", "export/sqlite/rows=200"} if pyarrow_installed() else set()
+    assert set(report["results"]) == {"parse/items=50", "query/csv/rows=200", "range_query/csv/rows=200",
+                                      "serve/csv/rows=200", "cache/csv/rows=200", "query/sqlite/rows=200",
+                                      "range_query/sqlite/rows=200", "serve/sqlite/rows=200",
+                                      "cache/sqlite/rows=200", "parse_pub_date/unique=1000",
+                                      "parse_pub_date/strptime/unique=1000",
+                                      "parse_pub_date/distinct=500/dates=1000"} | exports
+    assert report["results"]["query/csv/rows=200"]["matches"] == report["results"]["query/sqlite/rows=200"]["matches"]
+    assert (report["results"]["range_query/csv/rows=200"]["matches"]
+            == report["results"]["range_query/sqlite/rows=200"]["matches"] > 0)
+    assert all(result["peak_memory_bytes"] for result in report["results"].values())
+    serve = report["results"]["serve/csv/rows=200"]
+    assert serve["items"] == 10 and 0 < serve["latency_ms"]["p50"] <= serve["latency_ms"]["max"]
+
+    for name in exports:
+        export = report["results"][name]
+        assert export["items"] == 200 and 0 < export["bytes"] < export["cache_bytes"]
+
+    baseline_file = tmp_path / "baseline.json"
+    baseline_file.write_text(json.dumps(report))
+    assert main(["compare", str(baseline_file), str(baseline_file)]) == 0
@@ -79,3 +79,61 @@ def test_retrieve_news_from_cache_by_date_and_source(cache_manager, sample_news_
     filtered_news = cache_manager.retrieve_news_from_cache("20240101", source_url="http://example.com")
 
     assert all(item['pubDate'] == "20240101" and item['source_url'] == "http://example.com" for item in filtered_news)
+
+
+def test_cache_feeds_single_write(cache_manager, sample_news_items):
+    """
+    Ensures items from several sources are cached together and tagged with their own source URL.
+    """
+    other_items = [dict(item, link=item["link"] + "-other") for item in sample_news_items]
+    cache_manager.cache_feeds([("http://a.example.com", sample_news_items), ("http://b.example.com", other_items)],
+                              verbose=False)
+
+    cached_data = pd.read_csv(cache_manager.cache_file)
+
+    assert len(cached_data) == 4
+    assert cached_data['source_url'].value_counts().to_dict() == {"http://a.example.com": 2, "http://b.example.com": 2}
+    assert len(list(cache_manager.retrieve_news_from_cache(
+        "20240101", source_url=["http://a.example.com", "http://b.example.com"]))) == 2
+
+
+def test_cache_news_appends_only_new_items(cache_manager, sample_news_items):
+    """
+    Ensures new items are appended without rewriting the rows already in the cache.
+    """
+    cache_manager.cache_news(sample_news_items[:1], "http://example.com", verbose=False)
+    original_content = Path(cache_manager.cache_file).read_text()
+
+    cache_manager.cache_news(sample_news_items, "http://example.com", verbose=False)
+    new_content = Path(cache_manager.cache_file).read_text()
+
+    assert new_content.startswith(original_content)
+    assert len(pd.read_csv(cache_manager.cache_file)) == len(sample_news_items)
+
+
+def test_link_index_is_persistent(cache_manager, sample_news_items):
+    """
+    Checks that a fresh CacheManager reuses the persisted link index to skip already cached links.
+    """
+    cache_manager.cache_news(sample_news_items, "http://example.com", verbose=False)
+    assert Path(cache_manager.storage.index_file).read_text().split() == [item["link"] for item in sample_news_items]
+
+    CacheManager(cache_file=cache_manager.cache_file).cache_news(sample_news_items, "http://example.com", verbose=False)
+
+    assert len(pd.read_csv(cache_manager.cache_file)) == len(sample_news_items)
+
+
+def test_compact_removes_duplicates(cache_manager, sample_news_items):
+    """
+    Verifies that compaction rewrites the cache without duplicate links and rebuilds the link index.
+    """
+    cache_manager.cache_news(sample_news_items, "http://example.com", verbose=False)
+    pd.DataFrame.from_records(sample_news_items).assign(source_url="http://example.com").to_csv(
+        cache_manager.cache_file, mode="a", index=False, header=False)
+    Path(cache_manager.storage.index_file).unlink()
+
+    report = cache_manager.compact()
+    assert report.rows_removed == report.duplicates == len(sample_news_items)
+    assert len(pd.read_csv(cache_manager.cache_file)) == len(sample_news_items)
+    indexed_links = sorted(Path(cache_manager.storage.index_file).read_text().split())
+    assert indexed_links == [item["link"] for item in sample_news_items]
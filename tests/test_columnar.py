@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+from src.cache_manager import CacheManager
+from src.columnar import read_columnar, to_lists
+from src.main import main
+
+pa = pytest.importorskip("pyarrow")
+START = 1704067200  # 2024-01-01 00:00 UTC
+
+
+def news_items(count: int):
+    """Returns `count` news items published over three days, every other one with an author."""
+    return [{"title": f"News {number}", "author": ["Ann"] if number % 2 else None,
+             "pubDate": f"2024010{1 + number % 3}", "link": f"http://example.com/{number}",
+             "category": ["World", f"Topic {number}"], "description": f"Text {number}, with \"quotes\"",
+             "published": START + number * 3600}
+            for number in range(count)]
+
+
+def cached(tmp_path, cache_name: str) -> CacheManager:
+    cache_manager = CacheManager(cache_file=str(tmp_path / cache_name))
+    items = news_items(12)
+    cache_manager.cache_feeds(feeds=[("http://a.com", items[:6]), ("http://b.com", items[6:])], verbose=False)
+    return cache_manager
+
+
+@pytest.mark.parametrize("cache_name", ["news_cache.csv", "news_cache.db", "news_cache", "news_cache.parquet"])
+@pytest.mark.parametrize("export_name", ["news.parquet", "news.arrow"])
+def test_export_and_import_round_trip(tmp_path, cache_name, export_name):
+    cache_manager = cached(tmp_path, cache_name)
+    export_file = str(tmp_path / export_name)
+    assert cache_manager.export_news(export_file, chunk_size=5) == 12
+
+    table = (pd.read_parquet(export_file) if export_name.endswith(".parquet") else pd.read_feather(export_file))
+    # Parquet has no second unit, so the publication times are read back in milliseconds.
+    assert isinstance(table["published"].dtype, pd.DatetimeTZDtype) and str(table["published"].dt.tz) == "UTC"
+    row = table.set_index("link").loc["http://example.com/7"]
+    assert list(row["category"]) == ["World", "Topic 7"] and list(row["author"]) == ["Ann"]
+    assert row["published"] == pd.Timestamp(START + 7 * 3600, unit="s", tz="UTC")
+
+    copy = CacheManager(cache_file=str(tmp_path / f"copy_{cache_name}"))
+    assert copy.import_news(export_file, date="20240102", chunk_size=3) == 4
+    assert copy.import_news(export_file) == 8
+    imported = {item["link"]: item for item in copy.storage.iter_items()}
+    original = {item["link"]: item for item in cache_manager.storage.iter_items()}
+    assert imported.keys() == original.keys()
+    assert imported["http://example.com/7"] == {**news_items(12)[7], "source_url": "http://b.com"}
+    assert len(copy.search_news("quotes", limit=None)) == 12
+
+
+def test_export_filters(tmp_path):
+    cache_manager = cached(tmp_path, "news_cache.csv")
+    export_file = str(tmp_path / "news.parquet")
+    assert cache_manager.export_news(export_file, date="20240103", source_url="http://a.com") == 2
+    assert [item["link"] for chunk in read_columnar(export_file) for item in chunk] == [
+        "http://example.com/2", "http://example.com/5"]
+
+    assert cache_manager.export_news(str(tmp_path / "all.parquet")) == 12
+    assert len(list(read_columnar(str(tmp_path / "all.parquet"), source_urls=["http://b.com"], chunk_size=4))) == 2
+    assert [len(chunk) for chunk in read_columnar(str(tmp_path / "all.parquet"), date="20240101")] == [4]
+
+
+def test_list_columns_of_older_caches_are_converted():
+    values = pd.Series(['["a", "b"]', None, "['c']", "plain", float("nan")])
+    assert to_lists(values) == [["a", "b"], None, ["c"], ["plain"], None]
+    assert to_lists(pd.Series(['["a"]', '[]', None])) == [["a"], [], None]
+
+
+def test_main_exports_and_imports(tmp_path, monkeypatch, capsys):
+    cache_manager = cached(tmp_path, "news_cache.csv")
+    export_file = str(tmp_path / "news.arrow")
+    copy_file = str(tmp_path / "copy.db")
+    for argv in (['--export', export_file, '--source', 'http://b.com', '--cache', cache_manager.cache_file],
+                 ['--import', export_file, '--cache', copy_file],
+                 ['--export', str(tmp_path / "news.json"), '--cache', cache_manager.cache_file]):
+        monkeypatch.setattr('sys.argv', ['main.py'] + argv)
+        main()
+    output = capsys.readouterr().out.splitlines()
+    assert output[0] == f"Exported 6 news item(s) to {export_file}."
+    assert output[1] == f"Imported 6 new news item(s) from {export_file}."
+    assert output[2].startswith("Error exporting the cache: Unknown columnar format")
+    assert len(list(CacheManager(cache_file=copy_file).storage.iter_items())) == 6
@@ -0,0 +1,208 @@
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import pytest
+from src.cache_manager import CacheManager
+from src.daemon import FeedDaemon, PollScheduler
+from src.http_cache import ValidatorStore
+from src.rss_reader import parse_channel_hints
+
+FEED_XML = """<rss><channel><title>Local</title>{hints}
+<item><title>Local News</title><link>http://local.example.com/1</link>
+<pubDate>Wed, 02 Oct 2002 15:00:00 +0200</pubDate></item></channel></rss>"""
+
+
+class FakeClock:
+    """
+    A manually advanced clock for the scheduler.
+    """
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def feed_server():
+    """
+    Serves FEED_XML, without polling hints, from a local HTTP server that honours If-None-Match and counts
+    the responses it sends.
+    """
+    responses = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/broken":
+                responses.append(500)
+                self.send_response(500)
+                self.end_headers()
+                return
+            if self.headers.get("If-None-Match") == '"v1"':
+                responses.append(304)
+                self.send_response(304)
+                self.end_headers()
+                return
+            responses.append(200)
+            body = FEED_XML.format(hints="").encode()
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", responses
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_channel_hints():
+    """
+    Checks that <ttl> and <skipHours> are read from the channel header.
+    """
+    hints = "<ttl>30</ttl><skipHours><hour>3</hour><hour>4</hour></skipHours>"
+    assert parse_channel_hints(FEED_XML.format(hints=hints)) == {"ttl": 30, "skip_hours": {3, 4}}
+    assert parse_channel_hints("<rss><channel><item><ttl>5</ttl></item></channel></rss>") == {"skip_hours": set()}
+
+
+def test_scheduler_adapts_interval():
+    """
+    Verifies that the interval follows the recent change rate, shrinking for changing feeds and growing for
+    unchanged ones, and respects the ttl.
+    """
+    clock = FakeClock(datetime(2024, 1, 1, 12, tzinfo=timezone.utc).timestamp())
+    scheduler = PollScheduler(["http://a"], interval=600, min_interval=60, max_interval=3600, jitter=0, clock=clock)
+    assert scheduler.pop_due() == ["http://a"]
+
+    assert scheduler.record_success("http://a", changed=True) == clock.now + 300
+    clock.now += 300
+    assert scheduler.pop_due() == ["http://a"]
+    # Changed on 0.8 of 1.8 weighted polls: a rate of 4/9, slightly below the target of one half.
+    assert scheduler.record_success("http://a", changed=False) == pytest.approx(clock.now + 337.5)
+    assert scheduler.pop_due() == []
+    clock.now += 337.5
+    assert scheduler.pop_due() == ["http://a"]
+    assert scheduler.record_success("http://a", changed=True, ttl=10) == clock.now + 600
+    assert scheduler.feeds["http://a"].change_rate == pytest.approx(1.64 / 2.44)
+
+
+def test_scheduler_settles_on_the_change_rate():
+    """
+    Checks that a feed updated every 400 seconds settles on an interval near that period instead of being
+    pinned at the minimum, while a feed that never changes backs off to the maximum.
+    """
+    clock = FakeClock(0.0)
+    scheduler = PollScheduler(["http://a", "http://b"], interval=600, min_interval=60, max_interval=3600, jitter=0,
+                              clock=clock)
+    scheduler.pop_due()
+    last_poll = 0.0
+    while clock.now < 24 * 3600:
+        changed = clock.now // 400 > last_poll // 400
+        last_poll = clock.now
+        clock.now = scheduler.record_success("http://a", changed=changed)
+        scheduler.record_success("http://b", changed=False)
+    assert 150 < scheduler.feeds["http://a"].interval < 600
+    assert scheduler.feeds["http://b"].interval == 3600 and scheduler.feeds["http://b"].change_rate == 0
+
+
+def test_scheduler_backoff_skip_hours_and_jitter():
+    """
+    Checks exponential backoff for failing feeds, postponing out of skip hours and bounded jitter.
+    """
+    clock = FakeClock(datetime(2024, 1, 1, 2, 59, 30, tzinfo=timezone.utc).timestamp())
+    scheduler = PollScheduler(["http://a"], interval=60, min_interval=60, max_interval=1000, jitter=0, clock=clock)
+    scheduler.pop_due()
+    assert [scheduler.record_failure("http://a") - clock.now for _ in range(5)] == [120, 240, 480, 960, 1000]
+
+    next_poll = scheduler.record_success("http://a", changed=False, skip_hours={3})
+    assert next_poll == datetime(2024, 1, 1, 4, tzinfo=timezone.utc).timestamp()
+
+    jittered = PollScheduler(["http://b"], interval=100, min_interval=10, jitter=0.1, clock=clock, rng=lambda: 1.0)
+    jittered.pop_due()
+    assert jittered.record_success("http://b", changed=False) == pytest.approx(clock.now + 150 * 1.1)
+
+
+def test_daemon_polls_local_server_and_flushes_on_stop(feed_server, tmp_path):
+    """
+    Runs the daemon against a local HTTP stand-in and checks conditional re-polls, backoff and the final flush.
+    """
+    base_url, responses = feed_server
+    cache_manager = CacheManager(cache_file=str(tmp_path / "cache.csv"))
+    scheduler = PollScheduler([f"{base_url}/feed", f"{base_url}/broken"], interval=0.05, min_interval=0.05,
+                              max_interval=0.2, jitter=0)
+    daemon = FeedDaemon(scheduler=scheduler, cache_manager=cache_manager,
+                        validators=ValidatorStore(str(tmp_path / "validators.json")), flush_interval=60)
+
+    runner = threading.Thread(target=daemon.run, kwargs={"handle_signals": False})
+    runner.start()
+    deadline = time.monotonic() + 5
+    while responses.count(304) < 2 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert not (tmp_path / "cache.csv").exists()
+    daemon.stop()
+    runner.join(timeout=5)
+
+    assert not runner.is_alive()
+    assert responses.count(200) == 1 and responses.count(304) >= 2
+    assert scheduler.feeds[f"{base_url}/broken"].failures >= 1
+    assert pd.read_csv(tmp_path / "cache.csv")["title"].tolist() == ["Local News"]
+
+
+
+def test_failed_flush_keeps_items_and_validators_unsaved(feed_server, tmp_path):
+    """
+    Checks that items whose write failed stay buffered and that their feed's validators are only saved once cached.
+    """
+    base_url, responses = feed_server
+    cache_manager = CacheManager(cache_file=str(tmp_path / "cache.csv"))
+    validators_file = str(tmp_path / "validators.json")
+    scheduler = PollScheduler([f"{base_url}/feed"], interval=60, jitter=0)
+    daemon = FeedDaemon(scheduler=scheduler, cache_manager=cache_manager, validators=ValidatorStore(validators_file))
+    daemon.poll_due()
+
+    cache_feeds = cache_manager.cache_feeds
+    cache_manager.cache_feeds = lambda feeds, verbose: None
+    daemon.flush()
+    assert len(daemon._pending) == 1
+    assert ValidatorStore(validators_file).conditional_headers(f"{base_url}/feed") == {}
+
+    cache_manager.cache_feeds = cache_feeds
+    daemon.flush()
+    assert not daemon._pending
+    assert ValidatorStore(validators_file).conditional_headers(f"{base_url}/feed") != {}
+    assert pd.read_csv(tmp_path / "cache.csv")["title"].tolist() == ["Local News"]
+
+
+def test_poll_errors_reschedule_every_due_feed(tmp_path, monkeypatch):
+    """
+    Checks that a feed whose parse raises, and the feeds left over when fetching stops, are rescheduled as failed.
+    """
+    def fetch_feeds(urls, **_):
+        yield "http://a", "<rss>broken"
+        yield "http://b", FEED_XML.format(hints="")
+        raise RuntimeError("pool shut down")
+
+    def parse_feed(url, xml, limit):
+        if url == "http://a":
+            raise ValueError("bad feed")
+        return [{"title": "Local News", "link": "http://local.example.com/1"}]
+
+    monkeypatch.setattr("src.daemon.fetch_feeds", fetch_feeds)
+    monkeypatch.setattr("src.daemon.parse_feed", parse_feed)
+    clock = FakeClock(datetime(2024, 1, 1, 12, tzinfo=timezone.utc).timestamp())
+    scheduler = PollScheduler(["http://a", "http://b", "http://c"], interval=60, jitter=0, clock=clock)
+    daemon = FeedDaemon(scheduler=scheduler, cache_manager=CacheManager(cache_file=str(tmp_path / "cache.csv")),
+                        validators=ValidatorStore(str(tmp_path / "validators.json")))
+
+    assert daemon.poll_due() == 3
+    assert [url for url, _ in daemon._pending] == ["http://b"]
+    assert [scheduler.feeds[url].failures for url in ("http://a", "http://b", "http://c")] == [1, 0, 1]
+    clock.now += 3600
+    assert sorted(scheduler.pop_due()) == ["http://a", "http://b", "http://c"]
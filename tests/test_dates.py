@@ -0,0 +1,73 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from src.dates import (parse_pub_date, parse_range_bound, parse_range_end, timestamp_to_readable, to_readable_date,
+                       to_simple_date, to_timestamp)
+
+
+@pytest.mark.parametrize("date_str, expected", [
+    ("Wed, 02 Oct 2002 15:00:00 +0200", datetime(2002, 10, 2, 15, tzinfo=timezone(timedelta(hours=2)))),
+    ("Wed, 02 Oct 2002 15:00:00 -0530", datetime(2002, 10, 2, 15, tzinfo=timezone(-timedelta(hours=5, minutes=30)))),
+    ("Wed, 02 Oct 2002 15:00:00 GMT", datetime(2002, 10, 2, 15, tzinfo=timezone.utc)),
+    ("Wed, 02 Oct 2002 15:00:00 EST", datetime(2002, 10, 2, 15, tzinfo=timezone(timedelta(hours=-5)))),
+    ("Wed, 2 Oct 2002 15:00 +0200", datetime(2002, 10, 2, 15, tzinfo=timezone(timedelta(hours=2)))),
+    ("02 Oct 02 15:00:00 PDT", datetime(2002, 10, 2, 15, tzinfo=timezone(timedelta(hours=-7)))),
+    ("Wednesday, 02 October 2002 15:00:00 +02:00", datetime(2002, 10, 2, 15, tzinfo=timezone(timedelta(hours=2)))),
+    ("  Wed, 02 Oct 2002 15:00:00 +0200\n", datetime(2002, 10, 2, 15, tzinfo=timezone(timedelta(hours=2)))),
+    ("2002-10-02T15:00:00Z", datetime(2002, 10, 2, 15, tzinfo=timezone.utc)),
+    ("2002-10-02T15:00:00.250+02:00", datetime(2002, 10, 2, 15, 0, 0, 250000, tzinfo=timezone(timedelta(hours=2)))),
+])
+def test_parse_pub_date_variants(date_str, expected):
+    """
+    Checks the fast path and the fallbacks for RFC-822 variants and ISO-8601 Atom dates.
+    """
+    parsed = parse_pub_date(date_str)
+    assert parsed == expected
+    assert parsed.utcoffset() == expected.utcoffset()
+
+
+@pytest.mark.parametrize("date_str", ["", "not a date", "Wed, 32 Oct 2002 15:00:00 +0200", "Wed, 02 Foo 2002"])
+def test_parse_pub_date_invalid(date_str):
+    """
+    Ensures unparseable dates return None (and '' as a simple date) instead of raising.
+    """
+    assert parse_pub_date(date_str) is None
+    assert to_simple_date(date_str) == ""
+
+
+def test_to_simple_date_keeps_own_timezone():
+    """
+    Verifies that the YYYYMMDD date is taken in the feed's timezone, like the original strptime conversion.
+    """
+    assert to_simple_date("Mon, 29 Jun 2020 23:10:00 -0300") == "20200629"
+    assert to_simple_date("Tue, 30 Jun 2020 00:10:00 +0300") == "20200630"
+
+
+def test_to_readable_date():
+    """
+    Checks the display format and that values which are not YYYYMMDD dates are returned unchanged.
+    """
+    assert to_readable_date("20200629") == "2020-June-29"
+    assert to_readable_date("") == ""
+
+
+def test_to_timestamp_keeps_time_of_day():
+    """
+    Checks that publication times keep their time of day and offset, unlike the truncated YYYYMMDD date.
+    """
+    assert to_timestamp("Mon, 29 Jun 2020 23:10:00 -0300") == 1593483000
+    assert to_timestamp("Tue, 30 Jun 2020 05:10:00 +0300") == 1593483000
+    assert to_timestamp("not a date") is None
+    assert timestamp_to_readable(1593483000) == "2020-06-30 02:10:00 UTC"
+    assert timestamp_to_readable(float("nan")) != timestamp_to_readable(0)
+
+
+def test_parse_range_bounds():
+    """
+    Verifies that --from/--to accept whole days (the end bound covering the full day) and ISO times in UTC.
+    """
+    assert parse_range_bound("20200630") == 1593475200
+    assert parse_range_end("20200630") == 1593475200 + 24 * 60 * 60 - 1
+    assert parse_range_bound("2020-06-30T02:10") == 1593483000
+    assert parse_range_end("2020-06-30T05:10:00+03:00") == 1593483000
+    with pytest.raises(ValueError):
+        parse_range_bound("June 30")
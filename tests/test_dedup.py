@@ -0,0 +1,84 @@
+import pytest
+from src.cache_manager import CacheManager
+from src.dedup import DuplicateIndex, check_bytes, estimate_similarity, minhash, shingles
+from src.main import main
+from src.retention import RetentionPolicy
+
+STORY = ("A powerful storm hit the northern coast on Monday, leaving thousands of homes without power and "
+         "closing roads across the region, officials said.")
+TOPICS = ("election", "market", "football", "science", "budget", "health", "court", "energy")
+
+
+def news_items():
+    """
+    Returns 10 news items: the storm story from three sources with small edits, and seven unrelated stories.
+    """
+    copies = [{"title": "Storm hits the coast", "description": STORY},
+              {"title": "Storm hits the coast - Wire", "description": f"<p>{STORY}</p> Read more."},
+              {"title": "STORM HITS THE COAST", "description": STORY.replace("thousands of", "many")}]
+    others = [{"title": f"{topic.title()} news", "description": f"The latest {topic} report says {topic} figures "
+                                                                f"for {number} quarters changed {topic} forecasts."}
+              for number, topic in enumerate(TOPICS[:7])]
+    items = copies[:1] + others[:3] + copies[1:2] + others[3:] + copies[2:]
+    return [{**item, "pubDate": "20240101", "link": f"http://example.com/{number}"}
+            for number, item in enumerate(items)]
+
+
+def similarity(first, second):
+    return estimate_similarity(check_bytes(minhash(shingles(first))), check_bytes(minhash(shingles(second))))
+
+
+def test_similarity_estimates():
+    items = news_items()
+    assert similarity(items[0], items[0]) == 1.0
+    assert similarity(items[0], items[4]) > 0.7
+    assert similarity(items[0], items[9]) > 0.6
+    assert similarity(items[0], items[1]) < 0.1
+    assert minhash(shingles({"title": "The", "description": None})) is None
+
+
+def test_duplicate_index_clusters_copies_under_the_first(tmp_path):
+    index = DuplicateIndex(str(tmp_path / "news.dedup.db"))
+    items = news_items()
+    assert index.add_items(items[:6]) == 1
+    assert index.add_items(items) == 1
+
+    clusters = index.clusters(item["link"] for item in items)
+    assert len(set(clusters.values())) == 8
+    assert index.cluster_links("http://example.com/9") == [f"http://example.com/{number}" for number in (0, 4, 9)]
+    assert index.cluster_links("http://example.com/2") == ["http://example.com/2"]
+
+    assert index.remove_links(["http://example.com/0", "http://nowhere"]) == 1
+    assert index.cluster_links("http://example.com/4") == ["http://example.com/4", "http://example.com/9"]
+    index.add_items([{**items[0], "link": "http://example.com/10"}])
+    assert index.clusters(["http://example.com/10"]) == {"http://example.com/10": clusters["http://example.com/4"]}
+
+
+@pytest.mark.parametrize("cache_name", ["news_cache.csv", "news_cache.db"])
+def test_collapse_duplicates(tmp_path, cache_name):
+    cache_manager = CacheManager(cache_file=str(tmp_path / cache_name))
+    items = news_items()
+    cache_manager.cache_feeds(feeds=[("http://a.com", items[:5]), ("http://b.com", items[5:])], verbose=False)
+
+    collapsed = list(cache_manager.collapse_duplicates(cache_manager.retrieve_news_from_cache(date="2024")))
+    assert [item["link"] for item in collapsed] == [f"http://example.com/{number}"
+                                                    for number in (0, 1, 2, 3, 5, 6, 7, 8)]
+    assert len(list(cache_manager.collapse_duplicates(cache_manager.search_news("storm report"), limit=2))) == 2
+
+    cache_manager.compact(policy=RetentionPolicy(max_rows_per_source=4))
+    assert cache_manager.duplicate_index.cluster_links("http://example.com/9") == ["http://example.com/4",
+                                                                                   "http://example.com/9"]
+
+
+def test_collapse_builds_a_missing_index(tmp_path, monkeypatch, capsys):
+    cache_manager = CacheManager(cache_file=str(tmp_path / "news_cache.csv"))
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items())], verbose=False)
+    for file in tmp_path.glob("news_cache.dedup.db*"):
+        file.unlink()
+
+    monkeypatch.setattr('sys.argv', ['main.py', '--date', '20240101', '--collapse-duplicates', '--limit', '5',
+                                     '--cache', cache_manager.cache_file])
+    main()
+    output = capsys.readouterr().out
+    assert output.count("Title: ") == 5 and "Wire" not in output
+    assert cache_manager.duplicate_index.exists()
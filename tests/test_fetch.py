@@ -0,0 +1,137 @@
+from src.fetch import fetch_rss_xml, fetch_feeds, stream_rss_items
+from src.http_cache import ValidatorStore
+from requests.exceptions import HTTPError
+from unittest.mock import ANY, patch
+import threading
+import time
+
+
+def test_fetch_feeds_respects_limits():
+    """
+    Test that `fetch_feeds` fetches every feed once while honouring the global and per-host concurrency caps.
+    """
+    lock = threading.Lock()
+    active = {"total": 0, "max_total": 0, "slow.example.com": 0, "max_host": 0}
+
+    def fake_fetch(url, validators=None):
+        host = url.split("/")[2]
+        with lock:
+            active["total"] += 1
+            active["max_total"] = max(active["max_total"], active["total"])
+            if host == "slow.example.com":
+                active[host] += 1
+                active["max_host"] = max(active["max_host"], active[host])
+        time.sleep(0.02)
+        with lock:
+            active["total"] -= 1
+            if host == "slow.example.com":
+                active[host] -= 1
+        return url
+
+    urls = [f"http://slow.example.com/{i}" for i in range(6)] + [f"http://host{i}.example.com/" for i in range(6)]
+    with patch('src.fetch.fetch_rss_xml', side_effect=fake_fetch):
+        results = dict(fetch_feeds(urls + urls[:2], max_workers=4, per_host_limit=2))
+
+    assert results == {url: url for url in urls}
+    assert active["max_total"] <= 4
+    assert active["max_host"] <= 2
+
+
+@patch('src.fetch.get_session')
+def test_fetch_rss_xml_success(mock_session):
+    """
+    Test successful RSS XML fetch operation from a URL.
+    """
+    mock_get = mock_session.return_value.get
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.text = "<rss>some content</rss>"
+    url = "http://example.com/rss"
+    result = fetch_rss_xml(url)
+    assert result == "<rss>some content</rss>"
+    mock_get.assert_called_with(url, headers={}, timeout=ANY)
+
+
+@patch('src.fetch.get_session')
+def test_fetch_rss_xml_http_error(mock_session):
+    """
+    Test handling of HTTP errors during RSS XML fetch operation.
+    """
+    mock_session.return_value.get.side_effect = HTTPError
+    url = "http://example.com/rss"
+    result = fetch_rss_xml(url)
+    assert result == ""
+
+
+@patch('src.fetch.get_session')
+def test_fetch_rss_xml_conditional(mock_session, tmp_path):
+    """
+    Test that stored validators are sent back and that 304 responses and identical bodies are reported as unchanged.
+    """
+    mock_get = mock_session.return_value.get
+    validators = ValidatorStore(store_file=str(tmp_path / "validators.json"))
+    url = "http://example.com/rss"
+
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.content = b"<rss>v1</rss>"
+    mock_get.return_value.text = "<rss>v1</rss>"
+    mock_get.return_value.headers = {"ETag": '"v1"', "Last-Modified": "Wed, 02 Oct 2002 15:00:00 GMT"}
+    assert fetch_rss_xml(url, validators=validators) == "<rss>v1</rss>"
+    validators.save()
+    assert ValidatorStore(store_file=str(tmp_path / "validators.json")).conditional_headers(url) == {}
+    validators.commit([url])
+    validators.save()
+
+    reloaded = ValidatorStore(store_file=str(tmp_path / "validators.json"))
+    assert reloaded.conditional_headers(url) == {"If-None-Match": '"v1"',
+                                                 "If-Modified-Since": "Wed, 02 Oct 2002 15:00:00 GMT"}
+
+    assert fetch_rss_xml(url, validators=reloaded) is None
+    mock_get.assert_called_with(url, headers=reloaded.conditional_headers(url), timeout=ANY)
+
+    mock_get.return_value.status_code = 304
+    assert fetch_rss_xml(url, validators=reloaded) is None
+
+
+@patch('src.fetch.get_session')
+def test_stream_rss_items_closes_after_limit(mock_session, tmp_path):
+    """
+    Test that streaming stops reading the response once `limit` items are parsed and records no validators.
+    """
+    item = b"<item><title>Streamed</title><link>http://example.com/1</link></item>"
+    read_chunks = []
+
+    def iter_content(chunk_size):
+        yield b"<rss><channel>"
+        for index in range(50):
+            read_chunks.append(index)
+            yield item
+        yield b"</channel></rss>"
+
+    response = mock_session.return_value.get.return_value.__enter__.return_value
+    response.status_code = 200
+    response.headers = {"ETag": '"v1"'}
+    response.iter_content.side_effect = iter_content
+    validators = ValidatorStore(store_file=str(tmp_path / "validators.json"))
+
+    items = stream_rss_items("http://example.com/rss", limit=3, validators=validators)
+
+    assert [news_item["title"] for news_item in items] == ["Streamed"] * 3
+    assert len(read_chunks) == 3
+    mock_session.return_value.get.return_value.__exit__.assert_called_once()
+    assert stream_rss_items("http://example.com/rss", limit=3, validators=validators) is not None
+    validators.commit(["http://example.com/rss"])
+    assert validators.conditional_headers("http://example.com/rss") == {}
+
+
+def test_fetch_feeds_reports_failing_fetches(capsys):
+    """
+    Test that a fetch raising an unexpected error yields the failed marker while the other feeds complete.
+    """
+    def fake_fetch(url, validators=None):
+        if url.endswith("/bad"):
+            raise ValueError("unexpected")
+        return url
+
+    urls = ["http://a.example.com/bad", "http://a.example.com/ok", "http://b.example.com/ok"]
+    assert dict(fetch_feeds(urls, fetch=fake_fetch)) == {urls[0]: "", urls[1]: urls[1], urls[2]: urls[2]}
+    assert "Error fetching RSS feed: unexpected" in capsys.readouterr().out
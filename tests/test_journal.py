@@ -0,0 +1,98 @@
+import json
+import multiprocessing
+import pandas as pd
+import pytest
+from pathlib import Path
+from src.cache_manager import CacheManager
+from src.journal import FileLock, WriteAheadLog
+
+WRITERS = 4
+BATCHES = 10
+BATCH_SIZE = 20
+
+
+def news_items(writer: int, batch: int):
+    return [{"title": f"News {writer}-{batch}-{number}", "pubDate": "20240101",
+             "link": f"http://example.com/{writer}/{batch}/{number}", "description": "Text, with \"quotes\"\nand lines"}
+            for number in range(BATCH_SIZE)]
+
+
+def write_batches(cache_file: str, writer: int) -> None:
+    """Caches BATCHES batches from one process, each batch sharing half its links with the previous one."""
+    cache_manager = CacheManager(cache_file=cache_file)
+    for batch in range(BATCHES):
+        items = news_items(writer, batch) + news_items(writer, max(batch - 1, 0))[:BATCH_SIZE // 2]
+        cache_manager.cache_feeds(feeds=[(f"http://feed{writer}.com", items)], verbose=False)
+
+
+@pytest.mark.parametrize("cache_name", ["news_cache.csv", "news_cache.db", "news_cache"])
+def test_parallel_writers_lose_nothing(tmp_path, cache_name):
+    cache_file = str(tmp_path / cache_name)
+    processes = [multiprocessing.Process(target=write_batches, args=(cache_file, writer)) for writer in range(WRITERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0] * WRITERS
+
+    cache_manager = CacheManager(cache_file=cache_file)
+    cache_manager.merge_journal(blocking=True)
+    links = [item["link"] for item in cache_manager.storage.iter_items()]
+    assert len(links) == len(set(links)) == WRITERS * BATCHES * BATCH_SIZE
+    assert not cache_manager.journal.pending()
+    assert len(cache_manager.search_news("news", limit=None)) == len(links)
+
+
+def test_file_lock_excludes_other_holders(tmp_path):
+    lock_file = str(tmp_path / "cache.lock")
+    with FileLock(lock_file):
+        assert not FileLock(lock_file).acquire(blocking=False)
+    other = FileLock(lock_file)
+    assert other.acquire(blocking=False)
+    other.release()
+
+
+def test_items_logged_while_merge_lock_is_held(tmp_path):
+    cache_manager = CacheManager(cache_file=str(tmp_path / "news_cache.csv"))
+    with FileLock(cache_manager.storage.sidecar_path("lock")):
+        cache_manager.cache_feeds(feeds=[("http://a.com", news_items(0, 0))], verbose=False)
+        assert cache_manager.journal.pending()
+        assert not cache_manager.storage.exists()
+
+    assert cache_manager.merge_journal() == BATCH_SIZE
+    assert len(list(cache_manager.storage.iter_items())) == BATCH_SIZE
+
+
+def test_interrupted_merge_is_redone(tmp_path):
+    cache_manager = CacheManager(cache_file=str(tmp_path / "news_cache.csv"))
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items(0, 0))], verbose=False)
+
+    # A merger crashed halfway through appending the next batch: its state file, batch and a torn row remain.
+    batch = [{**item, "source_url": "http://a.com"} for item in news_items(0, 1)]
+    Path(cache_manager.journal.batch_file).write_text("".join(json.dumps(item) + "\n" for item in batch))
+    Path(cache_manager.storage.sidecar_path("wal.state")).write_text(
+        json.dumps(cache_manager.storage.append_state()))
+    with open(cache_manager.cache_file, "a", encoding="utf-8") as cache:
+        cache.write('News 0-1-0,,20240101,http://example.com/0/1/0,,"Text, with')
+    with open(cache_manager.storage.index_file, "a", encoding="utf-8") as index:
+        index.write("http://example.com/0/1/0\n")
+
+    CacheManager(cache_file=cache_manager.cache_file).cache_feeds(
+        feeds=[("http://a.com", news_items(0, 2))], verbose=False)
+
+    cache_df = pd.read_csv(cache_manager.cache_file)
+    assert len(cache_df) == cache_df["link"].nunique() == 3 * BATCH_SIZE
+    assert not Path(cache_manager.journal.batch_file).exists()
+
+
+def test_write_ahead_log_skips_torn_lines(tmp_path):
+    journal = WriteAheadLog(str(tmp_path / "news.wal"))
+    assert journal.append([{"link": "a"}, {"link": "b"}]) == 2
+    with open(journal.log_file, "a", encoding="utf-8") as log:
+        log.write('{"link": "c", "tit')
+
+    records, recovered = journal.take()
+    assert (records, recovered) == ([{"link": "a"}, {"link": "b"}], False)
+    assert journal.take()[1]
+    journal.done()
+    assert journal.take() is None
@@ -1,10 +1,23 @@
-from src.main import fetch_rss_xml, print_news, main
-from requests.exceptions import HTTPError
-from unittest.mock import patch
+from src.main import read_feed_list, print_news, main
+from src.cache_manager import CacheManager
+from src.http_cache import ValidatorStore
+from unittest.mock import ANY, MagicMock, patch
 import json
+import os
+import subprocess
+import sys
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def isolated_data_dir(tmp_path, monkeypatch):
+    """
+    Runs every test from a temporary directory so the cache and HTTP validators never touch the project data.
+    """
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path)
+
+
 @pytest.fixture()
 def mock_args(monkeypatch):
     """
@@ -15,7 +28,7 @@ def mock_args(monkeypatch):
     return _mock_args
 
 
-@patch('src.main.fetch_rss_xml')
+@patch('src.fetch.fetch_rss_xml')
 def test_main_fetch_from_source(mock_fetch, mock_args, capsys):
     """
     Test `main` function's ability to handle '--source' argument and fetch RSS XML.
@@ -25,7 +38,7 @@ def test_main_fetch_from_source(mock_fetch, mock_args, capsys):
     <pubDate>Wed, 02 Oct 2002 15:00:00 +0200</pubDate></item></channel></rss>"""
 
     main()
-    mock_fetch.assert_called_with(url='https://example.com/feed')
+    mock_fetch.assert_called_with(url='https://example.com/feed', validators=ANY)
     captured = capsys.readouterr()
 
     assert "Test Title" in captured.out
@@ -46,13 +59,30 @@ def test_main_fetch_from_cache(mock_cache_manager, mock_args, capsys):
     }]
 
     main()
-    instance.retrieve_news_from_cache.assert_called_with(date='20210101', source_url=None)
+    instance.retrieve_news_from_cache.assert_called_with(date='20210101', source_url=None, limit=None)
     captured = capsys.readouterr()
 
     assert "Cached Title" in captured.out
 
 
-@patch('src.main.fetch_rss_xml')
+@patch('src.main.CacheManager')
+def test_main_date_limit_and_ndjson(mock_cache_manager, mock_args, capsys):
+    """
+    Test that '--limit' is pushed down to the cache in '--date' mode and that '--ndjson' prints one item per line.
+    """
+    mock_args(['main.py', '--date', '20210101', '--limit', '1', '--ndjson'])
+    instance = mock_cache_manager.return_value
+    instance.retrieve_news_from_cache.return_value = iter([
+        {'title': 'Cached Title', 'link': 'http://cached.example.com', 'pubDate': '20210101'}])
+
+    main()
+    instance.retrieve_news_from_cache.assert_called_with(date='20210101', source_url=None, limit=1)
+
+    assert json.loads(capsys.readouterr().out) == {
+        'title': 'Cached Title', 'link': 'http://cached.example.com', 'pubDate': '2021-January-01'}
+
+
+@patch('src.fetch.fetch_rss_xml')
 def test_main_with_json_output(mock_fetch, mock_args, capsys):
     """
     Test `main` function's ability to output news in JSON format with '--json' argument.
@@ -64,28 +94,88 @@ def test_main_with_json_output(mock_fetch, mock_args, capsys):
     assert '2002-October-02' in capsys.readouterr().out
 
 
-@patch('src.main.requests.get')
-def test_fetch_rss_xml_success(mock_get):
+@patch('src.main.CacheManager')
+@patch('src.fetch.fetch_rss_xml')
+def test_main_fetch_multiple_sources(mock_fetch, mock_cache_manager, mock_args, tmp_path, capsys):
     """
-    Test successful RSS XML fetch operation from a URL.
+    Test that sources from repeated '--source' flags and '--feeds-file' are fetched and cached in a single write.
     """
-    mock_get.return_value.status_code = 200
-    mock_get.return_value.text = "<rss>some content</rss>"
-    url = "http://example.com/rss"
-    result = fetch_rss_xml(url)
-    assert result == "<rss>some content</rss>"
-    mock_get.assert_called_with(url)
+    feeds_file = tmp_path / "feeds.txt"
+    feeds_file.write_text("# comment\nhttps://b.example.com/feed\n\n")
+    mock_args(['main.py', '--source', 'https://a.example.com/feed', '--feeds-file', str(feeds_file)])
+    mock_fetch.side_effect = lambda url, validators=None: f"""<rss><channel><item><title>{url}</title>
+    <link>{url}/1</link><pubDate>Wed, 02 Oct 2002 15:00:00 +0200</pubDate></item></channel></rss>"""
+
+    main()
+    instance = mock_cache_manager.return_value
+    instance.cache_feeds.assert_called_once()
+    cached_sources = [source for source, _ in instance.cache_feeds.call_args.kwargs['feeds']]
+    captured = capsys.readouterr()
 
+    assert cached_sources == ['https://a.example.com/feed', 'https://b.example.com/feed']
+    assert captured.out.index('https://a.example.com/feed') < captured.out.index('https://b.example.com/feed')
 
-@patch('src.main.requests.get')
-def test_fetch_rss_xml_http_error(mock_get):
+
+def test_read_feed_list(tmp_path):
     """
-    Test handling of HTTP errors during RSS XML fetch operation.
+    Test that feed list files skip blank lines and comments.
     """
-    mock_get.side_effect = HTTPError
-    url = "http://example.com/rss"
-    result = fetch_rss_xml(url)
-    assert result == ""
+    feeds_file = tmp_path / "feeds.txt"
+    feeds_file.write_text("http://a.example.com\n  # disabled\n\n http://b.example.com \n")
+    assert read_feed_list(str(feeds_file)) == ["http://a.example.com", "http://b.example.com"]
+
+
+def test_main_saves_validators_of_cached_feeds_only(tmp_path, mock_args, capsys):
+    """
+    Test that validators are kept per cache and only saved for feeds cached in full, so a run with '--limit',
+    a new cache or a failed cache write never makes a later run skip a feed as unchanged.
+    """
+    body = "<rss><channel>{}</channel></rss>".format("".join(
+        f"<item><title>News {number}</title><link>http://example.com/{number}</link>"
+        f"<pubDate>Wed, 02 Oct 2002 15:{number:02d}:00 +0200</pubDate></item>" for number in range(20)))
+
+    def get(url, headers, timeout):
+        response = MagicMock(headers={"ETag": '"v1"'}, content=body.encode(), text=body)
+        response.status_code = 304 if headers.get("If-None-Match") == '"v1"' else 200
+        return response
+
+    def run(cache_file, *args):
+        mock_args(['main.py', '--source', 'http://example.com/rss', '--cache', str(cache_file), *args])
+        main()
+        return capsys.readouterr().out
+
+    cache_file = tmp_path / "news_cache.csv"
+    with patch('src.fetch.get_session') as mock_session:
+        mock_session.return_value.get.side_effect = get
+        run(cache_file, '-l', '3')
+        saved = ValidatorStore(store_file=str(tmp_path / "news_cache.validators.json"))
+        assert saved.conditional_headers("http://example.com/rss") == {}
+        run(cache_file)
+        assert len(list(CacheManager(cache_file=str(cache_file)).storage.iter_items())) == 20
+        assert "Skipped 1 unchanged source(s)." in run(cache_file)
+
+        other_file = tmp_path / "other.csv"
+        with patch('src.main.CacheManager.cache_feeds', return_value=None):
+            run(other_file)
+        assert not (tmp_path / "other.validators.json").exists()
+        assert "unchanged" not in run(other_file)
+        assert len(list(CacheManager(cache_file=str(other_file)).storage.iter_items())) == 20
+
+
+@patch('src.main.CacheManager')
+@patch('src.fetch.fetch_rss_xml')
+def test_main_skips_unchanged_sources(mock_fetch, mock_cache_manager, mock_args, capsys):
+    """
+    Test that unchanged sources are neither parsed nor cached and that the skipped count is reported.
+    """
+    mock_args(['main.py', '--source', 'https://example.com/feed'])
+    mock_fetch.return_value = None
+
+    with patch('src.fetch.rss_parser') as mock_parser:
+        main()
+        mock_parser.assert_not_called()
+    mock_cache_manager.return_value.cache_feeds.assert_not_called()
+    assert "Skipped 1 unchanged source(s)." in capsys.readouterr().out
 
 
 def test_print_news_json(capsys):
@@ -146,3 +236,20 @@ def test_print_news_text_verbose(capsys):
     assert "Authors: Test Author" in captured.out
     assert "Categories: Test Category" in captured.out
     assert "Source URL: http://source.com" in captured.out
+
+
+def test_date_query_does_not_import_heavy_modules(tmp_path):
+    """
+    Checks that a '--date' query on a CSV cache runs without importing pandas, requests, lxml or bs4.
+    """
+    cache_file = tmp_path / "cache.csv"
+    cache_file.write_text("title,author,pubDate,link,category,description,source_url\n"
+                          "Cached Title,,20210101,http://cached.example.com,,,http://example.com\n")
+    code = ("import sys; import src.main as m; "
+            f"sys.argv = ['main.py', '--date', '20210101', '--cache', {str(cache_file)!r}]; m.main(); "
+            "print(sorted(name for name in ('pandas', 'requests', 'lxml', 'bs4') if name in sys.modules))")
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], cwd=project_dir, capture_output=True, text=True, check=True)
+
+    assert "Cached Title" in result.stdout
+    assert result.stdout.rstrip().endswith("[]")
@@ -0,0 +1,135 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import pytest
+from src.cache_manager import CacheManager
+from src.http_cache import ValidatorStore
+from src.main import main
+from src.pipeline import IngestPipeline
+
+FEEDS = 10
+FEED_ITEMS = 20
+
+
+def feed_xml(seed: int) -> str:
+    """Returns a feed of FEED_ITEMS items whose links are unique to the seed."""
+    items = "".join(f"<item><title>News {seed}.{number}</title><link>http://example.com/{seed}/{number}</link>"
+                    f"<pubDate>Mon, 01 Jan 2024 12:{number:02d}:00 +0000</pubDate></item>"
+                    for number in range(FEED_ITEMS))
+    return f"<rss><channel><title>Feed {seed}</title>{items}</channel></rss>"
+
+
+@pytest.fixture
+def feed_server():
+    """Serves synthetic feeds at /feed/<seed>, with an ETag, and a failing /broken feed from a local HTTP server."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/broken":
+                self.send_response(500)
+                self.end_headers()
+                return
+            etag = f'"{self.path}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = feed_xml(int(self.path.split("/")[-1])).encode()
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    yield [f"{base_url}/feed/{seed}" for seed in range(FEEDS)] + [f"{base_url}/broken"]
+    server.shutdown()
+    server.server_close()
+
+
+def test_pipeline_caches_every_feed(feed_server, tmp_path):
+    cache_manager = CacheManager(cache_file=str(tmp_path / "news_cache.db"))
+    validators = ValidatorStore(str(tmp_path / "validators.json"))
+    pipeline = IngestPipeline(cache_manager=cache_manager, validators=validators, parse_workers=2, queue_size=2,
+                              batch_size=50)
+    report = pipeline.run(feed_server)
+
+    fetch, parse, write = report.stages
+    assert (fetch.processed, parse.processed, write.processed) == (FEEDS + 1, FEEDS * FEED_ITEMS, FEEDS * FEED_ITEMS)
+    assert (report.cached, report.unchanged, report.failed) == (FEEDS * FEED_ITEMS, 0, 1)
+    assert all(stage.throughput > 0 for stage in report.stages)
+    assert len(list(cache_manager.storage.iter_items())) == FEEDS * FEED_ITEMS
+
+    report = IngestPipeline(cache_manager=cache_manager, validators=ValidatorStore(validators.store_file),
+                            parse_workers=0).run(feed_server)
+    assert (report.cached, report.unchanged, report.failed) == (0, FEEDS, 1)
+
+
+def test_slow_writer_holds_back_the_other_stages(feed_server, tmp_path):
+    cache_manager = CacheManager(cache_file=str(tmp_path / "news_cache.csv"))
+    cache_feeds, written = cache_manager.cache_feeds, []
+
+    def slow_cache_feeds(feeds, verbose):
+        written.append(sum(len(items) for _, items in feeds))
+        time.sleep(0.05)
+        return cache_feeds(feeds=feeds, verbose=verbose)
+
+    cache_manager.cache_feeds = slow_cache_feeds
+    report = IngestPipeline(cache_manager=cache_manager, parse_workers=0, queue_size=1,
+                            batch_size=FEED_ITEMS).run(feed_server)
+    fetch, parse, write = report.stages
+    assert written == [FEED_ITEMS] * FEEDS and report.cached == FEEDS * FEED_ITEMS
+    assert parse.blocked_seconds > 0.1 and fetch.blocked_seconds > 0
+    assert write.waiting_seconds < write.seconds
+
+
+def test_failed_cache_write_counts_its_feeds_as_failed(feed_server, tmp_path):
+    cache_manager = CacheManager(cache_file=str(tmp_path / "news_cache.csv"))
+    cache_feeds, batches = cache_manager.cache_feeds, []
+
+    def failing_first_batch(feeds, verbose):
+        batches.append(feeds)
+        return None if len(batches) == 1 else cache_feeds(feeds=feeds, verbose=verbose)
+
+    cache_manager.cache_feeds = failing_first_batch
+    validators = ValidatorStore(str(tmp_path / "validators.json"))
+    report = IngestPipeline(cache_manager=cache_manager, validators=validators, parse_workers=0,
+                            batch_size=FEED_ITEMS * 2).run(feed_server)
+    assert (report.cached, report.failed) == ((FEEDS - 2) * FEED_ITEMS, 3)
+    assert report.stages[2].processed == (FEEDS - 2) * FEED_ITEMS
+    assert "Ingested" in str(report) and "3 failed feed(s)" in str(report)
+
+    lost = [url for url, _ in batches[0]]
+    saved = ValidatorStore(validators.store_file)
+    assert all(saved.conditional_headers(url) == {} for url in lost)
+    report = IngestPipeline(cache_manager=CacheManager(cache_file=cache_manager.cache_file),
+                            validators=saved, parse_workers=0).run(feed_server)
+    assert (report.cached, report.unchanged, report.failed) == (2 * FEED_ITEMS, FEEDS - 2, 1)
+
+
+def test_failing_stage_stops_the_pipeline(feed_server, tmp_path):
+    cache_manager = CacheManager(cache_file=str(tmp_path / "news_cache.csv"))
+
+    def failing_cache_feeds(feeds, verbose):
+        raise RuntimeError("disk full")
+
+    cache_manager.cache_feeds = failing_cache_feeds
+    pipeline = IngestPipeline(cache_manager=cache_manager, parse_workers=0, queue_size=1, batch_size=1)
+    with pytest.raises(RuntimeError, match="disk full"):
+        pipeline.run(feed_server)
+
+
+def test_main_pipeline_reports_stage_throughput(feed_server, tmp_path, monkeypatch, capsys):
+    cache_file = str(tmp_path / "news_cache.csv")
+    monkeypatch.setattr('sys.argv', ['main.py', '--pipeline', '--parse-workers', '2', '--batch-size', '100',
+                                     '--cache', cache_file] + [arg for url in feed_server for arg in ('-s', url)])
+    main()
+    output = capsys.readouterr().out
+    assert f"Ingested {FEEDS + 1} feed(s)" in output and f"{FEEDS * FEED_ITEMS} new item(s) cached" in output
+    assert all(f"  {stage}: " in output for stage in ("fetch", "parse", "write"))
+    assert len(pd.read_csv(cache_file)) == FEEDS * FEED_ITEMS
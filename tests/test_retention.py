@@ -0,0 +1,92 @@
+import pytest
+from src.cache_manager import CacheManager
+from src.main import main
+from src.retention import RetentionPolicy, format_size, parse_duration, parse_size
+
+DAY = 24 * 60 * 60
+NOW = 1717200000  # 2024-06-01 00:00 UTC
+
+
+@pytest.fixture
+def news_items():
+    """
+    Returns 20 news items from two sources, one per day, the newest published a day before NOW.
+    """
+    return [{"title": f"News {number}", "pubDate": "2024", "link": f"http://example.com/{number}",
+             "description": "Words " * 50, "published": NOW - (20 - number) * DAY,
+             "category": ["Even" if number % 2 == 0 else "Odd"]} for number in range(20)]
+
+
+def cache(cache_manager, news_items):
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items[::2]), ("http://b.com", news_items[1::2])],
+                              verbose=False)
+    return cache_manager
+
+
+def test_parse_duration_and_size():
+    assert parse_duration("90") == 90
+    assert parse_duration("12h") == 12 * 60 * 60
+    assert parse_duration("30D") == 30 * DAY
+    assert parse_size("640k") == 640 * 1024
+    assert parse_size("1.5 GB") == 1536 * 1024 ** 2
+    assert format_size(1536) == "1.5 KB"
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+    with pytest.raises(ValueError):
+        parse_size("-1MB")
+
+
+def test_expired_links(news_items):
+    assert not RetentionPolicy()
+    assert RetentionPolicy(max_age=5 * DAY).expired_links(news_items, now=NOW) == {
+        f"http://example.com/{number}" for number in range(15)}
+
+    for item in news_items:
+        item["source_url"] = "http://a.com" if item["published"] % (2 * DAY) else "http://b.com"
+    expired = RetentionPolicy(max_rows_per_source=3).expired_links(news_items, now=NOW)
+    assert {f"http://example.com/{number}" for number in range(14, 20)}.isdisjoint(expired)
+    assert len(expired) == 14
+
+    expired = RetentionPolicy(max_bytes=1000).expired_links(news_items, size_on_disk=4000, now=NOW)
+    assert expired == {f"http://example.com/{number}" for number in range(16)}
+
+
+@pytest.mark.parametrize("cache_name", ["news_cache.csv", "news_cache.db", "news_cache"])
+def test_compact_with_retention(tmp_path, news_items, cache_name, monkeypatch):
+    monkeypatch.setattr("time.time", lambda: NOW)
+    cache_manager = cache(CacheManager(cache_file=str(tmp_path / cache_name)), news_items)
+    size_before = cache_manager.size_on_disk()
+
+    report = cache_manager.compact(policy=RetentionPolicy(max_age=10 * DAY, max_rows_per_source=4))
+    assert (report.expired, report.duplicates) == (12, 0)
+    assert report.bytes_before == size_before > report.bytes_after == cache_manager.size_on_disk()
+    assert "12 expired item(s) removed" in str(report)
+
+    kept = sorted(int(item["link"].rsplit("/", 1)[1]) for item in cache_manager.storage.iter_items())
+    assert kept == list(range(12, 20))
+    assert len(cache_manager.news_in_range()) == 8
+    assert cache_manager.top_categories() == [("Even", 4), ("Odd", 4)]
+    assert [item["title"] for item in cache_manager.search_news("words", limit=1)]
+
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items[:2])], verbose=False)
+    assert len(list(cache_manager.storage.iter_items())) == 10
+
+
+def test_compaction_does_not_block_readers(tmp_path, news_items):
+    cache_manager = cache(CacheManager(cache_file=str(tmp_path / "news_cache.csv")), news_items)
+    reader = cache_manager.storage.iter_items()
+    first = next(reader)
+
+    cache_manager.compact_in_background(policy=RetentionPolicy(max_rows_per_source=1)).join()
+    assert not cache_manager.compacting
+
+    assert len([first, *reader]) == 20
+    assert len(list(cache_manager.storage.iter_items())) == 2
+
+
+def test_main_compact(tmp_path, news_items, monkeypatch, capsys):
+    cache_manager = cache(CacheManager(cache_file=str(tmp_path / "news_cache.csv")), news_items)
+    monkeypatch.setattr('sys.argv', ['main.py', '--compact', '--max-per-source', '5', '--cache',
+                                     cache_manager.cache_file])
+    main()
+    assert "0 duplicate row(s) and 10 expired item(s) removed" in capsys.readouterr().out
@@ -1,5 +1,6 @@
 from bs4 import BeautifulSoup
-from src.rss_reader import parse_item, rss_parser
+from lxml import etree
+from src.rss_reader import iter_rss_items, parse_element, parse_item, rss_parser
 from src.utils import complex_to_simple_date
 
 
@@ -39,7 +40,8 @@ def test_parse_item():
     assert parsed_item['author'] == ['Sample Author']
     assert parsed_item['category'] == ['Sample Category']
     assert parsed_item['pubDate'] == complex_to_simple_date('Wed, 02 Oct 2002 15:00:00 +0200')
-    assert len(parsed_item) == 6
+    assert parsed_item['published'] == 1033563600
+    assert len(parsed_item) == 7
 
 
 def test_rss_parser():
@@ -52,3 +54,71 @@ def test_rss_parser():
     sample_feed_xml = f"""<rss><channel>{sample_item_xml * 3}</channel></rss>"""
     parsed_feed = rss_parser(sample_feed_xml, limit=2)
     assert len(parsed_feed) == 2
+
+
+def test_parse_element_matches_parse_item():
+    """
+    Ensures the lxml item extraction produces the same dictionary as the BeautifulSoup one.
+    """
+    assert parse_element(etree.fromstring(sample_item_xml)) == parse_item(create_tag_from_string(sample_item_xml))
+
+
+def test_iter_rss_items_streams_chunks():
+    """
+    Verifies that items are parsed from arbitrary chunk boundaries and match the non-streaming parser.
+    """
+    feed = f"""<rss><channel><title>Feed</title>{sample_item_xml * 5}</channel></rss>""".encode()
+    chunks = [feed[start:start + 7] for start in range(0, len(feed), 7)]
+
+    assert list(iter_rss_items(chunks)) == rss_parser(feed.decode())
+
+
+def test_iter_rss_items_stops_at_limit():
+    """
+    Checks that parsing stops reading chunks as soon as the limit is reached.
+    """
+    consumed = []
+
+    def chunks():
+        yield b"<rss><channel>"
+        for index in range(100):
+            consumed.append(index)
+            yield sample_item_xml.encode()
+        yield b"</channel></rss>"
+
+    items = iter_rss_items(chunks(), limit=2)
+    assert next(items)["title"] == "Sample Title"
+    assert len(list(items)) == 1
+    assert len(consumed) == 2
+
+
+def test_rss_parser_matches_beautifulsoup_parser():
+    """
+    Equivalence test: the lxml extraction engine gives the same items as `parse_item` over BeautifulSoup,
+    including repeated, empty, namespaced, nested, CDATA and commented elements.
+    """
+    feed_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
+    <rss xmlns:media="http://search.yahoo.com/mrss/" xmlns:atom="http://www.w3.org/2005/Atom"><channel>
+    <title>Feed Title</title>
+    {sample_item_xml}
+    <item>
+        <title></title>
+        <title>Second Title Ignored</title>
+        <link>http://example.com/2</link>
+        <category>First</category><category/><category>Third</category>
+        <description><![CDATA[<p>Rich &amp; <b>bold</b></p>]]></description>
+        <atom:author>Namespaced Author</atom:author>
+    </item>
+    <item>
+        <media:content><media:title>Nested Media Title</media:title></media:content>
+        <title>Plain <!-- comment -->Title &amp; more</title>
+        <author></author><author>Skipped Because First Is Empty</author>
+        <pubDate>Mon, 29 Jun 2020 22:10:00 +0300</pubDate>
+    </item>
+    </channel></rss>"""
+
+    soup_items = [parse_item(item) for item in BeautifulSoup(feed_xml, 'lxml-xml').find_all('item')]
+
+    assert rss_parser(feed_xml) == soup_items
+    assert [list(item) for item in rss_parser(feed_xml)] == [list(item) for item in soup_items]
+    assert rss_parser(feed_xml, limit=2) == soup_items[:2]
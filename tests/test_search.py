@@ -0,0 +1,168 @@
+import json
+import pytest
+import sqlite3
+from contextlib import closing
+from src.cache_manager import CacheManager
+from src.main import main
+from src.search import SearchIndex, item_categories, tokenize
+
+
+@pytest.fixture
+def news_items():
+    """
+    Returns news items with overlapping words, as parsed from a feed.
+    """
+    return [
+        {"title": "Storm hits the coast", "pubDate": "20240101", "link": "http://example.com/1",
+         "description": "A strong storm brought floods and storm damage.", "category": ["Weather", "Africa"]},
+        {"title": "Election results", "pubDate": "20240101", "link": "http://example.com/2",
+         "description": "Votes are counted after the <b>election</b>.", "category": ["Politics", "africa"]},
+        {"title": "Markets calm after the storm", "pubDate": "20240202", "link": "http://example.com/3",
+         "description": "Stocks recovered on Monday, long after the weather had calmed down and the markets opened.",
+         "category": ["Business", "Weather"], "author": ["Ann Lee", "Bo Chen"]},
+    ]
+
+
+@pytest.fixture
+def cache_manager(tmp_path):
+    return CacheManager(cache_file=str(tmp_path / "news_cache.csv"))
+
+
+def test_tokenize():
+    assert tokenize("The <b>Storm</b> hits a coast, 2024!") == ["storm", "hits", "coast", "2024"]
+    assert tokenize(float("nan")) == []
+
+
+def test_search_ranks_with_bm25(tmp_path, news_items):
+    index = SearchIndex(str(tmp_path / "search.db"))
+    assert index.add_items(news_items) == 3
+    assert index.add_items(news_items[:1]) == 0
+
+    assert [item["link"] for item in index.search("storm")] == ["http://example.com/1", "http://example.com/3"]
+    assert [item["link"] for item in index.search("ELECTION")] == ["http://example.com/2"]
+    assert [item["link"] for item in index.search("storm", limit=1)] == ["http://example.com/1"]
+    assert index.search("the") == []
+    assert index.search("volcano") == []
+
+
+def test_cache_feeds_updates_index_incrementally(cache_manager, news_items):
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items[:2])], verbose=False)
+    assert cache_manager.search_index.exists()
+    cache_manager.cache_feeds(feeds=[("http://b.com", news_items[1:])], verbose=False)
+
+    found = cache_manager.search_news("storm")
+    assert [item["link"] for item in found] == ["http://example.com/1", "http://example.com/3"]
+    assert found[1]["source_url"] == "http://b.com"
+    assert [item["link"] for item in cache_manager.search_news("storm", source_url="http://b.com")] == [
+        "http://example.com/3"]
+    assert [item["link"] for item in cache_manager.search_news("storm", date="202402")] == ["http://example.com/3"]
+
+
+def test_missing_index_is_built_from_cache(cache_manager, news_items, tmp_path):
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items)], verbose=False)
+    for suffix in ("", "-wal", "-shm"):
+        (tmp_path / f"news_cache.search.db{suffix}").unlink(missing_ok=True)
+
+    reopened = CacheManager(cache_file=cache_manager.cache_file)
+    reopened.cache_feeds(feeds=[("http://a.com", [{"title": "Storm again", "link": "http://example.com/4"}])],
+                         verbose=False)
+    assert not reopened.search_index.exists()
+    assert len(reopened.search_news("storm")) == 3
+
+
+@pytest.mark.parametrize("cache_name", ["news_cache.db", "news_cache"])
+def test_search_with_other_backends(tmp_path, news_items, cache_name):
+    cache_manager = CacheManager(cache_file=str(tmp_path / cache_name))
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items)], verbose=False)
+    assert [item["link"] for item in cache_manager.search_news("markets")] == ["http://example.com/3"]
+
+
+def test_main_search(cache_manager, news_items, monkeypatch, capsys):
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items)], verbose=False)
+    monkeypatch.setattr('sys.argv', ['main.py', '--search', 'storm', '--date', '20240101',
+                                     '--cache', cache_manager.cache_file])
+    main()
+    output = capsys.readouterr().out
+    assert "Storm hits the coast" in output
+    assert "Markets calm" not in output
+
+    monkeypatch.setattr('sys.argv', ['main.py', '--search', 'volcano', '--cache', cache_manager.cache_file])
+    main()
+    assert "No news found matching the search." in capsys.readouterr().out
+
+
+def test_item_categories():
+    assert item_categories({"category": ["Africa", " Africa ", "", "World"]}) == ["Africa", "World"]
+    assert item_categories({"category": "Politics"}) == ["Politics"]
+    assert item_categories({"category": float("nan")}) == []
+
+
+def test_category_filter_and_top_categories(cache_manager, news_items):
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items[:2]), ("http://b.com", news_items[2:])],
+                              verbose=False)
+
+    assert [item["link"] for item in cache_manager.news_by_category("WEATHER")] == [
+        "http://example.com/1", "http://example.com/3"]
+    assert [item["link"] for item in cache_manager.news_by_category("weather", date="202402")] == [
+        "http://example.com/3"]
+    assert cache_manager.news_by_category("Weather", source_url="http://a.com")[0]["category"] == ["Weather", "Africa"]
+    assert cache_manager.news_by_category("Business")[0]["author"] == ["Ann Lee", "Bo Chen"]
+    assert [item["link"] for item in cache_manager.search_news("storm", category="africa")] == ["http://example.com/1"]
+
+    assert cache_manager.top_categories() == [("Africa", 2), ("Weather", 2), ("Business", 1), ("Politics", 1)]
+    assert cache_manager.top_categories(date="202401", limit=1) == [("Africa", 2)]
+    assert cache_manager.top_categories(source_url="http://b.com") == [("Business", 1), ("Weather", 1)]
+
+
+def test_outdated_index_is_rebuilt(cache_manager, news_items):
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items)], verbose=False)
+    with closing(sqlite3.connect(cache_manager.search_index.index_file)) as connection:
+        connection.execute("DROP TABLE categories")
+        connection.execute("PRAGMA user_version = 1")
+
+    assert not cache_manager.search_index.exists()
+    assert len(cache_manager.news_by_category("weather")) == 2
+    assert cache_manager.search_index.exists()
+
+
+def test_main_category_and_top_categories(cache_manager, news_items, monkeypatch, capsys):
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items)], verbose=False)
+    monkeypatch.setattr('sys.argv', ['main.py', '--category', 'politics', '--cache', cache_manager.cache_file])
+    main()
+    assert "Election results" in capsys.readouterr().out
+
+    monkeypatch.setattr('sys.argv', ['main.py', '--top-categories', '2', '--date', '2024', '--json',
+                                     '--cache', cache_manager.cache_file])
+    main()
+    assert json.loads(capsys.readouterr().out) == [{"category": "Africa", "count": 2},
+                                                   {"category": "Weather", "count": 2}]
+
+
+def test_range_query_newest_first(cache_manager, news_items):
+    news_items[0]["published"] = 1704110400  # 2024-01-01 12:00 UTC
+    news_items[1]["published"] = 1704092400  # 2024-01-01 07:00 UTC
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items)], verbose=False)
+
+    links = lambda items: [item["link"] for item in items]
+    assert links(cache_manager.news_in_range()) == ["http://example.com/3", "http://example.com/1",
+                                                    "http://example.com/2"]
+    assert links(cache_manager.news_in_range(start=1704096000, end=1704153599)) == ["http://example.com/1"]
+    assert links(cache_manager.news_in_range(end=1704110399)) == ["http://example.com/2"]
+    assert links(cache_manager.news_in_range(start=1704067200, category="weather")) == [
+        "http://example.com/3", "http://example.com/1"]
+    assert links(cache_manager.search_news("storm", start=1704844800)) == ["http://example.com/3"]
+    assert cache_manager.top_categories(end=1704153599) == [("Africa", 2), ("Politics", 1), ("Weather", 1)]
+    assert cache_manager.news_in_range(end=1704110399)[0]["published"] == 1704092400
+
+
+def test_main_from_to(cache_manager, news_items, monkeypatch, capsys):
+    news_items[0]["published"] = 1704110400
+    cache_manager.cache_feeds(feeds=[("http://a.com", news_items)], verbose=False)
+    monkeypatch.setattr('sys.argv', ['main.py', '--from', '2024-01-01T08:00', '--to', '20240101', '--json',
+                                     '--cache', cache_manager.cache_file])
+    main()
+    assert [item["title"] for item in json.loads(capsys.readouterr().out)] == ["Storm hits the coast"]
+
+    monkeypatch.setattr('sys.argv', ['main.py', '--from', '20250101', '--cache', cache_manager.cache_file])
+    main()
+    assert "No news found in the specified time range." in capsys.readouterr().out
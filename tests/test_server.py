@@ -0,0 +1,154 @@
+import json
+import threading
+import pytest
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from src.cache_manager import CacheManager
+from src.retention import RetentionPolicy
+from src.server import HotIndex, NewsServer
+
+DAY = 24 * 60 * 60
+START = 1704067200  # 2024-01-01 00:00 UTC
+
+
+def news_items(first: int, count: int):
+    """Returns `count` news items from two sources, numbered from `first`, published six hours apart."""
+    return [{"title": f"News {number}", "pubDate": f"202401{1 + number // 4:02d}",
+             "link": f"http://example.com/{number}", "published": START + number * DAY // 4,
+             "category": ["Even" if number % 2 == 0 else "Odd"], "source_url": f"http://{'ab'[number % 2]}.com"}
+            for number in range(first, first + count)]
+
+
+def cache(cache_manager, items):
+    cache_manager.cache_feeds(feeds=[(url, [item for item in items if item["source_url"] == url])
+                                     for url in ("http://a.com", "http://b.com")], verbose=False)
+
+
+@pytest.fixture
+def cache_manager(tmp_path):
+    cache_manager = CacheManager(cache_file=str(tmp_path / "news_cache.csv"))
+    cache(cache_manager, news_items(0, 12))
+    return cache_manager
+
+
+@pytest.fixture
+def server(cache_manager):
+    hot_index = HotIndex(cache_manager)
+    hot_index.refresh(blocking=True)
+    with NewsServer(hot_index, port=0, refresh_interval=0.05) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield server
+        server.shutdown()
+        thread.join()
+
+
+def get(server, target, etag=None):
+    """Returns the status, ETag and decoded JSON body of a GET request."""
+    request = Request(server.url + target, headers={"If-None-Match": etag} if etag else {})
+    try:
+        with urlopen(request) as response:
+            body = response.read()
+            return response.status, response.headers["ETag"], json.loads(body) if body else None
+    except HTTPError as e:
+        body = e.read()
+        return e.code, e.headers["ETag"], json.loads(body) if body else None
+
+
+def titles(items):
+    return [int(item["title"].split()[1]) for item in items]
+
+
+def test_hot_index_queries(cache_manager):
+    hot_index = HotIndex(cache_manager)
+    assert hot_index.refresh(blocking=True) == len(hot_index) == 12
+
+    total, items = hot_index.query(date="20240102")
+    assert (total, sorted(titles(items))) == (4, [4, 5, 6, 7])
+    assert items[0]["category"] in (["Even"], ["Odd"]) and items[0]["description"] is None
+
+    total, items = hot_index.query(start=START + DAY // 2, end=START + 2 * DAY, limit=3)
+    assert (total, titles(items)) == (7, [8, 7, 6])
+    total, items = hot_index.query(start=START + DAY // 2, end=START + 2 * DAY, offset=6)
+    assert titles(items) == [2]
+
+    total, items = hot_index.query(date="202401", source_urls=["http://b.com"], category="odd")
+    assert (total, sorted(titles(items))) == (6, [1, 3, 5, 7, 9, 11])
+    assert hot_index.query(source_urls=["http://c.com"]) == (0, [])
+    assert hot_index.item("http://example.com/3")["title"] == "News 3"
+
+
+@pytest.mark.parametrize("cache_name", ["news_cache.csv", "news_cache.db", "news_cache", "news_cache.parquet"])
+def test_refresh_picks_up_new_items(tmp_path, cache_name):
+    if cache_name.endswith(".parquet"):
+        pytest.importorskip("pyarrow")
+    cache_manager = CacheManager(cache_file=str(tmp_path / cache_name))
+    hot_index = HotIndex(cache_manager)
+    assert hot_index.refresh() == 0
+
+    cache(cache_manager, news_items(0, 12))
+    assert hot_index.refresh() == 12
+    assert (hot_index.refresh(), hot_index.generation) == (0, 1)
+
+    # Parquet partitions are rewritten by every write, so they are read again entirely.
+    cache(CacheManager(cache_file=cache_manager.cache_file), news_items(10, 8))
+    assert hot_index.refresh() == (18 if cache_name.endswith(".parquet") else 6)
+    assert len(hot_index) == 18
+    assert hot_index.query(date="20240105")[0] == 2
+
+    cache_manager.compact(policy=RetentionPolicy(max_rows_per_source=3))
+    hot_index.refresh()
+    assert sorted(titles(hot_index.query()[1])) == [12, 13, 14, 15, 16, 17]
+
+
+def test_refresh_merges_older_items_into_the_timeline(tmp_path):
+    cache_manager = CacheManager(cache_file=str(tmp_path / "news_cache.csv"))
+    hot_index = HotIndex(cache_manager)
+    cache(cache_manager, news_items(6, 6)[::-1])
+    hot_index.refresh()
+    cache(cache_manager, news_items(0, 6) + news_items(12, 2))
+    assert hot_index.refresh() == 8
+    assert titles(hot_index.query(start=START, limit=None)[1]) == list(range(13, -1, -1))
+
+
+def test_refresh_merges_items_logged_while_reading(cache_manager):
+    hot_index = HotIndex(cache_manager)
+    changes = hot_index.storage.changes
+
+    def changes_while_writing(cursor):
+        # Another writer finds the merge lock held by the refresh and leaves its items in the log.
+        cache(CacheManager(cache_file=cache_manager.cache_file), news_items(12, 2))
+        return changes(cursor)
+
+    hot_index.storage.changes = changes_while_writing
+    assert hot_index.refresh(blocking=True) == 12
+    assert not cache_manager.journal.pending()
+    hot_index.storage.changes = changes
+    assert hot_index.refresh() == 2
+
+
+def test_server_pages_and_etags(server, cache_manager):
+    status, etag, page = get(server, "/news?date=202401&source=http://a.com&limit=4")
+    assert status == 200 and (page["total"], page["offset"], titles(page["items"])) == (6, 0, [0, 2, 4, 6])
+    status, _, page = get(server, page["next"])
+    assert (page["offset"], titles(page["items"]), page["next"]) == (4, [8, 10], None)
+
+    assert get(server, "/news?date=202401&source=http://a.com&limit=4", etag=etag)[:2] == (304, etag)
+
+    cache(CacheManager(cache_file=cache_manager.cache_file), news_items(12, 2))
+    server.hot_index.refresh(blocking=True)
+    status, new_etag, page = get(server, "/news?date=202401&source=http://a.com&limit=4", etag=etag)
+    assert (status, page["total"]) == (200, 7) and new_etag != etag
+
+    status, _, page = get(server, "/news?from=20240102&to=2024-01-02T12:00")
+    assert titles(page["items"]) == [6, 5, 4]
+    assert get(server, "/news/item?link=http://example.com/13")[2]["title"] == "News 13"
+    assert get(server, "/status")[2]["items"] == 14
+
+
+@pytest.mark.parametrize("target, status", [("/news?limit=0", 400), ("/news?offset=x", 400),
+                                            ("/news?from=yesterday", 400), ("/news?date=2024-01", 400),
+                                            ("/news/item?link=http://nowhere", 404), ("/feeds", 404)])
+def test_server_rejects_bad_requests(server, target, status):
+    code, _, body = get(server, target)
+    assert code == status and body["error"]
@@ -0,0 +1,77 @@
+import json
+import time
+from unittest.mock import patch
+import pytest
+from src.main import main
+from src.stats import StatsRecorder, recorder
+
+
+@pytest.fixture(autouse=True)
+def reset_recorder(tmp_path, monkeypatch):
+    """Runs every test from a temporary directory and leaves the shared recorder disabled afterwards."""
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path)
+    yield
+    recorder.disable()
+    recorder.reset()
+
+
+def test_disabled_recorder_records_nothing():
+    stats = StatsRecorder()
+    items = [1, 2, 3]
+    with stats.stage("parse", feed="https://example.com/feed"):
+        stats.count("items_parsed", 3, feed="https://example.com/feed")
+    assert stats.iterate("cache_read", items) is items
+    assert not stats.stages and not stats.counters and not stats.feeds
+
+
+def test_nested_stages_are_not_double_counted():
+    stats = StatsRecorder()
+    stats.enable()
+    with stats.stage("render"):
+        time.sleep(0.02)
+        for _ in stats.iterate("cache_read", iter([1, 2]), counter="cache_rows_read"):
+            pass
+        with stats.stage("cache_read"):
+            time.sleep(0.05)
+    summary = stats.summary()
+    assert summary["counters"] == {"cache_rows_read": 2}
+    assert summary["stages"]["cache_read"]["calls"] == 4
+    assert summary["stages"]["cache_read"]["seconds"] >= 0.05
+    assert 0.02 <= summary["stages"]["render"]["seconds"] < 0.05
+
+
+def test_prometheus_output():
+    stats = StatsRecorder()
+    stats.enable()
+    with stats.stage("fetch", feed='https://example.com/"feed"'):
+        stats.count("bytes_downloaded", 100, feed='https://example.com/"feed"')
+    text = stats.to_prometheus()
+    assert "# TYPE rss_reader_bytes_downloaded_total counter" in text
+    assert "rss_reader_bytes_downloaded_total 100" in text
+    assert 'rss_reader_stage_calls_total{stage="fetch"} 1' in text
+    assert 'rss_reader_feed_bytes_downloaded_total{feed="https://example.com/\\"feed\\""} 100' in text
+    assert 'rss_reader_feed_fetch_seconds{feed=' in text
+
+
+@patch('src.fetch.get_session')
+def test_main_writes_stats(mock_session, monkeypatch, tmp_path, capsys):
+    body = (b"<rss><channel><item><title>One</title><link>https://example.com/1</link></item>"
+            b"<item><title>Two</title><link>https://example.com/2</link></item></channel></rss>")
+    response = mock_session.return_value.get.return_value
+    response.status_code = 200
+    response.content = body
+    response.text = body.decode()
+    response.headers = {}
+    stats_file = tmp_path / "stats.json"
+    monkeypatch.setattr('sys.argv', ['main.py', '--source', 'https://example.com/feed', '--stats', str(stats_file)])
+
+    main()
+    capsys.readouterr()
+
+    summary = json.loads(stats_file.read_text())
+    assert summary["counters"] == {"bytes_downloaded": len(body), "items_parsed": 2, "cache_rows_written": 2,
+                                   "duplicates_found": 0}
+    assert set(summary["stages"]) == {"fetch", "parse", "cache_write", "search_index", "duplicate_index", "render"}
+    assert summary["feeds"]["https://example.com/feed"]["items_parsed"] == 2
+    assert summary["feeds"]["https://example.com/feed"]["bytes_downloaded"] == len(body)
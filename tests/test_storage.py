@@ -0,0 +1,231 @@
+import pandas as pd
+import pytest
+from contextlib import closing
+from pathlib import Path
+from src.storage import (CACHE_COLUMNS, LIST_COLUMNS, CsvStorage, PartitionedStorage, SqliteStorage,
+                         date_prefix_upper_bound, decode_list, migrate_csv_to_sqlite, open_storage)
+
+
+@pytest.fixture
+def sample_items_df():
+    """
+    Returns sample news items as the DataFrame CacheManager passes to the storage backends.
+    """
+    return pd.DataFrame.from_records([
+        {"title": "News 1", "author": ["Author 1"], "pubDate": "20240101", "link": "http://example.com/1",
+         "category": ["Category 1", "Category 2"], "description": "Description 1", "source_url": "http://a.com"},
+        {"title": "News 2", "pubDate": "20240102", "link": "http://example.com/2", "source_url": "http://b.com"},
+        {"title": "News 3", "pubDate": "20240201", "link": "http://example.com/3", "source_url": "http://a.com"},
+    ]).reindex(columns=CACHE_COLUMNS)
+
+
+def test_open_storage_by_extension(tmp_path):
+    """
+    Checks that the backend is chosen from the cache file extension.
+    """
+    assert isinstance(open_storage(str(tmp_path / "cache.csv")), CsvStorage)
+    assert isinstance(open_storage(str(tmp_path / "cache.db")), SqliteStorage)
+    assert isinstance(open_storage(str(tmp_path / "cache.SQLITE3")), SqliteStorage)
+    assert open_storage(str(tmp_path / "news_cache")).file_format == "csv"
+
+
+def test_date_prefix_upper_bound():
+    """
+    Verifies the exclusive upper bound used to turn a date prefix into a range query.
+    """
+    assert date_prefix_upper_bound("20240409") == "2024040:"
+    assert date_prefix_upper_bound("202404") == "202405"
+    assert "20240409" < date_prefix_upper_bound("20240409") <= "20240410"
+
+
+def test_sqlite_storage_deduplicates_by_link(tmp_path, sample_items_df):
+    """
+    Ensures that inserting the same links twice stores each item once.
+    """
+    storage = SqliteStorage(str(tmp_path / "cache.db"), batch_size=2)
+    assert storage.add_items(sample_items_df) == 3
+    assert storage.add_items(sample_items_df) == 0
+    assert len(list(storage.query("2024"))) == 3
+
+
+def test_sqlite_storage_query(tmp_path, sample_items_df):
+    """
+    Checks date range lookups, optional source filtering and the stored form of list fields.
+    """
+    storage = SqliteStorage(str(tmp_path / "cache.db"))
+    storage.add_items(sample_items_df)
+
+    assert [item["link"] for item in storage.query("20240101")] == ["http://example.com/1"]
+    assert [item["link"] for item in storage.query("202401")] == ["http://example.com/1", "http://example.com/2"]
+    assert [item["link"] for item in storage.query("2024", source_urls=["http://a.com"])] == [
+        "http://example.com/1", "http://example.com/3"]
+    assert list(storage.query("20240101"))[0]["category"] == ["Category 1", "Category 2"]
+    assert list(storage.query("20240102"))[0]["author"] is None
+
+
+def test_sqlite_date_query_uses_index(tmp_path, sample_items_df):
+    """
+    Verifies that date lookups are answered by an index search rather than a full table scan.
+    """
+    storage = SqliteStorage(str(tmp_path / "cache.db"))
+    storage.add_items(sample_items_df)
+    with closing(storage._connect()) as connection:
+        plan = " ".join(row[3] for row in connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM news WHERE pubDate >= ? AND pubDate < ?", ("20240101", "20240102")))
+    assert "USING INDEX news_pub_date" in plan
+
+
+def test_sqlite_reads_are_read_only(tmp_path, sample_items_df):
+    """
+    Checks that reads of a missing database return nothing without creating it, and that reads of an existing
+    one open a read-only connection.
+    """
+    import sqlite3
+    cache_file = tmp_path / "cache.db"
+    assert list(SqliteStorage(str(cache_file)).query("2024")) == [] and not cache_file.exists()
+    SqliteStorage(str(cache_file)).add_items(sample_items_df)
+
+    reader = SqliteStorage(str(cache_file))
+    assert len(list(reader.query("2024"))) == 3 and not reader._schema_ready
+    with closing(reader._connect(read_only=True)) as connection, pytest.raises(sqlite3.OperationalError):
+        connection.execute("DELETE FROM news")
+
+
+def test_migrate_csv_to_sqlite(tmp_path, sample_items_df):
+    """
+    Ensures the one-shot migration copies every CSV row into the SQLite cache.
+    """
+    csv_storage = CsvStorage(str(tmp_path / "cache.csv"))
+    csv_storage.add_items(sample_items_df)
+    db_file = str(tmp_path / "cache.db")
+
+    assert migrate_csv_to_sqlite(csv_storage.cache_file, db_file, chunk_size=2) == 3
+    assert migrate_csv_to_sqlite(csv_storage.cache_file, db_file) == 0
+    assert list(SqliteStorage(db_file).query("20240101")) == [
+        {key: (None if isinstance(value, float) and pd.isna(value) else value) for key, value in row.items()}
+        for row in csv_storage.query("20240101")]
+
+
+@pytest.fixture(params=["csv", "parquet"])
+def partitioned_storage(request, tmp_path):
+    """
+    Provides a PartitionedStorage for each partition file format, skipping Parquet when pyarrow is missing.
+    """
+    if request.param == "parquet":
+        pytest.importorskip("pyarrow")
+    return PartitionedStorage(str(tmp_path / f"news_cache.{request.param}"), file_format=request.param)
+
+
+def test_partitioned_storage_writes_one_file_per_day(partitioned_storage, sample_items_df):
+    """
+    Ensures items are sharded by publication day and that later writes only touch the receiving partitions.
+    """
+    assert partitioned_storage.add_items(sample_items_df.iloc[:2]) == 2
+    january_first = Path(partitioned_storage.partition_file("20240101"))
+    modified = january_first.stat().st_mtime_ns
+
+    assert partitioned_storage.add_items(sample_items_df) == 1
+    assert [Path(partition).stem for partition in partitioned_storage.partitions()] == [
+        "20240101", "20240102", "20240201"]
+    assert january_first.stat().st_mtime_ns == modified
+
+
+def test_partitioned_storage_query(partitioned_storage, sample_items_df):
+    """
+    Checks that date queries read only the matching partitions and that source filters are applied.
+    """
+    partitioned_storage.add_items(sample_items_df)
+
+    assert partitioned_storage.partitions("20240101") == [partitioned_storage.partition_file("20240101")]
+    assert [item["link"] for item in partitioned_storage.query("202401")] == [
+        "http://example.com/1", "http://example.com/2"]
+    assert [item["link"] for item in partitioned_storage.query("2024", source_urls=["http://a.com"])] == [
+        "http://example.com/1", "http://example.com/3"]
+    assert list(partitioned_storage.query("20240101"))[0]["category"] == ["Category 1", "Category 2"]
+    assert list(partitioned_storage.query("2023")) == []
+
+
+def test_partitioned_storage_link_index(partitioned_storage, sample_items_df):
+    """
+    Ensures links are deduplicated across partitions, also by a new instance and after losing the link index.
+    """
+    partitioned_storage.add_items(sample_items_df)
+    Path(partitioned_storage.index_file).unlink()
+    reopened = PartitionedStorage(partitioned_storage.cache_file, file_format=partitioned_storage.file_format)
+
+    assert reopened.add_items(sample_items_df) == 0
+    assert reopened.compact() == 0
+    assert len(list(reopened.query("2024"))) == 3
+
+
+@pytest.mark.parametrize("cache_name", ["cache.csv", "cache.db", "news_cache"])
+def test_query_limit_is_pushed_down(tmp_path, sample_items_df, cache_name):
+    """
+    Checks that every backend stops producing items at the limit.
+    """
+    storage = open_storage(str(tmp_path / cache_name))
+    storage.add_items(sample_items_df)
+
+    assert [item["link"] for item in storage.query("2024", limit=2)] == ["http://example.com/1", "http://example.com/2"]
+    assert len(list(storage.query("2024"))) == 3
+
+
+def test_csv_query_matches_pandas(tmp_path, sample_items_df):
+    """
+    Checks that the pandas-free CSV query returns the rows `pandas.read_csv` would, empty cells included.
+    """
+    storage = CsvStorage(str(tmp_path / "cache.csv"))
+    storage.add_items(sample_items_df)
+
+    cache_df = pd.read_csv(storage.cache_file, dtype={"pubDate": str})
+    expected = cache_df[cache_df["pubDate"].str.contains("202401") & cache_df["source_url"].isin(["http://a.com"])]
+    expected = expected.assign(**{column: expected[column].map(decode_list) for column in LIST_COLUMNS})
+    assert (pd.DataFrame.from_records(list(storage.query("202401", source_urls=["http://a.com"])))
+            .equals(expected.reset_index(drop=True)))
+    assert pd.isna(next(iter(storage.query("20240102")))["author"])
+
+
+def test_lists_are_stored_as_json(tmp_path, sample_items_df):
+    """
+    Checks that author and category lists are written as JSON arrays and that older str(list) values still decode.
+    """
+    storage = CsvStorage(str(tmp_path / "cache.csv"))
+    storage.add_items(sample_items_df)
+
+    assert '"[""Category 1"", ""Category 2""]"' in Path(storage.cache_file).read_text()
+    assert decode_list("['South Africa', \"Côte d'Ivoire\"]") == ["South Africa", "Côte d'Ivoire"]
+    assert decode_list("[Breaking] news") == "[Breaking] news"
+    assert decode_list("Politics") == "Politics"
+
+
+@pytest.mark.parametrize("cache_name", ["cache.csv", "cache.db", "news_cache"])
+def test_published_is_stored_as_int_and_old_caches_are_upgraded(tmp_path, sample_items_df, cache_name):
+    """
+    Checks that publication times come back as ints and that caches written without the published column
+    are upgraded when new items are added.
+    """
+    storage = open_storage(str(tmp_path / cache_name))
+    old_columns = [column for column in CACHE_COLUMNS if column != "published"]
+    if isinstance(storage, SqliteStorage):
+        import sqlite3
+        with closing(sqlite3.connect(storage.cache_file)) as connection:
+            connection.execute(f"CREATE TABLE news (id INTEGER PRIMARY KEY, {', '.join(old_columns)}, UNIQUE (link))")
+            connection.execute(f"INSERT INTO news ({', '.join(old_columns)}) VALUES ({', '.join('?' * 7)})",
+                               ("Old", None, "20231231", "http://example.com/0", None, None, "http://a.com"))
+            connection.commit()
+    else:
+        old_file = (storage.cache_file if isinstance(storage, CsvStorage)
+                    else str(tmp_path / cache_name / "20231231.csv"))
+        Path(old_file).parent.mkdir(exist_ok=True)
+        Path(old_file).write_text(",".join(old_columns) + "\nOld,,20231231,http://example.com/0,,,http://a.com\n")
+
+    storage.add_items(sample_items_df.assign(published=[1704110400, None, 1706745600]))
+    storage.add_items(pd.DataFrame.from_records([
+        {"title": "Late", "pubDate": "20231231", "link": "http://example.com/4", "published": 1704067199}]))
+
+    items = {item["link"]: item for item in storage.query("202")}
+    assert items["http://example.com/1"]["published"] == 1704110400
+    assert isinstance(items["http://example.com/3"]["published"], int)
+    assert pd.isna(items["http://example.com/2"]["published"])
+    assert pd.isna(items["http://example.com/0"]["published"])
+    assert items["http://example.com/4"]["published"] == 1704067199
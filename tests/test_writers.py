@@ -0,0 +1,77 @@
+import io
+import json
+import math
+from src.writers import write_json, write_ndjson, write_text
+
+news_items = [
+    {'title': 'Test Title 1', 'link': 'http://example.com/1', 'pubDate': '20210101', 'description': 'D1'},
+    {'title': 'Test Title 2', 'link': 'http://example.com/2', 'pubDate': '20210102', 'description': 'D2'},
+]
+
+
+def test_write_json_matches_json_dumps():
+    """
+    Ensures the streamed JSON array is byte-for-byte what `json.dumps(items, indent=2)` produced before.
+    """
+    out = io.StringIO()
+    write_json(iter(news_items), verbose=True, out=out)
+
+    expected = [dict(item, pubDate=f"2021-January-0{index}") for index, item in enumerate(news_items, start=1)]
+    assert out.getvalue() == json.dumps(expected, indent=2) + "\n"
+
+    empty = io.StringIO()
+    write_json(iter([]), out=empty)
+    assert empty.getvalue() == "[]\n"
+
+
+def test_write_ndjson():
+    """
+    Checks that NDJSON output has one concise JSON object per line.
+    """
+    out = io.StringIO()
+    write_ndjson(news_items, out=out)
+
+    lines = out.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'title': 'Test Title 1', 'link': 'http://example.com/1', 'pubDate': '2021-January-01'},
+        {'title': 'Test Title 2', 'link': 'http://example.com/2', 'pubDate': '2021-January-02'},
+    ]
+
+
+def test_writers_consume_lazily_without_mutating_items():
+    """
+    Verifies that items are written as they are produced and that the caller's dictionaries are left untouched.
+    """
+    out = io.StringIO()
+    written_before_next = []
+
+    def items():
+        for item in news_items:
+            yield item
+            written_before_next.append(out.getvalue().count("Title: "))
+
+    write_text(items(), out=out)
+
+    assert written_before_next == [1, 2]
+    assert news_items[0]['pubDate'] == '20210101'
+
+
+def test_missing_values_display_the_same_on_every_path():
+    """
+    Ensures that None from the search index and NaN from a CSV cell are both left out of the displayed item.
+    """
+    from_index = dict(news_items[0], author=None, published=None)
+    from_csv = dict(news_items[0], author=math.nan)
+
+    outputs = []
+    for item in (from_index, from_csv):
+        out = io.StringIO()
+        write_text([item], verbose=True, out=out)
+        outputs.append(out.getvalue())
+
+    assert outputs[0] == outputs[1]
+    assert "Authors" not in outputs[0] and "Published At" not in outputs[0]
+
+    out = io.StringIO()
+    write_ndjson([from_csv], verbose=True, out=out)
+    assert "author" not in json.loads(out.getvalue())